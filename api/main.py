@@ -1,40 +1,40 @@
 """
 TeXForm API: upload a PDF or image, get back LaTeX and optional PDF.
 """
-import os
-import sys
-
-os.environ.setdefault("TRANSFORMERS_NO_TF", "1")
-os.environ.setdefault("USE_TORCH", "1")
-
-# Block TensorFlow from being imported by transformers.
-# Even with TRANSFORMERS_NO_TF=1, some versions of transformers unconditionally
-# import TF in image_transforms.py, hitting the ml_dtypes "handle" crash.
-# The stub needs __spec__ so torch._dynamo.trace_rules doesn't crash on find_spec().
-if "tensorflow" not in sys.modules:
-    _fake_tf = type(sys)("tensorflow")
-    _fake_tf.__version__ = "0.0.0"
-    _fake_tf.__spec__ = None  # torch.dynamo may inspect this; None is fine in newer PyTorch
-    import importlib
-    _fake_tf.__spec__ = importlib.machinery.ModuleSpec("tensorflow", None)
-    sys.modules["tensorflow"] = _fake_tf
-
+import asyncio
 import base64
+import dataclasses
+import hashlib
 import logging
+import os
 import re
 import sys
 import tempfile
-from typing import Optional
+import weakref
+from contextlib import nullcontext
+from functools import partial
+from typing import List, Optional
+
+import anyio
 
-from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 
+from backend import cancellation, document_store, metrics, profiling, scheduler
 from backend.config_loader import get
 from backend.file_utils import prepare_input_images
-from backend.latex_generator import compile_latex_to_pdf, generate_full_document
-from backend.math_recognition import recognize_math_in_text
-from backend.ocr_engine import ocr_text_from_page
+from backend.pipeline import (
+    PipelineOptions,
+    convert_documents,
+    convert_to_document,
+    count_pages,
+    enrich_pages,
+    resolve_options,
+)
 
 # Configure logging
 log_level = get("logging.level", "INFO").upper()
@@ -48,6 +48,12 @@ logger = logging.getLogger(__name__)
 # Limits
 ALLOWED_EXTENSIONS = {".pdf", ".png", ".jpg", ".jpeg"}
 MAX_FILE_SIZE_BYTES = 50 * 1024 * 1024  # 50 MB
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MB
+# Allowance for multipart headers and small form fields on top of the file sizes
+MAX_FORM_OVERHEAD_BYTES = 64 * 1024
+DISCONNECT_POLL_SECONDS = 0.5
+# Non-standard "client closed request" status (as in nginx); only seen in logs and metrics
+CLIENT_CLOSED_REQUEST = 499
 FILENAME_SAFE = re.compile(r"^[a-zA-Z0-9_.-]+$")
 
 app = FastAPI(
@@ -65,6 +71,116 @@ app.add_middleware(
 )
 
 
+class RequestCounter:
+    """
+    Count API requests by route template (not raw path, to keep label
+    cardinality low) and response status. A plain ASGI middleware rather than
+    @app.middleware("http"): that form wraps `receive`, which hides client
+    disconnects from request.is_disconnected(). Requests that raise are
+    counted with status 500.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith("/api/"):
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")  # set on the shared scope by the router
+            if route is not None:
+                metrics.REQUESTS.inc(endpoint=route.path, status=str(status))
+
+
+app.add_middleware(RequestCounter)
+
+
+def _max_body_bytes(path: str) -> Optional[int]:
+    """Largest request body accepted on an upload endpoint, or None for other paths."""
+    if path == "/api/process":
+        return MAX_FILE_SIZE_BYTES + MAX_FORM_OVERHEAD_BYTES
+    if path == "/api/batch":
+        return MAX_FILE_SIZE_BYTES * get("batch.max_files", 50) + MAX_FORM_OVERHEAD_BYTES
+    return None
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+class UploadSizeLimit:
+    """
+    Reject oversized uploads with 413 before the multipart form is parsed:
+    Starlette spools the whole body to disk before the endpoint runs, so the
+    per-file check in _stream_upload alone comes too late. A Content-Length
+    over the limit is rejected without reading the body; a body without one
+    (chunked) is cut off as soon as it passes the limit.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        limit = _max_body_bytes(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+        length = dict(scope["headers"]).get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > limit:
+            await self._reject(limit, scope, receive, send)
+            return
+        received = 0
+        exceeded = False
+        started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    exceeded = True
+                    raise _BodyTooLarge()
+            return message
+
+        async def guarded_send(message):
+            nonlocal started
+            if exceeded and not started:
+                return  # replaced by the 413 below (the app answers a body parse error)
+            started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except _BodyTooLarge:
+            pass
+        if exceeded and not started:
+            await self._reject(limit, scope, receive, send)
+
+    @staticmethod
+    async def _reject(limit: int, scope, receive, send) -> None:
+        response = JSONResponse(
+            {"detail": f"Request too large. Maximum size: {limit // (1024 * 1024)} MB"},
+            status_code=413,
+            headers={"Connection": "close"},
+        )
+        await response(scope, receive, send)
+
+
+app.add_middleware(UploadSizeLimit)
+
+
 def _safe_filename(filename: str) -> str:
     """Return a safe basename; no path traversal."""
     base = os.path.basename(filename).strip()
@@ -80,18 +196,207 @@ def _get_extension(filename: str) -> str:
     return ext if ext in ALLOWED_EXTENSIONS else ""
 
 
+async def _stream_upload(file: UploadFile, dest_path: str) -> str:
+    """
+    Copy an upload to dest_path in chunks, rejecting it as soon as it exceeds
+    MAX_FILE_SIZE_BYTES. Returns the SHA-256 hex digest of the content.
+    Only one chunk is held in memory at a time.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open(dest_path, "wb") as f:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > MAX_FILE_SIZE_BYTES:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"File too large. Maximum size: {MAX_FILE_SIZE_BYTES // (1024*1024)} MB",
+                )
+            digest.update(chunk)
+            f.write(chunk)
+    if size == 0:
+        raise HTTPException(status_code=400, detail="File is empty")
+    return digest.hexdigest()
+
+
+def _client_id(request: Request) -> str:
+    """
+    Key used for fair scheduling: the scheduler.client_header value when the
+    client sends one (e.g. an API key id set by a proxy), else the peer address.
+    """
+    header = get("scheduler.client_header", "X-Client-Id")
+    if header:
+        value = (request.headers.get(header) or "").strip()
+        if value:
+            return "h:" + value[:128]
+    return "ip:" + (request.client.host if request.client else "unknown")
+
+
+def _check_priority(priority: str) -> None:
+    if priority not in scheduler.PRIORITIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown priority '{priority}'. Use one of: {', '.join(scheduler.PRIORITIES)}",
+        )
+
+
+async def _cancel_on_disconnect(request: Request, token: cancellation.CancelToken, work):
+    """
+    Await `work` (a coroutine), checking every DISCONNECT_POLL_SECONDS whether
+    the client has gone away. If so, cancel the token so the pipeline stops
+    between pages / OCR batches, and answer 499.
+    """
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                token.cancel("client disconnected")
+                logger.info("Client disconnected; cancelling %s", request.url.path)
+                raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="Client closed request")
+    except cancellation.Cancelled as e:
+        raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail=f"Cancelled: {e}") from e
+    finally:
+        if not task.done():
+            task.cancel()
+
+
 @app.get("/api/health")
 def health():
     """Health check for load balancers and scripts."""
     return {"status": "ok"}
 
 
+@app.get("/api/metrics")
+def metrics_endpoint():
+    """Process metrics (stage latencies, pages/lines/tokens, cache hit rates) in Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.post("/api/process")
-async def process_upload(file: UploadFile = File(...)):
+async def process_upload(
+    request: Request,
+    file: UploadFile = File(...),
+    compile_pdf: Optional[bool] = Form(None),
+    include_timings: bool = Form(False),
+    profile: bool = Form(False),
+    preset: Optional[str] = Form(None),
+    dpi: Optional[int] = Form(None),
+    num_beams: Optional[int] = Form(None),
+    max_length: Optional[int] = Form(None),
+    math_backend: Optional[str] = Form(None),
+    priority: str = Form("interactive"),
+    pages: Optional[str] = Form(None),
+    bounded: Optional[bool] = Form(None),
+    ocr_engine: Optional[str] = Form(None),
+):
     """
-    Upload a PDF or image (PNG, JPG, JPEG). Returns LaTeX source and optional PDF (base64).
+    Upload a PDF or image (PNG, JPG, JPEG). Returns a document id, the LaTeX source
+    and, when compile_pdf is true, the compiled PDF (base64).
+    With compile_pdf=false the PDF is skipped; fetch it later from /api/documents/{id}.pdf.
+    preset (e.g. "fast", "quality"; see pipeline.presets) and the dpi, num_beams,
+    max_length, math_backend, ocr_engine and compile_pdf fields override the configured
+    pipeline settings for this request only; the effective values are
+    returned as `options`.
+    Pages are OCR'd by the shared scheduler: `priority` "interactive" (default)
+    runs ahead of "batch" work, and clients (X-Client-Id header or address)
+    take turns page by page, so small uploads are not stuck behind long PDFs.
+    pages (e.g. "1-5,9" or "12-") converts only those PDF pages; the others
+    are never rasterized. If the client disconnects, the remaining work is
+    abandoned between pages / OCR batches.
+    bounded=true processes the upload in bounded memory: pages are converted a
+    window at a time and spooled to disk, and the response carries
+    `latex_url` / `pdf_url` instead of the inline LaTeX and base64 PDF.
+    It is switched on automatically for uploads with more than
+    pipeline.bounded_min_pages pages unless bounded=false is sent.
+    With include_timings=true the response also has per-stage `timings` in seconds.
+    With profile=true (only when debug.profiling_enabled is set) the request runs
+    under cProfile/torch.profiler and the response has a `profile_id` whose
+    artifacts can be downloaded from /api/profiles/{profile_id}.
     Processing can take 30–120 seconds for multi-page PDFs.
     """
+    if profile and not profiling.profiling_enabled():
+        raise HTTPException(status_code=403, detail="Profiling is disabled on this server.")
+    _check_priority(priority)
+    try:
+        options = resolve_options(
+            preset,
+            dpi=dpi,
+            num_beams=num_beams,
+            max_length=max_length,
+            math_backend=math_backend,
+            compile_pdf=compile_pdf,
+            pages=pages,
+            ocr_engine=ocr_engine,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    try:
+        profiler = profiling.profile_request() if profile else nullcontext(None)
+        with metrics.IN_PROGRESS.track(endpoint="/api/process"), metrics.collect_timings() as timings:
+            with profiler as profile_id, metrics.timer("total"), cancellation.bind(cancellation.CancelToken()) as token:
+                work = _process_upload(file, options, _client_id(request), priority, inline=profile, bounded=bounded)
+                result = await _cancel_on_disconnect(request, token, work)
+    except profiling.ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e)) from e
+    if profile_id is not None:
+        result["profile_id"] = profile_id
+    if include_timings:
+        result["timings"] = {stage: round(seconds, 6) for stage, seconds in timings.items()}
+    return result
+
+
+async def _blocking(inline: bool, fn, *args, **kwargs):
+    """
+    Run a blocking stage in the threadpool, or on this thread when inline
+    (profiling: cProfile only records the thread it was started on).
+    """
+    if inline:
+        return fn(*args, **kwargs)
+    return await run_in_threadpool(fn, *args, **kwargs)
+
+
+# One limiter per event loop (anyio limiters are bound to the loop that uses them)
+_waiting_limiters: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, anyio.CapacityLimiter]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+async def _run_waiting_on_scheduler(fn, *args, **kwargs):
+    """
+    Run a blocking call that spends most of its time waiting on scheduler
+    futures (batch and bounded conversions) on a thread of its own limiter,
+    not anyio's shared one: queued long documents must not use up the threads
+    that run_in_threadpool and the sync endpoints need.
+    At most scheduler.max_waiting_requests such calls run at once.
+    """
+    loop = asyncio.get_running_loop()
+    limiter = _waiting_limiters.get(loop)
+    if limiter is None:
+        limiter = _waiting_limiters[loop] = anyio.CapacityLimiter(
+            max(1, int(get("scheduler.max_waiting_requests", 16)))
+        )
+    return await anyio.to_thread.run_sync(partial(fn, *args, **kwargs), limiter=limiter)
+
+
+async def _process_upload(
+    file: UploadFile,
+    options: PipelineOptions,
+    client: str,
+    priority: str,
+    inline: bool = False,
+    bounded: Optional[bool] = None,
+) -> dict:
+    """
+    Blocking stages run off the event loop; OCR and math go through the fair
+    scheduler, except with inline=True (profiling, where cProfile must see
+    the work on this thread). bounded=None decides by page count.
+    """
     ext = _get_extension(file.filename or "")
     if not ext:
         raise HTTPException(
@@ -99,57 +404,288 @@ async def process_upload(file: UploadFile = File(...)):
             detail=f"Unsupported file type. Allowed: {', '.join(ALLOWED_EXTENSIONS)}",
         )
 
-    content = await file.read()
-    if len(content) == 0:
-        raise HTTPException(status_code=400, detail="File is empty")
-    if len(content) > MAX_FILE_SIZE_BYTES:
-        raise HTTPException(
-            status_code=400,
-            detail=f"File too large. Maximum size: {MAX_FILE_SIZE_BYTES // (1024*1024)} MB",
-        )
-
     safe_name = _safe_filename(file.filename or "upload")
     if not safe_name.lower().endswith(ext):
         safe_name = (safe_name or "upload") + ext
 
     with tempfile.TemporaryDirectory() as work_dir:
         upload_path = os.path.join(work_dir, safe_name)
-        with open(upload_path, "wb") as f:
-            f.write(content)
+        with metrics.timer("upload"):
+            content_hash = await _stream_upload(file, upload_path)
 
-        try:
-            page_image_paths = prepare_input_images(upload_path, work_dir)
-        except ValueError as e:
-            raise HTTPException(status_code=400, detail=str(e))
+        if bounded is None:
+            threshold = get("pipeline.bounded_min_pages", 50)
+            try:
+                bounded = bool(threshold) and await _blocking(inline, count_pages, upload_path, options) > threshold
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            except Exception as e:
+                raise HTTPException(status_code=400, detail=f"Could not read upload: {e}") from e
+        if bounded:
+            return await _process_bounded(upload_path, work_dir, options, client, priority, inline)
 
-        if not page_image_paths:
-            raise HTTPException(status_code=400, detail="No pages or images produced from upload.")
+        cache_key = options.cache_key(content_hash)
+        all_pages_text = document_store.cached_pages(cache_key)
+        cached = all_pages_text is not None
+        if not cached:
+            try:
+                page_image_paths = await _blocking(
+                    inline, prepare_input_images, upload_path, work_dir, dpi=options.dpi, pages=options.pages
+                )
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
+            if not page_image_paths:
+                raise HTTPException(status_code=400, detail="No pages or images produced from upload.")
 
-        all_pages_text = []
-        for img_path in page_image_paths:
             try:
-                raw_text = ocr_text_from_page(img_path)
-                enriched = recognize_math_in_text(raw_text, img_path)
-                all_pages_text.append(enriched)
+                if inline:
+                    all_pages_text = enrich_pages(page_image_paths, options)
+                else:
+                    all_pages_text = await scheduler.enrich_pages_async(page_image_paths, options, client, priority)
+            except cancellation.Cancelled:
+                raise
             except Exception as e:
-                logger.exception("OCR or math recognition failed for %s", img_path)
+                logger.exception("OCR or math recognition failed for %s", upload_path)
                 raise HTTPException(status_code=500, detail=f"Processing failed: {e}") from e
+            document_store.cache_pages(cache_key, all_pages_text)
 
-        combined = "\n\n".join(all_pages_text)
         try:
-            latex_doc = generate_full_document(combined)
+            document_id = await _blocking(inline, document_store.create_document, all_pages_text)
+            latex_doc = document_store.load_latex(document_id)
         except Exception as e:
             logger.exception("LaTeX generation failed")
             raise HTTPException(status_code=500, detail=f"LaTeX generation failed: {e}") from e
 
         pdf_base64: Optional[str] = None
+        if options.compile_pdf:
+            try:
+                pdf_path = await _blocking(
+                    inline, document_store.get_pdf_path, document_id, use_latexmk=options.use_latexmk
+                )
+                with open(pdf_path, "rb") as f:
+                    pdf_base64 = base64.b64encode(f.read()).decode("ascii")
+            except Exception as e:
+                logger.warning("PDF compilation failed (user can still download .tex): %s", e)
+
+    return {
+        "document_id": document_id,
+        "latex": latex_doc,
+        "pdf_base64": pdf_base64,
+        "cached": cached,
+        "bounded": False,
+        "options": dataclasses.asdict(options),
+    }
+
+
+async def _process_bounded(
+    upload_path: str,
+    work_dir: str,
+    options: PipelineOptions,
+    client: str,
+    priority: str,
+    inline: bool,
+) -> dict:
+    """
+    Bounded-memory path of _process_upload: the document is built window by
+    window on disk and returned by URL. The result cache is skipped, since a
+    cache entry would hold every page's text at once.
+    """
+    def enrich(page_paths: List[str], opts: PipelineOptions) -> List[str]:
+        if inline:
+            return enrich_pages(page_paths, opts)
+        return scheduler.enrich_pages_fair(page_paths, opts, client, priority)
+
+    convert = partial(convert_to_document, upload_path, os.path.join(work_dir, "pages"), options, enrich)
+    try:
+        document_id, page_total = convert() if inline else await _run_waiting_on_scheduler(convert)
+    except cancellation.Cancelled:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.exception("Bounded conversion failed for %s", upload_path)
+        raise HTTPException(status_code=500, detail=f"Processing failed: {e}") from e
+
+    if options.compile_pdf:
         try:
-            pdf_bytes = compile_latex_to_pdf(latex_doc)
-            pdf_base64 = base64.b64encode(pdf_bytes).decode("ascii")
+            await _blocking(inline, document_store.get_pdf_path, document_id, use_latexmk=options.use_latexmk)
         except Exception as e:
             logger.warning("PDF compilation failed (user can still download .tex): %s", e)
 
-    return {"latex": latex_doc, "pdf_base64": pdf_base64}
+    return {
+        "document_id": document_id,
+        "pages": page_total,
+        "latex": None,
+        "pdf_base64": None,
+        "latex_url": f"/api/documents/{document_id}.tex",
+        "pdf_url": f"/api/documents/{document_id}.pdf",
+        "cached": False,
+        "bounded": True,
+        "options": dataclasses.asdict(options),
+    }
+
+
+@app.post("/api/batch")
+async def process_batch(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    preset: Optional[str] = Form(None),
+    priority: str = Form("batch"),
+):
+    """
+    Upload several PDFs/images at once. Pages of all files go through OCR in
+    shared batches. Returns one entry per file, in upload order: either
+    {filename, document_id, pages, cached} or {filename, error}. LaTeX and PDFs
+    are fetched per document from /api/documents/{id} and /api/documents/{id}.pdf.
+    preset selects pipeline settings for all files (see /api/process). Work
+    is scheduled at "batch" priority unless priority="interactive". Remaining
+    work is abandoned if the client disconnects.
+    """
+    max_files = get("batch.max_files", 50)
+    if len(files) > max_files:
+        raise HTTPException(status_code=400, detail=f"Too many files. Maximum per batch: {max_files}")
+    _check_priority(priority)
+    try:
+        options = resolve_options(preset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    client = _client_id(request)
+
+    def enrich(page_paths: List[str], opts: PipelineOptions) -> List[str]:
+        return scheduler.enrich_pages_fair(page_paths, opts, client, priority)
+
+    results: List[dict] = [{"filename": f.filename or "upload"} for f in files]
+    with metrics.IN_PROGRESS.track(endpoint="/api/batch"), tempfile.TemporaryDirectory() as work_dir:
+        todo = []  # (result index, upload path, content hash)
+        for i, file in enumerate(files):
+            ext = _get_extension(file.filename or "")
+            if not ext:
+                results[i]["error"] = f"Unsupported file type. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"
+                continue
+            upload_path = os.path.join(work_dir, f"upload_{i:05d}{ext}")
+            try:
+                content_hash = await _stream_upload(file, upload_path)
+            except HTTPException as e:
+                results[i]["error"] = e.detail
+                continue
+            cached_pages = document_store.cached_pages(options.cache_key(content_hash))
+            if cached_pages is not None:
+                results[i].update(
+                    document_id=await run_in_threadpool(document_store.create_document, cached_pages),
+                    pages=len(cached_pages),
+                    cached=True,
+                )
+                continue
+            todo.append((i, upload_path, content_hash))
+
+        pages_dir = os.path.join(work_dir, "pages")
+        uploads = [path for _, path, _ in todo]
+        with cancellation.bind(cancellation.CancelToken()) as token:
+            work = _run_waiting_on_scheduler(
+                lambda: list(convert_documents(uploads, pages_dir, options=options, enrich=enrich))
+            )
+            converted = await _cancel_on_disconnect(request, token, work)
+        for index, pages, error in converted:
+            i, _, content_hash = todo[index]
+            if error is not None:
+                results[i]["error"] = error
+                continue
+            document_store.cache_pages(options.cache_key(content_hash), pages)
+            document_id = await run_in_threadpool(document_store.create_document, pages)
+            results[i].update(document_id=document_id, pages=len(pages), cached=False)
+
+    return {"documents": results}
+
+
+@app.get("/api/documents/{document_id}.pdf")
+def download_pdf(document_id: str):
+    """
+    Compile (on first request) and stream the PDF for a processed document.
+    The compiled PDF is cached, so repeated downloads do not recompile.
+    """
+    try:
+        pdf_path = document_store.get_pdf_path(document_id)
+    except Exception as e:
+        logger.warning("PDF compilation failed for document %s: %s", document_id, e)
+        raise HTTPException(status_code=500, detail=f"PDF compilation failed: {e}") from e
+    if pdf_path is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return FileResponse(pdf_path, media_type="application/pdf", filename="texform_notes.pdf")
+
+
+@app.get("/api/documents/{document_id}.tex")
+def download_tex(document_id: str):
+    """Stream the LaTeX source of a processed document as a file."""
+    path = document_store.tex_path(document_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return FileResponse(path, media_type="application/x-tex", filename="texform_notes.tex")
+
+
+@app.get("/api/profiles/{profile_id}")
+def get_profile(profile_id: str):
+    """List the artifacts of a request profile (debug.profiling_enabled only)."""
+    names = profiling.list_artifacts(profile_id) if profiling.profiling_enabled() else None
+    if names is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return {"profile_id": profile_id, "artifacts": names}
+
+
+@app.get("/api/profiles/{profile_id}/{name}")
+def download_profile_artifact(profile_id: str, name: str):
+    """Download one profile artifact: profile.prof, profile.txt or torch_trace.json."""
+    path = profiling.artifact_path(profile_id, name) if profiling.profiling_enabled() else None
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile artifact not found")
+    media_type = "application/json" if name.endswith(".json") else (
+        "text/plain" if name.endswith(".txt") else "application/octet-stream"
+    )
+    return FileResponse(path, media_type=media_type, filename=name)
+
+
+class PageUpdate(BaseModel):
+    """Corrected text for one page (plain text and/or LaTeX fragments)."""
+
+    text: str
+
+
+@app.get("/api/documents/{document_id}")
+def get_document(document_id: str):
+    """Return the current LaTeX source and page count of a processed document."""
+    latex_doc = document_store.load_latex(document_id)
+    if latex_doc is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {
+        "document_id": document_id,
+        "pages": document_store.page_count(document_id),
+        "latex": latex_doc,
+    }
+
+
+@app.get("/api/documents/{document_id}/pages/{page}")
+def get_document_page(document_id: str, page: int):
+    """Return the stored (enriched OCR) text of one page, 1-based."""
+    text = document_store.load_page(document_id, page)
+    if text is None:
+        raise HTTPException(status_code=404, detail="Document or page not found")
+    return {"document_id": document_id, "page": page, "text": text}
+
+
+@app.put("/api/documents/{document_id}/pages/{page}")
+def update_document_page(document_id: str, page: int, update: PageUpdate):
+    """
+    Replace the text of one page (e.g. after a user corrects OCR output).
+    Only that page is re-rendered; the PDF is recompiled on the next download,
+    reusing the document's build directory.
+    """
+    try:
+        latex_doc = document_store.replace_page(document_id, page, update.text)
+    except IndexError:
+        raise HTTPException(status_code=404, detail="Page not found")
+    if latex_doc is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {"document_id": document_id, "page": page, "latex": latex_doc}
 
 
 # Serve React static files in production (when built) - mount AFTER routes
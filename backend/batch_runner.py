@@ -0,0 +1,185 @@
+"""
+Offline batch conversion: many PDFs/images → .tex (and optionally .pdf) files.
+
+Pages from all inputs flow through the shared pipeline in cross-document
+chunks. Each finished document is written to the output directory straight
+away and recorded in manifest.json, so an interrupted run can be resumed:
+documents already marked done (with an unchanged SHA-256) are skipped.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import uuid
+from typing import Callable, Dict, List, Optional
+
+from backend import document_store
+from backend.latex_generator import compile_latex_to_pdf_file, write_full_document
+from backend.pipeline import PipelineOptions, convert_documents, resolve_options
+
+_log = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+INPUT_EXTENSIONS = {".pdf", ".png", ".jpg", ".jpeg", ".bmp", ".tiff"}
+
+
+def collect_inputs(paths: List[str]) -> List[str]:
+    """
+    Expand files and directories (non-recursive) into a sorted, de-duplicated
+    list of absolute paths of supported inputs.
+    """
+    found: List[str] = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                full = os.path.join(path, name)
+                if os.path.isfile(full) and os.path.splitext(name)[1].lower() in INPUT_EXTENSIONS:
+                    found.append(os.path.abspath(full))
+        elif os.path.isfile(path):
+            found.append(os.path.abspath(path))
+        else:
+            raise FileNotFoundError(path)
+    return list(dict.fromkeys(found))
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(output_dir: str) -> dict:
+    """Return the manifest in output_dir, or an empty one."""
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.isfile(path):
+        return {"files": {}}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        _log.warning("Ignoring unreadable manifest %s: %s", path, e)
+        return {"files": {}}
+    if not isinstance(manifest.get("files"), dict):
+        return {"files": {}}
+    return manifest
+
+
+def _save_manifest(output_dir: str, manifest: dict) -> None:
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _output_stem(input_path: str, digest: str, entries: Dict[str, dict]) -> str:
+    """File stem for an input's outputs; disambiguated when two inputs share a name."""
+    stem = os.path.splitext(os.path.basename(input_path))[0] or "document"
+    taken = {
+        os.path.splitext(entry.get("output") or "")[0]
+        for other, entry in entries.items()
+        if other != input_path
+    }
+    return stem if stem not in taken else f"{stem}-{digest[:8]}"
+
+
+def _is_done(entry: Optional[dict], digest: str, options_key: str, output_dir: str) -> bool:
+    return bool(
+        entry
+        and entry.get("status") == "done"
+        and entry.get("sha256") == digest
+        and entry.get("options_key") == options_key
+        and os.path.isfile(os.path.join(output_dir, entry.get("output") or ""))
+    )
+
+
+def _write_outputs(
+    input_path: str,
+    digest: str,
+    pages: List[str],
+    output_dir: str,
+    options: PipelineOptions,
+    entries: Dict[str, dict],
+) -> dict:
+    stem = _output_stem(input_path, digest, entries)
+    tex_name = stem + ".tex"
+    with open(os.path.join(output_dir, tex_name), "w", encoding="utf-8") as f:
+        write_full_document(f, pages)
+    entry = {
+        "status": "done",
+        "sha256": digest,
+        "options_key": options.cache_key(digest),
+        "pages": len(pages),
+        "output": tex_name,
+        "pdf": None,
+    }
+    if options.compile_pdf:
+        try:
+            with open(os.path.join(output_dir, tex_name), "r", encoding="utf-8") as f:
+                latex = f.read()
+            pdf_name = stem + ".pdf"
+            compile_latex_to_pdf_file(latex, os.path.join(output_dir, pdf_name), use_latexmk=options.use_latexmk)
+            entry["pdf"] = pdf_name
+        except Exception as e:
+            _log.warning("PDF compilation failed for %s: %s", input_path, e)
+            entry["pdf_error"] = str(e)
+    return entry
+
+
+def run_batch(
+    inputs: List[str],
+    output_dir: str,
+    compile_pdf: bool = False,
+    resume: bool = True,
+    pages_per_chunk: Optional[int] = None,
+    on_result: Optional[Callable[[str, dict], None]] = None,
+    preset: Optional[str] = None,
+) -> dict:
+    """
+    Convert every supported file in `inputs` (files and/or directories) and
+    write <name>.tex (and <name>.pdf with compile_pdf) into output_dir.
+    Returns the manifest: {"files": {input path: entry}} where entry has
+    status ("done" / "failed"), sha256, output, pdf, pages or error.
+    on_result(input_path, entry) is called as each document finishes.
+    preset names a pipeline.presets entry (its compile_pdf is ignored in
+    favour of the compile_pdf argument); documents converted earlier with
+    other options are converted again.
+    """
+    options = resolve_options(preset, compile_pdf=compile_pdf)
+    os.makedirs(output_dir, exist_ok=True)
+    files = collect_inputs(inputs)
+    manifest = load_manifest(output_dir) if resume else {"files": {}}
+    entries: Dict[str, dict] = manifest["files"]
+
+    def record(path: str, entry: dict) -> None:
+        entries[path] = entry
+        _save_manifest(output_dir, manifest)
+        if on_result is not None:
+            on_result(path, entry)
+
+    todo = []
+    for path in files:
+        digest = file_sha256(path)
+        if resume and _is_done(entries.get(path), digest, options.cache_key(digest), output_dir):
+            _log.info("Skipping %s (already converted)", path)
+            continue
+        cached = document_store.cached_pages(options.cache_key(digest))
+        if cached is not None:
+            record(path, _write_outputs(path, digest, cached, output_dir, options, entries))
+            continue
+        todo.append((path, digest))
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        results = convert_documents([p for p, _ in todo], work_dir, pages_per_chunk, options)
+        for index, pages, error in results:
+            path, digest = todo[index]
+            if error is not None:
+                record(path, {"status": "failed", "sha256": digest, "error": error})
+                continue
+            document_store.cache_pages(options.cache_key(digest), pages)
+            record(path, _write_outputs(path, digest, pages, output_dir, options, entries))
+
+    return manifest
@@ -0,0 +1,51 @@
+"""
+Cooperative cancellation of a running conversion.
+
+The API binds a CancelToken to the request's context and cancels it when the
+client disconnects. Long-running stages call check_cancelled() between pages
+(rasterizing, math recognition) and between OCR batches, which raises
+Cancelled so the remaining work is skipped. The token travels with the
+context into scheduler tasks and threadpool calls, like per-request timings.
+"""
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+
+class Cancelled(Exception):
+    """The conversion was cancelled (e.g. the client went away)."""
+
+
+class CancelToken:
+    def __init__(self) -> None:
+        self._event = threading.Event()
+        self.reason = ""
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        self.reason = reason
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+
+_current: ContextVar[Optional[CancelToken]] = ContextVar("texform_cancel_token", default=None)
+
+
+@contextmanager
+def bind(token: CancelToken) -> Iterator[CancelToken]:
+    """Make token the current one for the enclosed block (and tasks it submits)."""
+    reset = _current.set(token)
+    try:
+        yield token
+    finally:
+        _current.reset(reset)
+
+
+def check_cancelled() -> None:
+    """Raise Cancelled if the current conversion has been cancelled; cheap otherwise."""
+    token = _current.get()
+    if token is not None and token.cancelled:
+        raise Cancelled(token.reason)
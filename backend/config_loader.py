@@ -1,11 +1,22 @@
 """
 Load and merge config/default.yaml and config/secrets.yaml.
-Provides a single merged config and a dotted-path getter.
+
+The merged config is turned into an immutable Settings snapshot once: typed,
+validated per-section settings for the hot paths (settings().ocr.num_beams),
+a flat dotted-key table behind get("pdf_utils.dpi"), and a fingerprint of the
+whole config for keying caches. reload_config() builds a new snapshot and
+swaps it in with a single assignment, so readers always see either the old
+or the new config, never a mix.
 """
+import hashlib
+import json
 import logging
 import os
+import threading
 from copy import deepcopy
-from typing import Any, Optional
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional
 
 try:
     import yaml
@@ -14,8 +25,9 @@ except ImportError:
 
 _log = logging.getLogger(__name__)
 
-# Lazy-loaded merged config (defaults + secrets overlay)
-_config: Optional[dict] = None
+# Current snapshot (built on first use, replaced by reload_config)
+_settings: Optional["Settings"] = None
+_build_lock = threading.Lock()
 
 
 def _project_root() -> str:
@@ -54,46 +66,255 @@ def _deep_merge(base: dict, overlay: dict) -> dict:
     return base
 
 
-def _load_config() -> dict:
-    global _config
-    if _config is not None:
-        return _config
-    root = _project_root()
-    config_dir = os.path.join(root, "config")
-    default_path = os.path.join(config_dir, "default.yaml")
-    secrets_path = os.path.join(config_dir, "secrets.yaml")
-
-    defaults = _load_yaml(default_path)
-    if not defaults and os.path.isfile(default_path):
-        defaults = {}
-    secrets = _load_yaml(secrets_path)
+def _read_files() -> dict:
+    config_dir = _config_dir()
+    defaults = _load_yaml(os.path.join(config_dir, "default.yaml"))
+    secrets = _load_yaml(os.path.join(config_dir, "secrets.yaml"))
     merged = deepcopy(defaults)
     _deep_merge(merged, secrets)
-    _config = merged
-    return _config
+    return merged
+
+
+def _apply_overrides(config: dict, overrides: Mapping[str, Any]) -> None:
+    for key_path, value in overrides.items():
+        *parents, leaf = key_path.split(".")
+        node = config
+        for part in parents:
+            child = node.get(part)
+            if not isinstance(child, dict):
+                child = node[part] = {}
+            node = child
+        node[leaf] = value
+
+
+def _flatten(obj: Mapping[str, Any], prefix: str = "", out: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Every dotted path of a nested mapping (sections as well as leaves) -> value."""
+    if out is None:
+        out = {}
+    for key, value in obj.items():
+        path = f"{prefix}{key}"
+        out[path] = value
+        if isinstance(value, Mapping):
+            _flatten(value, path + ".", out)
+    return out
+
+
+def _freeze(value: Any) -> Any:
+    """Read-only copy of a config value: dicts become mapping proxies, lists tuples."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(child) for key, child in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _thaw(value: Any) -> Any:
+    """Plain (mutable) copy of a frozen config value."""
+    if isinstance(value, Mapping):
+        return {key: _thaw(child) for key, child in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(item) for item in value]
+    return value
+
+
+def _int_in(value: Any, low: int, high: int, default: int) -> int:
+    """value as an int clamped to [low, high]; default when it is not a number."""
+    try:
+        return max(low, min(int(value), high))
+    except (TypeError, ValueError):
+        return default
+
+
+def _float_in(value: Any, low: float, high: float, default: float) -> float:
+    """value as a float clamped to [low, high]; default when it is not a number."""
+    try:
+        return max(low, min(float(value), high))
+    except (TypeError, ValueError):
+        return default
+
+
+# ─── Typed settings ───────────────────────────────────────────────────────────
+
+@dataclass(frozen=True)
+class PdfSettings:
+    dpi: int
+
+
+@dataclass(frozen=True)
+class PreprocessSettings:
+    enabled: bool
+    max_side: int
+    clean_background: bool
+
+
+@dataclass(frozen=True)
+class OcrSettings:
+    model_name: str
+    device: str
+    max_length: int
+    num_beams: int
+    batch_size: int
+    greedy_decoder: str
+    early_exit: bool
+    # Extra engines (name -> checkpoint) besides "default" (= model_name)
+    engines: Mapping[str, str]
+    engine: str
+    cascade_first: str
+    cascade_fallback: str
+    cascade_min_confidence: float
+
+
+@dataclass(frozen=True)
+class MathSettings:
+    api_url: str
+    include_latex: bool
+    include_mathml: bool
+    timeout: float
+    use_free_backend: bool
+    app_id: Optional[str]
+    app_key: Optional[str]
+
+
+@dataclass(frozen=True)
+class LatexSettings:
+    document_class: str
+    font_size: str
+    margin: str
+    title: str
+    author: str
+    date: str
+    use_latexmk: bool
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Immutable view of the merged config; build with settings(), never directly."""
+
+    pdf: PdfSettings
+    preprocess: PreprocessSettings
+    ocr: OcrSettings
+    math: MathSettings
+    latex: LatexSettings
+    # Merged config tree and dotted path -> value for get(), read-only all the way down
+    tree: Mapping[str, Any]
+    values: Mapping[str, Any]
+    # Short hex digest of the whole merged config
+    fingerprint: str
+
+
+def _build_settings(config: dict) -> Settings:
+    # Nested sections and lists are frozen too: get("pipeline.presets") hands
+    # out parts of the shared snapshot, which no caller may change
+    tree = _freeze(config)
+    values = _flatten(tree)
+
+    def val(key: str, default: Any = None) -> Any:
+        return values.get(key, default)
+
+    dpi = val("pdf_utils.dpi", 200)
+    if not isinstance(dpi, int) or dpi < 72 or dpi > 600:
+        dpi = 200
+    engines = val("ocr_engine.engines")
+    if not isinstance(engines, Mapping):
+        engines = {}
+    geometry = val("latex_generator.page_geometry") or {}
+    margin = str(geometry["margin"]) if isinstance(geometry, Mapping) and geometry.get("margin") else "1in"
+    canonical = json.dumps(config, sort_keys=True, default=str).encode("utf-8")
+
+    return Settings(
+        pdf=PdfSettings(dpi=dpi),
+        preprocess=PreprocessSettings(
+            enabled=bool(val("image_preprocessing.enabled", True)),
+            max_side=_int_in(val("image_preprocessing.max_side", 2000), 256, 10000, 2000),
+            clean_background=bool(val("image_preprocessing.clean_background", True)),
+        ),
+        ocr=OcrSettings(
+            model_name=val("ocr_engine.model_name") or "microsoft/trocr-base-handwritten",
+            device=str(val("ocr_engine.device") or "").strip().lower(),
+            max_length=_int_in(val("ocr_engine.max_length", 512), 1, 1024, 512),
+            num_beams=_int_in(val("ocr_engine.num_beams", 4), 1, 16, 4),
+            batch_size=_int_in(val("ocr_engine.batch_size", 8), 1, 64, 8),
+            greedy_decoder="generate" if val("ocr_engine.greedy_decoder") == "generate" else "cached",
+            early_exit=bool(val("ocr_engine.early_exit", True)),
+            engines=MappingProxyType({str(k): str(v) for k, v in engines.items() if v}),
+            engine=str(val("ocr_engine.engine") or "default"),
+            cascade_first=str(val("ocr_engine.cascade.first") or "default"),
+            cascade_fallback=str(val("ocr_engine.cascade.fallback") or "default"),
+            cascade_min_confidence=_float_in(val("ocr_engine.cascade.min_confidence", 0.6), 0.0, 1.0, 0.6),
+        ),
+        math=MathSettings(
+            api_url=val("math_recognition.api_url", "https://api.mathpix.com/v3/latex"),
+            include_latex=bool(val("math_recognition.include_latex", True)),
+            include_mathml=bool(val("math_recognition.include_mathml", False)),
+            timeout=_int_in(val("math_recognition.timeout", 30), 5, 120, 30),
+            use_free_backend=bool(val("math_recognition.use_free_backend", True)),
+            app_id=val("mathpix.app_id"),
+            app_key=val("mathpix.app_key"),
+        ),
+        latex=LatexSettings(
+            document_class=val("latex_generator.document_class", "article"),
+            font_size=val("latex_generator.font_size", "12pt"),
+            margin=margin,
+            title=val("latex_generator.title", "Converted Notes"),
+            author=val("latex_generator.author", ""),
+            date=val("latex_generator.date", r"\today"),
+            use_latexmk=bool(val("latex_generator.use_latexmk", True)),
+        ),
+        tree=tree,
+        values=MappingProxyType(values),
+        fingerprint=hashlib.sha256(canonical).hexdigest()[:16],
+    )
+
+
+def settings() -> Settings:
+    """
+    The current config snapshot. Resolve it once per operation and read
+    fields from it rather than calling get() in loops.
+    """
+    current = _settings
+    if current is not None:
+        return current
+    with _build_lock:
+        if _settings is None:
+            _swap(_build_settings(_read_files()))
+        return _settings
+
+
+def _swap(new: Settings) -> None:
+    global _settings
+    _settings = new
 
 
 def get_config() -> dict:
-    """Return the merged config (defaults + secrets). Do not mutate the result."""
-    return deepcopy(_load_config())
+    """Return a copy of the merged config (defaults + secrets)."""
+    return _thaw(settings().tree)
 
 
 def get(key_path: str, default: Any = None) -> Any:
     """
     Get a value by dotted path, e.g. get("pdf_utils.dpi") or get("math_recognition.timeout").
-    Returns default if the path is missing.
+    Returns default if the path is missing. Sections and lists come back
+    read-only (mapping proxies and tuples); get_config() gives a mutable copy.
+    """
+    return settings().values.get(key_path.strip(), default)
+
+
+def config_fingerprint() -> str:
+    """Digest of the current config; changes whenever any setting changes."""
+    return settings().fingerprint
+
+
+def reload_config(overrides: Optional[Mapping[str, Any]] = None) -> Settings:
+    """
+    Re-read the config files, apply optional {dotted path: value} overrides
+    (benchmarks and tests), and atomically replace the current snapshot.
+    Requests already holding the old snapshot keep using it.
     """
-    cfg = _load_config()
-    parts = key_path.strip().split(".")
-    obj: Any = cfg
-    for part in parts:
-        if not part or not isinstance(obj, dict) or part not in obj:
-            return default
-        obj = obj[part]
-    return obj
-
-
-def reload_config() -> None:
-    """Force reload of config on next get_config() or get(). Used for tests or hot-reload."""
-    global _config
-    _config = None
+    config = _read_files()
+    if overrides:
+        _apply_overrides(config, overrides)
+    new = _build_settings(config)
+    with _build_lock:
+        _swap(new)
+    _log.info("Config loaded (fingerprint %s)", new.fingerprint)
+    return new
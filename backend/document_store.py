@@ -0,0 +1,362 @@
+"""
+On-disk store for generated documents.
+
+Each processed upload gets a document id; its LaTeX source is kept under the
+store directory so the PDF can be compiled later, on demand, and served as a
+file instead of being base64-encoded into the /api/process response.
+
+Documents are kept per page: the enriched OCR text of every page and its
+rendered LaTeX body fragment are stored separately, so replacing one page
+only re-renders that page. PDFs are compiled in a persistent build directory
+whose main file \\inputs one fragment per page, letting latexmk/pdflatex
+reuse auxiliary files from the previous build.
+
+Layout of a document directory::
+
+    pages/page_001.txt   enriched OCR text of page 1 (source of truth)
+    build/page_001.tex   rendered body fragment of page 1
+    build/document.tex   main file \\input-ing every fragment (for compilation)
+    build/.lock          flock held while a page is replaced or the PDF compiled
+    document.tex         standalone .tex served to clients
+    document.pdf         cached compiled PDF (removed when a page changes)
+
+Pages are spooled to disk as they arrive (DocumentWriter) and document.tex is
+written fragment by fragment, so a document of any length is never held in
+memory as a whole; large documents are served as files (.tex / .pdf).
+
+The store also keeps a small result cache (cache/<key>-<config>.json) mapping
+an upload's content hash to the enriched per-page text it produced, so a
+re-uploaded file skips OCR and math recognition entirely. Entries are keyed by
+the config fingerprint too, so changing OCR or math settings never serves
+results produced under the old ones.
+"""
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # type: ignore[assignment]  # not on Windows: in-process locking only
+
+from backend import metrics
+from backend.config_loader import config_fingerprint, get
+from backend.latex_generator import (
+    compile_latex_to_pdf_file,
+    generate_input_document,
+    render_body,
+    write_document,
+    write_if_changed,
+)
+
+_DOC_ID = re.compile(r"^[0-9a-f]{32}$")
+_TEX_NAME = "document.tex"
+_PDF_NAME = "document.pdf"
+_PAGES_DIR = "pages"
+_BUILD_DIR = "build"
+_CACHE_DIR = "cache"
+_CACHE_KEY = re.compile(r"^[0-9a-f]{16,128}$")
+_LOCK_NAME = ".lock"
+
+# One lock per document so concurrent downloads compile the PDF only once
+_locks: Dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+
+def _store_root() -> str:
+    """Directory holding one sub-directory per document (created if missing)."""
+    root = get("document_store.dir") or os.path.join(tempfile.gettempdir(), "texform_documents")
+    os.makedirs(root, exist_ok=True)
+    return root
+
+
+def _document_dir(doc_id: str) -> Optional[str]:
+    """Return the directory for doc_id, or None if the id is invalid or unknown."""
+    if not doc_id or not _DOC_ID.match(doc_id):
+        return None
+    path = os.path.join(_store_root(), doc_id)
+    return path if os.path.isdir(path) else None
+
+
+def _lock_for(doc_id: str) -> threading.Lock:
+    with _locks_guard:
+        lock = _locks.get(doc_id)
+        if lock is None:
+            lock = _locks[doc_id] = threading.Lock()
+        return lock
+
+
+@contextmanager
+def _document_lock(doc_id: str, doc_dir: str) -> Iterator[None]:
+    """
+    Hold a document exclusively: the in-process lock for threads, plus an
+    flock on build/.lock for the other server worker processes, which would
+    otherwise run LaTeX in the same build directory at the same time.
+    """
+    with _lock_for(doc_id):
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(doc_dir, _BUILD_DIR, _LOCK_NAME), "a") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    """Write data to path via a temp file + rename so readers never see partial files."""
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _page_name(page: int) -> str:
+    return f"page_{page:03d}"
+
+
+def _page_count(doc_dir: str) -> int:
+    pages_dir = os.path.join(doc_dir, _PAGES_DIR)
+    return sum(1 for name in os.listdir(pages_dir) if name.endswith(".txt"))
+
+
+def _render_page(doc_dir: str, page: int, text: str) -> None:
+    """Store a page's enriched text and its rendered body fragment."""
+    name = _page_name(page)
+    _write_atomic(os.path.join(doc_dir, _PAGES_DIR, name + ".txt"), text.encode("utf-8"))
+    fragment = render_body(text)
+    write_if_changed(os.path.join(doc_dir, _BUILD_DIR, name + ".tex"), fragment + "\n")
+
+
+def _fragments(doc_dir: str) -> Iterator[str]:
+    """The cached per-page body fragments, read one at a time."""
+    for page in range(1, _page_count(doc_dir) + 1):
+        with open(os.path.join(doc_dir, _BUILD_DIR, _page_name(page) + ".tex"), "r", encoding="utf-8") as f:
+            yield f.read().rstrip("\n")
+
+
+def _assemble(doc_dir: str) -> None:
+    """Rebuild document.tex from the cached per-page fragments, streaming it to disk."""
+    path = os.path.join(doc_dir, _TEX_NAME)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        write_document(f, _fragments(doc_dir))
+    os.replace(tmp_path, path)
+
+
+def _prune() -> None:
+    """Drop the oldest documents once the store exceeds document_store.max_documents."""
+    max_docs = get("document_store.max_documents", 200)
+    if not isinstance(max_docs, int) or max_docs <= 0:
+        return
+    root = _store_root()
+    entries = [
+        os.path.join(root, name)
+        for name in os.listdir(root)
+        if _DOC_ID.match(name) and os.path.isdir(os.path.join(root, name))
+    ]
+    if len(entries) <= max_docs:
+        return
+    entries.sort(key=os.path.getmtime)
+    for path in entries[: len(entries) - max_docs]:
+        shutil.rmtree(path, ignore_errors=True)
+        with _locks_guard:
+            _locks.pop(os.path.basename(path), None)
+
+
+def _cache_path(key: str) -> Optional[str]:
+    if not key or not _CACHE_KEY.match(key):
+        return None
+    return os.path.join(_store_root(), _CACHE_DIR, f"{key}-{config_fingerprint()}.json")
+
+
+def _prune_cache(cache_dir: str) -> None:
+    """Drop the oldest cached results beyond document_store.max_cached_results."""
+    max_entries = get("document_store.max_cached_results", 500)
+    if not isinstance(max_entries, int) or max_entries <= 0:
+        return
+    entries = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir) if name.endswith(".json")]
+    if len(entries) <= max_entries:
+        return
+    entries.sort(key=os.path.getmtime)
+    for path in entries[: len(entries) - max_entries]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _read_cached(key: str) -> Optional[List[str]]:
+    path = _cache_path(key)
+    if path is None or not os.path.isfile(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            pages = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(pages, list) or not all(isinstance(p, str) for p in pages):
+        return None
+    os.utime(path)  # keep recently used entries from being pruned first
+    return pages
+
+
+# ─── Public API ───────────────────────────────────────────────────────────────
+
+class DocumentWriter:
+    """
+    Build a document page by page: each page is rendered and written to disk
+    as soon as it is added, so only the pages being added are in memory.
+    The document becomes visible under its id when finish() succeeds; used as
+    a context manager, a failed or abandoned document is removed.
+    """
+
+    def __init__(self) -> None:
+        self.doc_id = uuid.uuid4().hex
+        self.pages = 0
+        # Hidden until finished: the name does not match _DOC_ID
+        self._dir = os.path.join(_store_root(), f".{self.doc_id}.partial")
+        os.makedirs(os.path.join(self._dir, _PAGES_DIR))
+        os.makedirs(os.path.join(self._dir, _BUILD_DIR))
+
+    def add_pages(self, pages: Iterable[str]) -> None:
+        """Append the enriched text of the next pages (in page order)."""
+        with metrics.timer("latex_generate"):
+            for text in pages:
+                self.pages += 1
+                _render_page(self._dir, self.pages, text)
+
+    def finish(self) -> str:
+        """Write document.tex, publish the document and return its id."""
+        with metrics.timer("latex_generate"):
+            _assemble(self._dir)
+        os.replace(self._dir, os.path.join(_store_root(), self.doc_id))
+        _prune()
+        return self.doc_id
+
+    def abort(self) -> None:
+        shutil.rmtree(self._dir, ignore_errors=True)
+
+    def __enter__(self) -> "DocumentWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            self.abort()
+
+
+def create_document(pages: List[str]) -> str:
+    """
+    Store a document from the enriched text of each page (in page order)
+    and return its new document id.
+    """
+    with DocumentWriter() as writer:
+        writer.add_pages(pages)
+        return writer.finish()
+
+
+def tex_path(doc_id: str) -> Optional[str]:
+    """Return the path of the stored .tex file (for streaming it), or None if unknown."""
+    doc_dir = _document_dir(doc_id)
+    return None if doc_dir is None else os.path.join(doc_dir, _TEX_NAME)
+
+
+def load_latex(doc_id: str) -> Optional[str]:
+    """Return the stored LaTeX source, or None if the document does not exist."""
+    doc_dir = _document_dir(doc_id)
+    if doc_dir is None:
+        return None
+    with open(os.path.join(doc_dir, _TEX_NAME), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def page_count(doc_id: str) -> Optional[int]:
+    """Return the number of pages in a document, or None if it does not exist."""
+    doc_dir = _document_dir(doc_id)
+    return None if doc_dir is None else _page_count(doc_dir)
+
+
+def load_page(doc_id: str, page: int) -> Optional[str]:
+    """Return the enriched text of a page (1-based), or None if doc or page is missing."""
+    doc_dir = _document_dir(doc_id)
+    if doc_dir is None or not 1 <= page <= _page_count(doc_dir):
+        return None
+    with open(os.path.join(doc_dir, _PAGES_DIR, _page_name(page) + ".txt"), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def replace_page(doc_id: str, page: int, text: str) -> Optional[str]:
+    """
+    Replace the text of one page (1-based) and return the updated LaTeX source.
+    Only that page is re-rendered; the cached PDF is discarded and rebuilt on
+    next download. Returns None if the document does not exist.
+    Raises IndexError if page is out of range.
+    """
+    doc_dir = _document_dir(doc_id)
+    if doc_dir is None:
+        return None
+    with _document_lock(doc_id, doc_dir):
+        if not 1 <= page <= _page_count(doc_dir):
+            raise IndexError(f"Page {page} out of range")
+        _render_page(doc_dir, page, text)
+        _assemble(doc_dir)
+        try:
+            os.remove(os.path.join(doc_dir, _PDF_NAME))
+        except FileNotFoundError:
+            pass
+    return load_latex(doc_id)
+
+
+def get_pdf_path(doc_id: str, use_latexmk: Optional[bool] = None) -> Optional[str]:
+    """
+    Return the path of the compiled PDF for doc_id, compiling and caching it
+    on first use. Returns None if the document does not exist.
+    Raises RuntimeError if LaTeX compilation fails.
+    """
+    doc_dir = _document_dir(doc_id)
+    if doc_dir is None:
+        return None
+    pdf_path = os.path.join(doc_dir, _PDF_NAME)
+    with _document_lock(doc_id, doc_dir):
+        hit = os.path.isfile(pdf_path)
+        metrics.cache_lookup("pdf", hit)
+        if not hit:
+            names = [_page_name(page) for page in range(1, _page_count(doc_dir) + 1)]
+            main_tex = generate_input_document(names)
+            with metrics.timer("latex_compile"):
+                compile_latex_to_pdf_file(
+                    main_tex, pdf_path, build_dir=os.path.join(doc_dir, _BUILD_DIR), use_latexmk=use_latexmk
+                )
+    return pdf_path
+
+
+def cached_pages(key: str) -> Optional[List[str]]:
+    """
+    Return the enriched per-page text previously cached under key (e.g. the
+    SHA-256 of an upload), or None on a miss or when caching is disabled.
+    """
+    if not get("document_store.cache_results", True):
+        return None
+    pages = _read_cached(key)
+    metrics.cache_lookup("ocr_result", pages is not None)
+    return pages
+
+
+def cache_pages(key: str, pages: List[str]) -> None:
+    """Cache the enriched per-page text of an upload under key."""
+    if not get("document_store.cache_results", True):
+        return
+    path = _cache_path(key)
+    if path is None:
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    _write_atomic(path, json.dumps(pages).encode("utf-8"))
+    _prune_cache(os.path.dirname(path))
@@ -1,9 +1,10 @@
 import os
 import shutil
 import tempfile
-from typing import Any, List
+from typing import Any, List, Optional
 
-from backend.pdf_utils import pdf_to_images
+from backend.image_preprocessing import preprocess_photo
+from backend.pdf_utils import pdf_to_images, select_pages
 
 
 def _saved_upload_path(uploaded_file: Any, work_dir: str) -> str:
@@ -57,13 +58,21 @@ def paths_from_upload(uploaded_file: Any, work_dir: str) -> List[str]:
     return prepare_input_images(saved_path, work_dir)
 
 
-def prepare_input_images(upload_path: str, output_folder: str) -> List[str]:
+def prepare_input_images(
+    upload_path: str,
+    output_folder: str,
+    dpi: Optional[int] = None,
+    pages: Optional[str] = None,
+) -> List[str]:
     """
     Given a path to an uploaded file (PDF or image), convert it
     into one-or-more image file paths for downstream processing.
 
-    - PDFs → get split into pages via pdf_to_images()
-    - Single images → copied into our working folder
+    - PDFs → get split into pages via pdf_to_images() (at `dpi`, default from config;
+      only the pages selected by `pages`, e.g. "1-5,9")
+    - Single images → preprocessed into page_001.png (see image_preprocessing:
+      reduced-size decode, EXIF orientation, downscale, background cleanup),
+      or copied unchanged when preprocessing is disabled or cannot decode them
 
     Returns a sorted list of image file paths.
     """
@@ -73,10 +82,16 @@ def prepare_input_images(upload_path: str, output_folder: str) -> List[str]:
     if ext == ".pdf":
 
         # split PDF into page images
-        return pdf_to_images(upload_path, output_folder)
+        return pdf_to_images(upload_path, output_folder, dpi=dpi, pages=pages)
 
     elif ext in {".png", ".jpg", ".jpeg", ".bmp", ".tiff"}:
 
+        select_pages(pages, 1)  # raises if the selection excludes the only page
+
+        preprocessed = preprocess_photo(upload_path, os.path.join(output_folder, "page_001.png"))
+        if preprocessed is not None:
+            return [preprocessed]
+
         # just copy the single image
         dst = os.path.join(output_folder, f"page_001{ext}")
         shutil.copy(upload_path, dst)
@@ -0,0 +1,94 @@
+"""
+Preprocessing of uploaded photos (phone pictures of notes) before OCR.
+
+A photo is decoded, oriented and cleaned once, and the result is saved as the
+page image that both line segmentation and math recognition read:
+
+1. JPEGs are decoded at reduced size (libjpeg DCT scaling via Image.draft),
+   so a 12-megapixel photo is never fully decoded when a fraction will do.
+2. The EXIF orientation is applied, so portrait photos are not read sideways.
+3. The image is downscaled to image_preprocessing.max_side and made grayscale.
+4. With image_preprocessing.clean_background, the paper background (above an
+   Otsu threshold) is whitened and isolated specks are dropped, in NumPy.
+"""
+import logging
+import math
+import os
+from typing import Optional
+
+import numpy as np
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from backend import metrics
+from backend.config_loader import settings
+
+_log = logging.getLogger(__name__)
+
+
+def _otsu_threshold(gray: np.ndarray) -> int:
+    """Gray level separating ink from background (Otsu's method on the histogram)."""
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    weight_bg = np.cumsum(hist)
+    weight_fg = gray.size - weight_bg
+    cum_sum = np.cumsum(hist * np.arange(256))
+    mean_bg = cum_sum / np.maximum(weight_bg, 1)
+    mean_fg = (cum_sum[-1] - cum_sum) / np.maximum(weight_fg, 1)
+    between = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+    return int(np.argmax(between))
+
+
+def _clean_background(gray: np.ndarray) -> np.ndarray:
+    """
+    Whiten pixels brighter than the Otsu threshold (paper, shadows) and drop
+    ink pixels with fewer than two ink neighbours (sensor noise, dust).
+    Ink keeps its gray levels, which TrOCR reads better than hard black.
+    """
+    out = gray.copy()
+    out[gray > _otsu_threshold(gray)] = 255
+    ink = out < 255
+    padded = np.pad(ink, 1).astype(np.uint8)
+    h, w = ink.shape
+    neighbours = sum(
+        padded[1 + dy: 1 + dy + h, 1 + dx: 1 + dx + w]
+        for dy in (-1, 0, 1)
+        for dx in (-1, 0, 1)
+        if dy or dx
+    )
+    out[ink & (neighbours < 2)] = 255
+    return out
+
+
+def _decode(path: str, max_side: int) -> Image.Image:
+    """Open an image, decoding JPEGs at the smallest DCT scale still >= max_side."""
+    image = Image.open(path)
+    longest = max(image.size)
+    if image.format == "JPEG" and longest > max_side:
+        scale = max_side / longest
+        image.draft("L", (math.ceil(image.width * scale), math.ceil(image.height * scale)))
+    return image
+
+
+def preprocess_photo(image_path: str, output_path: str) -> Optional[str]:
+    """
+    Write the preprocessed page image for a photo to output_path (PNG) and
+    return it. Returns None when preprocessing is disabled or the file cannot
+    be decoded; callers then use the upload unchanged.
+    """
+    cfg = settings().preprocess
+    if not cfg.enabled:
+        return None
+    with metrics.timer("preprocess"):
+        try:
+            image = _decode(image_path, cfg.max_side)
+            image = ImageOps.exif_transpose(image)
+        except (OSError, UnidentifiedImageError) as e:
+            _log.warning("Could not decode %s for preprocessing: %s", os.path.basename(image_path), e)
+            return None
+        image = image.convert("L")
+        if max(image.size) > cfg.max_side:
+            image.thumbnail((cfg.max_side, cfg.max_side), Image.LANCZOS)
+        if cfg.clean_background:
+            image = Image.fromarray(_clean_background(np.asarray(image)))
+        # Fast compression: the file only lives for the duration of the request
+        image.save(output_path, format="PNG", compress_level=1)
+    return output_path
@@ -1,21 +1,24 @@
 import logging
 import os
-import re
 import shutil
 import subprocess
 import tempfile
-from backend.config_loader import get
+import uuid
+from io import StringIO
+from typing import Iterable, List, Optional, TextIO
+
+from backend.config_loader import settings
 
 
 # ─── Helpers ──────────────────────────────────────────────────────────────────
 
-def escape_text(paragraph: str) -> str:
-    """
-    Escape LaTeX special characters in a plaintext paragraph.
-    """
+_TEXTBACKSLASH = r"\textbackslash{}"
+
+
+def _escape_specials(text: str) -> str:
+    """Escape every LaTeX special except backslash (each replace is a C-level scan)."""
     return (
-        paragraph
-        .replace("\\", r"\textbackslash{}")
+        text
         .replace("&", r"\&")
         .replace("%", r"\%")
         .replace("$", r"\$")
@@ -27,6 +30,18 @@ def escape_text(paragraph: str) -> str:
         .replace("~", r"\~{}")
     )
 
+
+def escape_text(paragraph: str) -> str:
+    """
+    Escape LaTeX special characters in a plaintext paragraph.
+
+    Backslashes are handled by splitting on them and joining the escaped pieces
+    with \\textbackslash{}, so no replacement output is ever escaped again.
+    """
+    if "\\" not in paragraph:
+        return _escape_specials(paragraph)
+    return _TEXTBACKSLASH.join(map(_escape_specials, paragraph.split("\\")))
+
 def is_display_math(p: str) -> bool:
     """
     Detect if a paragraph is already a LaTeX display‑math environment.
@@ -41,22 +56,38 @@ def looks_like_math(p: str) -> bool:
     """
     Heuristic to catch math‑heavy paragraphs (contains =, ^, _, \\ etc).
     """
-    return bool(re.search(r"[=\\\^_{}]", p))
+    # Six substring tests are C-level scans, several times faster than a
+    # character-class regex search on typical paragraphs.
+    return "=" in p or "\\" in p or "^" in p or "_" in p or "{" in p or "}" in p
+
+
+def _render_paragraph(p: str) -> str:
+    """Classify one stripped, non-empty paragraph and format it accordingly."""
+    first = p[0]
+    if first == "\\" and is_display_math(p):
+        # already a \[...\] or equation environment
+        return p
+    if first == "$" and p[-1] == "$":
+        # already inline‑math wrapped
+        return p
+    if looks_like_math(p):
+        # wrap any stray math in display math
+        return f"\\[\n{p.strip('$')}\n\\]"
+    # plain text → escape special chars
+    return escape_text(p)
 
 
 # ─── Document Generation ────────────────────────────────────────────────────
 
 def _build_preamble() -> str:
     """Build LaTeX preamble from config (or sensible defaults)."""
-    doc_class = get("latex_generator.document_class", "article")
-    font_size = get("latex_generator.font_size", "12pt")
-    margin = "1in"
-    geo = get("latex_generator.page_geometry") or {}
-    if isinstance(geo, dict) and geo.get("margin"):
-        margin = str(geo["margin"])
-    title = get("latex_generator.title", "Converted Notes")
-    author = get("latex_generator.author", "")
-    date_val = get("latex_generator.date", r"\today")
+    cfg = settings().latex
+    doc_class = cfg.document_class
+    font_size = cfg.font_size
+    margin = cfg.margin
+    title = cfg.title
+    author = cfg.author
+    date_val = cfg.date
     if date_val and not date_val.startswith("\\"):
         date_val = date_val.replace("\\", "\\\\")
     return (
@@ -81,74 +112,222 @@ def _build_preamble() -> str:
     )
 
 
-def generate_full_document(content: str) -> str:
+def render_body(content: str) -> str:
     """
-    Wrap the provided text + LaTeX fragments into a full .tex document.
+    Turn text + LaTeX fragments into document body markup (no preamble).
+    Paragraphs are separated by blank lines and classified one by one, so a
+    page's body can be rendered and cached independently of the others.
     """
-    preamble = _build_preamble()
-    body_parts = []
     # split on double‑newlines, filter out empty
-    for p in filter(None, (p.strip() for p in content.split("\n\n"))):
-        if is_display_math(p):
-            # already a \[...\] or equation environment
-            body_parts.append(p)
-        elif p.startswith("$") and p.endswith("$"):
-            # already inline‑math wrapped
-            body_parts.append(p)
-        elif looks_like_math(p):
-            # wrap any stray math in display math
-            math_code = p.strip("$")
-            body_parts.append(f"\\[\n{math_code}\n\\]")
-        else:
-            # plain text → escape special chars
-            body_parts.append(escape_text(p))
+    paragraphs = filter(None, (p.strip() for p in content.split("\n\n")))
+    return "\n\n".join(map(_render_paragraph, paragraphs))
 
+
+def write_document(out: TextIO, bodies: Iterable[str]) -> None:
+    """
+    Stream a full .tex document to `out`, one body fragment at a time, so a
+    document with hundreds of pages never exists as a single string.
+    """
+    out.write(_build_preamble())
+    first = True
+    for body in bodies:
+        if not body:
+            continue
+        if not first:
+            out.write("\n\n")
+        out.write(body)
+        first = False
+    out.write("\n\n" + r"\end{document}")
+
+
+def assemble_document(bodies: List[str]) -> str:
+    """
+    Join already-rendered body fragments (e.g. one per page) into a full .tex document.
+    """
+    out = StringIO()
+    write_document(out, bodies)
+    return out.getvalue()
+
+
+def generate_input_document(fragment_names: List[str]) -> str:
+    """
+    Build a main .tex file that pulls each body fragment in with \\input, so a
+    persistent build directory only needs the changed fragment rewritten.
+    """
     closing = r"\end{document}"
-    return preamble + "\n\n".join(body_parts) + "\n\n" + closing
+    body = "\n\n".join(f"\\input{{{name}}}" for name in fragment_names)
+    return _build_preamble() + body + "\n\n" + closing
+
+
+def generate_full_document(content: str) -> str:
+    """
+    Wrap the provided text + LaTeX fragments into a full .tex document.
+    """
+    return assemble_document([render_body(content)])
+
+
+def write_full_document(out: TextIO, pages: Iterable[str]) -> None:
+    """
+    Streaming form of generate_full_document("\\n\\n".join(pages)): each page
+    is rendered and written on its own (same output, no joined string).
+    """
+    write_document(out, map(render_body, pages))
 
 
 # ─── PDF Compilation ────────────────────────────────────────────────────────
 
-def compile_latex_to_pdf(latex_str: str) -> bytes:
+def write_if_changed(path: str, text: str) -> bool:
+    """
+    Write text to path unless the file already holds exactly that text, so
+    unchanged fragments keep their timestamps in a persistent build directory.
+    Returns True if the file was written.
+    """
+    if os.path.isfile(path):
+        with open(path, "r", encoding="utf-8") as f:
+            if f.read() == text:
+                return False
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    return True
+
+
+# Page text comes from users (OCR corrections) and math paragraphs reach the
+# document unescaped, so the compiler must not run shell commands or read and
+# write files outside the build directory (kpathsea "paranoid" mode, which
+# still allows files found through the TeX search path).
+_LATEX_FLAGS = ["-interaction=nonstopmode", "-halt-on-error", "-no-shell-escape"]
+_LATEX_ENV = {"openin_any": "p", "openout_any": "p", "shell_escape": "f"}
+
+# Files a failed run can leave half-written; removed so the next build starts clean
+_AUX_EXTENSIONS = (".aux", ".out", ".toc", ".fls", ".fdb_latexmk")
+
+
+def _remove_aux_files(work_dir: str, stem: str) -> None:
+    for ext in _AUX_EXTENSIONS:
+        try:
+            os.remove(os.path.join(work_dir, stem + ext))
+        except FileNotFoundError:
+            pass
+
+
+def _run_latex(work_dir: str, tex_name: str, use_latexmk: Optional[bool] = None) -> None:
+    """
+    Run latexmk (or pdflatex) on work_dir/tex_name, without shell escape and
+    with file access restricted to the build directory. Raises RuntimeError
+    on failure, after removing the auxiliary files of the failed run.
+    When an .aux file from an earlier build is present and the first pdflatex
+    pass leaves it unchanged, the second pass is skipped.
+    """
+    if use_latexmk is None:
+        use_latexmk = settings().latex.use_latexmk
+    has_latexmk = use_latexmk and shutil.which("latexmk")
+    compile_cmd = ["latexmk", "-pdf", *_LATEX_FLAGS, tex_name]
+    fallback_cmd = ["pdflatex", *_LATEX_FLAGS, tex_name]
+    cmd = compile_cmd if has_latexmk else fallback_cmd
+    env = {**os.environ, **_LATEX_ENV}
+
+    stem = os.path.splitext(tex_name)[0]
+    aux_path = os.path.join(work_dir, stem + ".aux")
+
+    def read_aux():
+        if not os.path.isfile(aux_path):
+            return None
+        with open(aux_path, "rb") as f:
+            return f.read()
+
+    # latexmk handles multiple passes internally; pdflatex needs two runs
+    passes = 1 if has_latexmk else 2
+    for _ in range(passes):
+        aux_before = read_aux()
+        proc = subprocess.run(
+            cmd,
+            cwd=work_dir,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        if proc.returncode != 0:
+            _remove_aux_files(work_dir, stem)
+            log = (
+                proc.stdout.decode("utf-8", errors="replace")
+                + "\n"
+                + proc.stderr.decode("utf-8", errors="replace")
+            )
+            logging.error("LaTeX compile error:\n%s", log)
+            raise RuntimeError(f"LaTeX compilation failed:\n{log}")
+        if aux_before is not None and read_aux() == aux_before:
+            break
+
+
+def _compile_in(build_dir: str, latex_str: str, use_latexmk: Optional[bool]) -> str:
+    """Compile latex_str as build_dir/document.tex and return the path of the PDF."""
+    os.makedirs(build_dir, exist_ok=True)
+    write_if_changed(os.path.join(build_dir, "document.tex"), latex_str)
+
+    _run_latex(build_dir, "document.tex", use_latexmk)
+
+    pdf_path = os.path.join(build_dir, "document.pdf")
+    if not os.path.isfile(pdf_path):
+        raise RuntimeError(
+            "LaTeX compilation produced no PDF. "
+            "Ensure pdflatex or latexmk is installed."
+        )
+    return pdf_path
+
+
+def compile_latex_to_pdf(
+    latex_str: str,
+    build_dir: Optional[str] = None,
+    use_latexmk: Optional[bool] = None,
+) -> bytes:
     """
     Compile a LaTeX string to PDF, using latexmk if available,
     otherwise falling back to pdflatex.
     Returns raw PDF bytes.
+
+    With build_dir, compilation happens in that (persistent) directory so
+    auxiliary files and \\input fragments from earlier builds are reused;
+    otherwise a throwaway temporary directory is used. use_latexmk overrides
+    latex_generator.use_latexmk for this call.
     """
-    with tempfile.TemporaryDirectory() as tmpdir:
-        tex_path = os.path.join(tmpdir, "document.tex")
-        with open(tex_path, "w", encoding="utf-8") as f:
-            f.write(latex_str)
-
-        use_latexmk = get("latex_generator.use_latexmk", True)
-        has_latexmk = use_latexmk and shutil.which("latexmk")
-        compile_cmd = ["latexmk", "-pdf", "-interaction=nonstopmode", "-halt-on-error", "document.tex"]
-        fallback_cmd = ["pdflatex", "-interaction=nonstopmode", "-halt-on-error", "document.tex"]
-        cmd = compile_cmd if has_latexmk else fallback_cmd
-
-        # latexmk handles multiple passes internally; pdflatex needs two runs
-        passes = 1 if has_latexmk else 2
-        for _ in range(passes):
-            proc = subprocess.run(
-                cmd,
-                cwd=tmpdir,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-            )
-            if proc.returncode != 0:
-                log = (
-                    proc.stdout.decode("utf-8", errors="replace")
-                    + "\n"
-                    + proc.stderr.decode("utf-8", errors="replace")
-                )
-                logging.error("LaTeX compile error:\n%s", log)
-                raise RuntimeError(f"LaTeX compilation failed:\n{log}")
-
-        pdf_path = os.path.join(tmpdir, "document.pdf")
-        if not os.path.isfile(pdf_path):
-            raise RuntimeError(
-                "LaTeX compilation produced no PDF. "
-                "Ensure pdflatex or latexmk is installed."
-            )
-        with open(pdf_path, "rb") as f:
-            return f.read()
\ No newline at end of file
+    if build_dir is None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            return compile_latex_to_pdf(latex_str, tmpdir, use_latexmk)
+
+    with open(_compile_in(build_dir, latex_str, use_latexmk), "rb") as f:
+        return f.read()
+
+
+def compile_latex_to_pdf_file(
+    latex_str: str,
+    pdf_path: str,
+    build_dir: Optional[str] = None,
+    use_latexmk: Optional[bool] = None,
+) -> str:
+    """
+    Like compile_latex_to_pdf, but put the compiled PDF at pdf_path (via an
+    atomic rename, so readers never see a partial file) and return pdf_path.
+    The PDF is never read into memory. Without build_dir, a temporary
+    directory next to pdf_path is used and the PDF is simply moved out of it.
+    A persistent build_dir keeps its document.pdf, so latexmk can tell the
+    next build is incremental; the PDF is copied rather than hard-linked,
+    since pdflatex rewrites its output file in place and would truncate the
+    published copy during the next build.
+    """
+    if build_dir is None:
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(pdf_path))) as tmpdir:
+            os.replace(_compile_in(tmpdir, latex_str, use_latexmk), pdf_path)
+            return pdf_path
+
+    built = _compile_in(build_dir, latex_str, use_latexmk)
+    tmp_path = f"{pdf_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        shutil.copyfile(built, tmp_path)
+        os.replace(tmp_path, pdf_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return pdf_path
@@ -1,11 +1,12 @@
 import base64
+import importlib.util
 import logging
 import os
 from typing import Optional
 
-import requests
-
-from backend.config_loader import get
+from backend import metrics
+from backend.config_loader import MathSettings, settings
+from backend.ml_env import prepare_ml_imports
 
 # Placeholder values in config that mean "not set"
 _CRED_PLACEHOLDERS = {"<YOUR_MATHPIX_APP_ID>", "<YOUR_MATHPIX_APP_KEY>", ""}
@@ -18,11 +19,8 @@ def _pix2text_available() -> bool:
     global _PIX2TEXT_AVAILABLE
     if _PIX2TEXT_AVAILABLE is not None:
         return _PIX2TEXT_AVAILABLE
-    try:
-        from pix2text import Pix2Text  # noqa: F401
-        _PIX2TEXT_AVAILABLE = True
-    except ImportError:
-        _PIX2TEXT_AVAILABLE = False
+    # find_spec only locates the package; the (slow) import happens on first use
+    _PIX2TEXT_AVAILABLE = importlib.util.find_spec("pix2text") is not None
     return _PIX2TEXT_AVAILABLE
 
 
@@ -34,15 +32,17 @@ def _call_pix2text(image_path: str) -> Optional[str]:
     if not _pix2text_available():
         return None
     try:
+        prepare_ml_imports()
         from pix2text import Pix2Text
-        p2t = Pix2Text.from_config()
-        # Prefer recognize() (1.x); fallback to recognize_text_formula()
-        if hasattr(p2t, "recognize"):
-            out = p2t.recognize(image_path)
-        elif hasattr(p2t, "recognize_text_formula"):
-            out = p2t.recognize_text_formula(image_path, return_text=True)
-        else:
-            return None
+        with metrics.timer("pix2text"):
+            p2t = Pix2Text.from_config()
+            # Prefer recognize() (1.x); fallback to recognize_text_formula()
+            if hasattr(p2t, "recognize"):
+                out = p2t.recognize(image_path)
+            elif hasattr(p2t, "recognize_text_formula"):
+                out = p2t.recognize_text_formula(image_path, return_text=True)
+            else:
+                return None
         if out is None:
             return None
         if isinstance(out, str):
@@ -63,10 +63,10 @@ def _call_pix2text(image_path: str) -> Optional[str]:
         return None
 
 
-def _mathpix_credentials() -> tuple[Optional[str], Optional[str]]:
+def _mathpix_credentials(cfg: MathSettings) -> tuple[Optional[str], Optional[str]]:
     """Return (app_id, app_key) from env first, then config, ignoring placeholders."""
-    app_id = os.getenv("MATHPIX_APP_ID") or get("mathpix.app_id")
-    app_key = os.getenv("MATHPIX_APP_KEY") or get("mathpix.app_key")
+    app_id = os.getenv("MATHPIX_APP_ID") or cfg.app_id
+    app_key = os.getenv("MATHPIX_APP_KEY") or cfg.app_key
     if not app_id or str(app_id).strip() in _CRED_PLACEHOLDERS:
         app_id = None
     if not app_key or str(app_key).strip() in _CRED_PLACEHOLDERS:
@@ -79,16 +79,12 @@ def _call_mathpix(image_b64: str) -> Optional[str]:
     Send a base64‑encoded PNG to MathPix and return the 'latex_normal' result.
     Returns None on error or if credentials are missing.
     """
-    app_id, app_key = _mathpix_credentials()
+    cfg = settings().math
+    app_id, app_key = _mathpix_credentials(cfg)
     if not app_id or not app_key:
         logging.warning("MathPix credentials not set; skipping math recognition.")
         return None
 
-    api_url = get("math_recognition.api_url", "https://api.mathpix.com/v3/latex")
-    timeout = get("math_recognition.timeout", 30)
-    timeout = max(5, min(int(timeout) if isinstance(timeout, (int, float)) else 30, 120))
-
-    include_mathml = get("math_recognition.include_mathml", False)
     headers = {
         "app_id": app_id,
         "app_key": app_key,
@@ -98,13 +94,16 @@ def _call_mathpix(image_b64: str) -> Optional[str]:
         "src": f"data:image/png;base64,{image_b64}",
         "formats": ["latex_normal"],
         "data_options": {
-            "include_latex": get("math_recognition.include_latex", True),
-            "include_mathml": include_mathml,
+            "include_latex": cfg.include_latex,
+            "include_mathml": cfg.include_mathml,
         },
     }
 
+    import requests
+
     try:
-        resp = requests.post(api_url, json=payload, headers=headers, timeout=timeout)
+        with metrics.timer("mathpix"):
+            resp = requests.post(cfg.api_url, json=payload, headers=headers, timeout=cfg.timeout)
         resp.raise_for_status()
         data = resp.json()
         return data.get("latex_normal")
@@ -113,32 +112,37 @@ def _call_mathpix(image_b64: str) -> Optional[str]:
         return None
 
 
-def recognize_math_in_text(raw_text: str, image_path: Optional[str] = None) -> str:
+MATH_BACKENDS = ("auto", "mathpix", "pix2text", "none")
+
+
+def recognize_math_in_text(raw_text: str, image_path: Optional[str] = None, backend: str = "auto") -> str:
     """
     Take raw OCR text and (optionally) an image; detect math via MathPix (if configured)
     or Pix2Text (free, offline fallback), and return a combined string.
+
+    backend selects the recognizer: "auto" (MathPix, then Pix2Text when
+    math_recognition.use_free_backend is set), "mathpix", "pix2text" or "none".
     """
     enriched = raw_text.strip()
 
-    if not image_path:
-        return enriched
-
-    try:
-        with open(image_path, "rb") as f:
-            img_b64 = base64.b64encode(f.read()).decode()
-    except Exception as e:
-        logging.error("Error reading image for math recognition %s: %s", image_path, e)
+    if not image_path or backend == "none":
         return enriched
 
     # Prefer MathPix when credentials are set
-    latex_math = _call_mathpix(img_b64)
-    if latex_math:
-        enriched += "\n\n" + "\\[\n" + latex_math.strip() + "\n\\]"
-        return enriched
+    if backend in ("auto", "mathpix"):
+        try:
+            with open(image_path, "rb") as f:
+                img_b64 = base64.b64encode(f.read()).decode()
+        except Exception as e:
+            logging.error("Error reading image for math recognition %s: %s", image_path, e)
+            return enriched
+        latex_math = _call_mathpix(img_b64)
+        if latex_math:
+            enriched += "\n\n" + "\\[\n" + latex_math.strip() + "\n\\]"
+            return enriched
 
     # Free path: Pix2Text when MathPix is not configured (or failed)
-    use_free = get("math_recognition.use_free_backend", True)
-    if use_free:
+    if backend == "pix2text" or (backend == "auto" and settings().math.use_free_backend):
         p2t_result = _call_pix2text(image_path)
         if p2t_result:
             enriched += "\n\n" + p2t_result
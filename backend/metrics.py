@@ -0,0 +1,222 @@
+"""
+Lightweight in-process instrumentation: counters, gauges, histograms and
+per-stage timers, exported in Prometheus text format by /api/metrics.
+
+    with metrics.timer("ocr_generate"):
+        ...
+    PAGES.inc()
+
+timer() also feeds per-request timings when the caller wraps the request in
+collect_timings(), which is how /api/process can return a `timings` field.
+
+Values are per process; with several server workers each worker reports its
+own series (scrape them individually or aggregate by instance).
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+_LabelKey = Tuple[Tuple[str, str], ...]
+
+_registry: List["_Metric"] = []
+_registry_lock = threading.Lock()
+
+# Per-request stage timings (stage -> seconds), active inside collect_timings()
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("texform_request_timings", default=None)
+
+# Seconds; covers sub-millisecond regex work up to multi-minute PDFs
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _label_key(labels: Dict[str, str]) -> _LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(key: _LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def _reset(self) -> None:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, optionally split by labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text)
+        self._values: Dict[_LabelKey, float] = {}
+
+    def inc(self, value: float = 1, **labels: str) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(_label_key(labels), 0)
+
+    def _samples(self) -> Iterator[str]:
+        for key, value in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(key)} {_format_value(value)}"
+
+    def _reset(self) -> None:
+        self._values.clear()
+
+
+class Gauge(Counter):
+    """Value that can go up and down (e.g. requests in progress, queue depth)."""
+
+    kind = "gauge"
+
+    def dec(self, value: float = 1, **labels: str) -> None:
+        self.inc(-value, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    @contextmanager
+    def track(self, **labels: str) -> Iterator[None]:
+        """Increment for the duration of the block."""
+        self.inc(1, **labels)
+        try:
+            yield
+        finally:
+            self.dec(1, **labels)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values with cumulative buckets, sum and count."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text)
+        self._buckets = tuple(sorted(buckets))
+        # label key -> [per-bucket counts..., sum, count]
+        self._values: Dict[_LabelKey, List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * (len(self._buckets) + 2)
+            for i, bound in enumerate(self._buckets):
+                if value <= bound:
+                    row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def count(self, **labels: str) -> int:
+        with self._lock:
+            row = self._values.get(_label_key(labels))
+            return int(row[-1]) if row else 0
+
+    def _samples(self) -> Iterator[str]:
+        for key, row in sorted(self._values.items()):
+            for bound, count in zip(self._buckets, row):
+                yield f"{self.name}_bucket{_format_labels(key, (('le', _format_value(bound)),))} {_format_value(count)}"
+            yield f"{self.name}_bucket{_format_labels(key, (('le', '+Inf'),))} {_format_value(row[-1])}"
+            yield f"{self.name}_sum{_format_labels(key)} {_format_value(row[-2])}"
+            yield f"{self.name}_count{_format_labels(key)} {_format_value(row[-1])}"
+
+    def _reset(self) -> None:
+        self._values.clear()
+
+
+# ─── Shared metrics ───────────────────────────────────────────────────────────
+
+STAGE_SECONDS = Histogram("texform_stage_seconds", "Time spent in each pipeline stage.")
+PAGES = Counter("texform_pages_total", "Page images processed by OCR.")
+LINES = Counter("texform_lines_total", "Text lines segmented and sent to OCR.")
+TOKENS = Counter("texform_tokens_total", "Tokens emitted by the OCR decoder (up to end-of-sequence, without padding).")
+CACHE_REQUESTS = Counter("texform_cache_requests_total", "Cache lookups by cache and result (hit/miss).")
+REQUESTS = Counter("texform_requests_total", "API requests by endpoint and status code.")
+IN_PROGRESS = Gauge("texform_requests_in_progress", "API requests currently being processed.")
+
+
+@contextmanager
+def timer(stage: str) -> Iterator[None]:
+    """Time a block into texform_stage_seconds{stage=...} and the current request's timings."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    """Record an already measured duration, like timer() does for a block."""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def collect_timings() -> Iterator[Dict[str, float]]:
+    """Collect stage -> seconds for every timer() run inside the block (summed per stage)."""
+    timings: Dict[str, float] = {}
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+
+def cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def render() -> str:
+    """All metrics in Prometheus text exposition format (version 0.0.4)."""
+    with _registry_lock:
+        metrics = list(_registry)
+    return "\n".join(m.render() for m in metrics) + "\n"
+
+
+def reset() -> None:
+    """Clear all recorded values (for tests)."""
+    with _registry_lock:
+        metrics = list(_registry)
+    for m in metrics:
+        with m._lock:
+            m._reset()
@@ -0,0 +1,28 @@
+"""
+Import-time environment for the ML stack (torch / transformers / pix2text).
+
+Heavy libraries are imported lazily, when the stage that needs them first
+runs, so `import api.main` stays fast. Call prepare_ml_imports() right before
+importing transformers or anything that pulls it in.
+"""
+import importlib.machinery
+import os
+import sys
+
+
+def prepare_ml_imports() -> None:
+    """
+    Make transformers use PyTorch only and never import TensorFlow.
+
+    Even with TRANSFORMERS_NO_TF=1, some versions of transformers import TF in
+    image_transforms.py, hitting the ml_dtypes "handle" crash on systems where
+    TF is installed; a stub module blocks it. The stub needs a proper __spec__
+    so torch._dynamo.trace_rules doesn't fail on find_spec(). Idempotent.
+    """
+    os.environ.setdefault("TRANSFORMERS_NO_TF", "1")
+    os.environ.setdefault("USE_TORCH", "1")
+    if "tensorflow" not in sys.modules:
+        fake_tf = type(sys)("tensorflow")
+        fake_tf.__version__ = "0.0.0"
+        fake_tf.__spec__ = importlib.machinery.ModuleSpec("tensorflow", None)
+        sys.modules["tensorflow"] = fake_tf
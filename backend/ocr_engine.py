@@ -1,58 +1,212 @@
-import importlib.machinery
-import os
-import sys
-from typing import List, Optional
-
-# Block TensorFlow before any transformers/torchvision import to avoid
-# the ml_dtypes "handle" crash on systems where TF is installed.
-if "tensorflow" not in sys.modules:
-    _fake_tf = type(sys)("tensorflow")
-    _fake_tf.__version__ = "0.0.0"
-    _fake_tf.__spec__ = importlib.machinery.ModuleSpec("tensorflow", None)
-    sys.modules["tensorflow"] = _fake_tf
-
-os.environ.setdefault("TRANSFORMERS_NO_TF", "1")
-os.environ.setdefault("USE_TORCH", "1")
+"""
+Handwriting OCR: line segmentation plus TrOCR engines behind a registry.
+
+Each engine is a named TrOCR checkpoint ("default" is ocr_engine.model_name,
+others come from ocr_engine.engines, e.g. "small") that loads its weights on
+first use and reports their size (texform_ocr_engine_bytes). Several engines
+can be loaded side by side. The engine name "cascade" runs lines through
+ocr_engine.cascade.first (a small, fast model) and re-runs only the lines it
+decoded with low confidence on ocr_engine.cascade.fallback.
+"""
+import logging
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
 
 import numpy as np
-import torch
 from PIL import Image
 
-from backend.config_loader import get
+from backend import metrics, profiling
+from backend.cancellation import check_cancelled
+from backend.config_loader import settings
+from backend.ml_env import prepare_ml_imports
+
+_log = logging.getLogger(__name__)
+
+DEFAULT_ENGINE = "default"
+CASCADE = "cascade"
+
+ENGINE_BYTES = metrics.Gauge("texform_ocr_engine_bytes", "Parameter and buffer memory of loaded OCR engines.")
+CASCADE_LINES = metrics.Counter(
+    "texform_ocr_cascade_lines_total", "Lines recognised in cascade mode, by the engine whose text was kept."
+)
+
+# Per-thread token id buffer of the cached greedy decoder, reused across batches
+_buffers = threading.local()
+
+
+def _model_bytes(model) -> int:
+    """Memory held by a torch module's parameters and buffers."""
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+class TrOCREngine:
+    """
+    One TrOCR checkpoint under a registry name. torch and transformers are
+    imported and the weights loaded on first use, not at module import, so
+    the API and CLI tools start without paying for them.
+    """
+
+    def __init__(self, name: str, model_name: str, device: str = ""):
+        self.name = name
+        self.model_name = model_name
+        self.device_setting = device
+        self.processor = None
+        self.model = None
+        self.device = None
+        self.memory_bytes = 0
+        self._load_lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self.processor is not None and self.model is not None
+
+    def load(self) -> None:
+        """Load the processor and model once (thread-safe)."""
+        if self.loaded:
+            return
+        with self._load_lock:
+            if self.loaded:
+                return
+            prepare_ml_imports()
+
+            try:
+                from transformers import TrOCRProcessor, VisionEncoderDecoderModel
+            except ImportError as e:
+                raise RuntimeError(
+                    f"Failed to import transformers: {e}. "
+                    "Please install: pip install transformers"
+                ) from e
+
+            processor = TrOCRProcessor.from_pretrained(self.model_name)
+            model = VisionEncoderDecoderModel.from_pretrained(self.model_name)
+
+            device = _resolve_device(self.device_setting)
+            model.to(device)
+            model.eval()
+
+            self.processor, self.device = processor, device
+            self.memory_bytes = _model_bytes(model)
+            self.model = model
+            ENGINE_BYTES.set(self.memory_bytes, engine=self.name)
+            _log.info("Loaded OCR engine %s (%s, %.0f MB)", self.name, self.model_name, self.memory_bytes / 2**20)
+
+    def unload(self) -> None:
+        """Drop the weights (they are reloaded on next use)."""
+        with self._load_lock:
+            self.processor = self.model = self.device = None
+            self.memory_bytes = 0
+            ENGINE_BYTES.set(0, engine=self.name)
+
+    def recognize(
+        self,
+        line_images: List[Image.Image],
+        max_length: int,
+        num_beams: int,
+        with_confidence: bool = False,
+    ) -> Tuple[List[str], Optional[List[float]]]:
+        """
+        Recognise a batch of line crops. Returns their texts and, when
+        with_confidence is set (always for the cached greedy decoder), the
+        geometric-mean token probability of each line, else None.
+        """
+        self.load()
+        cfg = settings().ocr
+        pixel_values = self.processor(images=line_images, return_tensors="pt").pixel_values.to(self.device)
+        confidence = None
+        with metrics.timer("ocr_generate"), profiling.torch_region("generate"):
+            if num_beams == 1 and cfg.greedy_decoder == "cached":
+                generated_ids, scores = _greedy_decode(self.model, pixel_values, max_length, early_exit=cfg.early_exit)
+                confidence = scores.tolist()
+            elif with_confidence:
+                generated_ids, confidence = _generate_with_confidence(self.model, pixel_values, max_length, num_beams)
+            else:
+                generated_ids = self.model.generate(
+                    pixel_values,
+                    max_length=max_length,
+                    num_beams=num_beams,
+                    early_stopping=True,
+                )
+        metrics.TOKENS.inc(_count_tokens(generated_ids, _special_ids(self.model)[1]))
+        decoded = self.processor.batch_decode(generated_ids, skip_special_tokens=True)
+        return [line.strip() for line in decoded], confidence
 
-_processor = None
-_model = None
-_device = None
 
+# ─── Engine registry ──────────────────────────────────────────────────────────
 
-def _ensure_model_loaded():
-    """Lazy-load the TrOCR model and processor once."""
-    global _processor, _model, _device
+_engines: Dict[str, TrOCREngine] = {}
+_registry_lock = threading.Lock()
 
-    if _processor is not None and _model is not None:
-        return
 
-    os.environ.setdefault("TRANSFORMERS_NO_TF", "1")
-    try:
-        from transformers import TrOCRProcessor, VisionEncoderDecoderModel
-    except ImportError as e:
-        raise RuntimeError(
-            f"Failed to import transformers: {e}. "
-            "Please install: pip install transformers"
-        ) from e
+def _configured_models() -> Dict[str, str]:
+    cfg = settings().ocr
+    return {DEFAULT_ENGINE: cfg.model_name, **cfg.engines}
 
-    model_name = get("ocr_engine.model_name", "microsoft/trocr-base-handwritten")
-    _processor = TrOCRProcessor.from_pretrained(model_name)
-    _model = VisionEncoderDecoderModel.from_pretrained(model_name)
 
-    device_str = (get("ocr_engine.device") or "").strip().lower()
-    if device_str == "cpu":
-        _device = torch.device("cpu")
-    elif device_str == "cuda" and torch.cuda.is_available():
-        _device = torch.device("cuda")
-    else:
-        _device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    _model.to(_device)
+def engine_names() -> List[str]:
+    """Names accepted by get_engine() and ocr_text_from_pages(engine=...), "cascade" included."""
+    return sorted(set(_configured_models()) | set(_engines)) + [CASCADE]
+
+
+def register_engine(engine: TrOCREngine) -> None:
+    """Add (or replace) an engine under engine.name."""
+    with _registry_lock:
+        _engines[engine.name] = engine
+
+
+def get_engine(name: str = DEFAULT_ENGINE) -> TrOCREngine:
+    """
+    The engine registered under name, created from the config on first use
+    (not loaded until it recognises something). Raises ValueError if unknown.
+    """
+    with _registry_lock:
+        engine = _engines.get(name)
+        if engine is None:
+            models = _configured_models()
+            if name not in models:
+                raise ValueError(f"Unknown OCR engine '{name}'. Available: {', '.join(engine_names())}")
+            engine = _engines[name] = TrOCREngine(name, models[name], settings().ocr.device)
+        return engine
+
+
+def engine_memory() -> Dict[str, int]:
+    """Bytes of weights held by each loaded engine."""
+    with _registry_lock:
+        return {name: e.memory_bytes for name, e in _engines.items() if e.loaded}
+
+
+def _engines_for(name: str) -> List[TrOCREngine]:
+    if name == CASCADE:
+        cfg = settings().ocr
+        return [get_engine(cfg.cascade_first), get_engine(cfg.cascade_fallback)]
+    return [get_engine(name)]
+
+
+def _resolve_device(setting: str):
+    """torch.device for an ocr_engine.device setting ("cpu", "cuda" or "" = auto)."""
+    prepare_ml_imports()
+    import torch
+
+    if setting == "cpu":
+        return torch.device("cpu")
+    return torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+
+def preload_device() -> str:
+    """Device type ("cpu" or "cuda") the configured engines would load onto."""
+    return _resolve_device(settings().ocr.device).type
+
+
+def preload_model() -> None:
+    """
+    Load the configured OCR engine(s) now rather than on the first request.
+
+    The production server calls this in the parent process before forking its
+    workers, so all workers read the same (copy-on-write) weight pages. Only
+    valid for CPU weights: a process that has initialised CUDA cannot fork.
+    """
+    for engine in _engines_for(settings().ocr.engine):
+        engine.load()
 
 
 # ---------------------------------------------------------------------------
@@ -72,11 +226,11 @@ def _segment_lines(image: Image.Image, min_line_height: int = 15) -> List[Image.
     Returns a list of PIL images, one per detected line (top→bottom).
     Falls back to returning the whole image if no lines are detected.
     """
-    gray = np.array(image.convert("L"), dtype=np.float32)
+    gray = np.asarray(image.convert("L"))  # uint8; no float copy of the page
     threshold = gray.mean() - 30  # simple adaptive threshold
-    ink = (gray < max(threshold, 80)).astype(np.uint8)
+    ink = gray < max(threshold, 80)
 
-    row_ink = ink.sum(axis=1)
+    row_ink = np.count_nonzero(ink, axis=1)
     # A row counts as "has text" if > 1% of its width has ink
     width = ink.shape[1]
     text_rows = row_ink > (width * 0.01)
@@ -110,46 +264,229 @@ def _segment_lines(image: Image.Image, min_line_height: int = 15) -> List[Image.
     return lines
 
 
+def _count_tokens(generated_ids, eos_id: int) -> int:
+    """
+    Number of tokens the decoder emitted (tensor or list of sequences): each
+    sequence after its start token, up to and including its first
+    end-of-sequence. The padding of lines that ended early is not counted.
+    """
+    rows = generated_ids.tolist() if hasattr(generated_ids, "tolist") else generated_ids
+    total = 0
+    for row in rows:
+        emitted = list(row[1:])
+        total += emitted.index(eos_id) + 1 if eos_id in emitted else len(emitted)
+    return total
+
+
+# ---------------------------------------------------------------------------
+# Cached greedy decoding — encoder once per batch, decoder KV cache, early exit
+# ---------------------------------------------------------------------------
+
+def _token_buffer(rows: int, cols: int, device):
+    """
+    A (rows, cols) view of this thread's reusable token id buffer, grown on
+    demand. Valid until the thread's next batch.
+    """
+    import torch
+
+    buf = getattr(_buffers, "ids", None)
+    if buf is None or buf.device != device:
+        buf = _buffers.ids = torch.empty((rows, cols), dtype=torch.long, device=device)
+    elif buf.shape[0] < rows or buf.shape[1] < cols:
+        shape = (max(rows, buf.shape[0]), max(cols, buf.shape[1]))
+        buf = _buffers.ids = torch.empty(shape, dtype=torch.long, device=device)
+    return buf[:rows, :cols]
+
+
+def _select_rows(past, keep):
+    """Keep only the `keep` batch rows of a decoder KV cache (Cache object or legacy tuples)."""
+    reorder = getattr(past, "reorder_cache", None)
+    if callable(reorder):
+        reorder(keep)
+        return past
+    return tuple(tuple(t.index_select(0, keep) for t in layer) for layer in past)
+
+
+def _special_ids(model) -> Tuple[int, int, int]:
+    """(decoder start, end-of-sequence, padding) token ids of a VisionEncoderDecoderModel."""
+    config = model.config
+    decoder_config = getattr(config, "decoder", config)
+    eos_id = config.eos_token_id if config.eos_token_id is not None else decoder_config.eos_token_id
+    pad_id = config.pad_token_id if config.pad_token_id is not None else eos_id
+    return config.decoder_start_token_id, eos_id, pad_id
+
+
+def _greedy_decode(model, pixel_values, max_length: int, early_exit: bool = True):
+    """
+    Greedy decoding of a batch of line images, equivalent to
+    generate(num_beams=1) but cheaper: the encoder runs once for the batch,
+    each decoder step feeds only the newest token against the KV cache, and
+    with early_exit a line that has emitted end-of-sequence is dropped from
+    the batch (with its cache rows) instead of decoding padding until the
+    longest line ends. Returns a (batch, length) tensor of token ids and the
+    per-line confidence (geometric-mean probability of the chosen tokens).
+    """
+    import torch
+
+    start_id, eos_id, pad_id = _special_ids(model)
+    batch = pixel_values.shape[0]
+    device = pixel_values.device
+    ids = _token_buffer(batch, max_length, device)
+    ids.fill_(pad_id)
+    ids[:, 0] = start_id
+    active = torch.arange(batch, device=device)
+    finished = torch.zeros(batch, dtype=torch.bool, device=device)
+    logprob_sum = torch.zeros(batch, device=device)
+    token_count = torch.zeros(batch, device=device)
+    length = 1
+    with torch.inference_mode():
+        encoder_hidden = model.encoder(pixel_values=pixel_values).last_hidden_state
+        past = None
+        step_input = ids[:, :1]
+        for step in range(1, max_length):
+            out = model(
+                encoder_outputs=(encoder_hidden,),
+                decoder_input_ids=step_input,
+                past_key_values=past,
+                use_cache=True,
+            )
+            step_logprob, next_tokens = out.logits[:, -1, :].float().log_softmax(dim=-1).max(dim=-1)
+            live = ~finished
+            logprob_sum[active] += torch.where(live, step_logprob, torch.zeros_like(step_logprob))
+            token_count[active] += live.float()
+            next_tokens = torch.where(live, next_tokens, torch.full_like(next_tokens, pad_id))
+            ids[active, step] = next_tokens
+            length = step + 1
+            finished = finished | (next_tokens == eos_id)
+            if bool(finished.all()):
+                break
+            past = out.past_key_values
+            if early_exit and bool(finished.any()):
+                keep = (~finished).nonzero().squeeze(1)
+                active, encoder_hidden, finished = active[keep], encoder_hidden[keep], finished[keep]
+                past = _select_rows(past, keep)
+                next_tokens = next_tokens[keep]
+            step_input = next_tokens.unsqueeze(1)
+    confidence = (logprob_sum / token_count.clamp(min=1)).exp()
+    return ids[:, :length], confidence
+
+
+def _generate_with_confidence(model, pixel_values, max_length: int, num_beams: int):
+    """generate() plus the per-line confidence that cascade mode compares against its threshold."""
+    out = model.generate(
+        pixel_values,
+        max_length=max_length,
+        num_beams=num_beams,
+        early_stopping=True,
+        output_scores=True,
+        return_dict_in_generate=True,
+    )
+    if num_beams > 1:
+        # Length-normalised log-probability of each returned beam
+        return out.sequences, out.sequences_scores.exp().tolist()
+    _, _, pad_id = _special_ids(model)
+    step_scores = model.compute_transition_scores(out.sequences, out.scores, normalize_logits=True)
+    real = out.sequences[:, 1:] != pad_id
+    mean = (step_scores * real).sum(dim=1) / real.sum(dim=1).clamp(min=1)
+    return out.sequences, mean.exp().tolist()
+
+
 # ---------------------------------------------------------------------------
 # Public API
 # ---------------------------------------------------------------------------
 
+def _iter_lines(image_paths: List[str]) -> Iterator[Tuple[int, Image.Image]]:
+    """Yield (page index, line crop) for every page in order, loading one page at a time."""
+    for page_index, image_path in enumerate(image_paths):
+        check_cancelled()
+        with metrics.timer("segmentation"):
+            page_image = Image.open(image_path)
+            if page_image.mode not in ("L", "RGB"):
+                page_image = page_image.convert("RGB")
+            line_images = _segment_lines(page_image)
+        metrics.PAGES.inc()
+        metrics.LINES.inc(len(line_images))
+        for line_img in line_images:
+            # Grayscale pages (preprocessed photos) are converted line by line, not as a whole
+            yield page_index, line_img if line_img.mode == "RGB" else line_img.convert("RGB")
+
+
+def _recognize_cascade(line_images: List[Image.Image], max_length: int, num_beams: int) -> List[str]:
+    """Small engine first; lines below cascade.min_confidence are re-run on the fallback engine."""
+    cfg = settings().ocr
+    first, fallback = _engines_for(CASCADE)
+    texts, confidence = first.recognize(line_images, max_length, num_beams, with_confidence=True)
+    retry = [i for i, score in enumerate(confidence) if score < cfg.cascade_min_confidence]
+    if retry:
+        redone, _ = fallback.recognize([line_images[i] for i in retry], max_length, num_beams)
+        for i, text in zip(retry, redone):
+            texts[i] = text
+    CASCADE_LINES.inc(len(line_images) - len(retry), engine=first.name)
+    if retry:
+        CASCADE_LINES.inc(len(retry), engine=fallback.name)
+    return texts
+
+
+def ocr_text_from_pages(
+    image_paths: List[str],
+    max_length: Optional[int] = None,
+    num_beams: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    engine: Optional[str] = None,
+) -> List[str]:
+    """
+    Perform OCR on several page images (possibly from different documents).
+
+    Every page is segmented into text lines, and lines are fed to the OCR
+    engine (config ocr_engine.engine, or `engine`: a registered name or
+    "cascade") in batches of `batch_size` (config ocr_engine.batch_size)
+    regardless of which page they came from, so short pages do not leave
+    batches half empty. Returns one string per page (its lines joined with
+    newlines), in order. Raises ValueError for an unknown engine.
+    """
+    cfg = settings().ocr
+    engine = engine or cfg.engine
+    _engines_for(engine)  # validate the name; weights load on the first batch
+    max_length = cfg.max_length if max_length is None else max(1, min(int(max_length), 1024))
+    num_beams = cfg.num_beams if num_beams is None else max(1, min(int(num_beams), 16))
+    batch_size = cfg.batch_size if batch_size is None else max(1, min(int(batch_size), 64))
+
+    texts: List[List[str]] = [[] for _ in image_paths]
+
+    def run_batch(batch: List[Tuple[int, Image.Image]]) -> None:
+        check_cancelled()
+        line_images = [line_img for _, line_img in batch]
+        if engine == CASCADE:
+            decoded = _recognize_cascade(line_images, max_length, num_beams)
+        else:
+            decoded, _ = get_engine(engine).recognize(line_images, max_length, num_beams)
+        for (page_index, _), line_text in zip(batch, decoded):
+            if line_text:
+                texts[page_index].append(line_text)
+
+    batch: List[Tuple[int, Image.Image]] = []
+    for item in _iter_lines(image_paths):
+        batch.append(item)
+        if len(batch) >= batch_size:
+            run_batch(batch)
+            batch = []
+    if batch:
+        run_batch(batch)
+
+    return ["\n".join(lines) for lines in texts]
+
+
 def ocr_text_from_page(
     image_path: str,
     max_length: Optional[int] = None,
     num_beams: Optional[int] = None,
+    engine: Optional[str] = None,
 ) -> str:
     """
     Perform OCR on a full page image using TrOCR.
 
     The page is first segmented into individual text lines (via horizontal
-    projection), then each line is fed to TrOCR independently.  The per-line
+    projection), then the lines are fed to TrOCR in batches.  The per-line
     results are joined with newlines and returned.
     """
-    _ensure_model_loaded()
-
-    if max_length is None:
-        max_length = get("ocr_engine.max_length", 512)
-    if num_beams is None:
-        num_beams = get("ocr_engine.num_beams", 4)
-    max_length = max(1, min(int(max_length), 1024))
-    num_beams = max(1, min(int(num_beams), 16))
-
-    page_image = Image.open(image_path).convert("RGB")
-    line_images = _segment_lines(page_image)
-
-    texts: List[str] = []
-    for line_img in line_images:
-        pixel_values = _processor(images=line_img, return_tensors="pt").pixel_values.to(_device)
-        generated_ids = _model.generate(
-            pixel_values,
-            max_length=max_length,
-            num_beams=num_beams,
-            early_stopping=True,
-        )
-        decoded = _processor.batch_decode(generated_ids, skip_special_tokens=True)[0]
-        line_text = decoded.strip()
-        if line_text:
-            texts.append(line_text)
-
-    return "\n".join(texts)
+    return ocr_text_from_pages([image_path], max_length=max_length, num_beams=num_beams, engine=engine)[0]
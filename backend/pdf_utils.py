@@ -1,40 +1,109 @@
 import os
-from typing import Optional
+import re
+from typing import List, Optional, Tuple
 
-import fitz  # PyMuPDF
+from backend import metrics
+from backend.cancellation import check_cancelled
+from backend.config_loader import settings
 
-from backend.config_loader import get
+_PAGE_RANGE = re.compile(r"^(\d+)(?:-(\d*))?$")
+
+
+def _page_ranges(spec: str) -> List[Tuple[int, Optional[int]]]:
+    """Parse "1-5,9,12-" into [(1, 5), (9, 9), (12, None)]. Raises ValueError if malformed."""
+    ranges = []
+    for part in spec.replace(" ", "").split(","):
+        match = _PAGE_RANGE.match(part)
+        if not match:
+            raise ValueError(f"Invalid page range '{part}'. Use e.g. 1-5,9 or 12-")
+        start = int(match.group(1))
+        if match.group(2) is None:
+            end: Optional[int] = start
+        else:
+            end = int(match.group(2)) if match.group(2) else None
+        if start < 1 or (end is not None and end < start):
+            raise ValueError(f"Invalid page range '{part}'. Pages start at 1 and ranges must ascend")
+        ranges.append((start, end))
+    return ranges
+
+
+def normalize_page_spec(spec: Optional[str]) -> Optional[str]:
+    """Validated, canonical form of a page spec ("1-5, 9" -> "1-5,9"); None/empty means all pages."""
+    if spec is None or not spec.strip():
+        return None
+    return ",".join(
+        str(start) if end == start else f"{start}-{'' if end is None else end}"
+        for start, end in _page_ranges(spec)
+    )
+
+
+def select_pages(spec: Optional[str], page_count: int) -> List[int]:
+    """
+    1-based page numbers of a page_count-page document selected by spec
+    (all pages when spec is None). Pages past the end are ignored; raises
+    ValueError if nothing is left.
+    """
+    if not spec:
+        return list(range(1, page_count + 1))
+    selected = set()
+    for start, end in _page_ranges(spec):
+        selected.update(range(start, min(page_count, end if end is not None else page_count) + 1))
+    if not selected:
+        raise ValueError(f"Page selection '{spec}' matches no pages (document has {page_count})")
+    return sorted(selected)
+
+
+def pdf_page_count(pdf_path: str) -> int:
+    """Number of pages in a PDF (opens it without rendering anything)."""
+    import fitz
+
+    doc = fitz.open(pdf_path)
+    try:
+        return doc.page_count
+    finally:
+        doc.close()
 
 
 def pdf_to_images(
     pdf_path: str,
     output_folder: str,
     dpi: Optional[int] = None,
+    pages: Optional[str] = None,
 ) -> list:
-    """Convert each page of a PDF into a PNG image."""
+    """
+    Convert each page of a PDF into a PNG image. With `pages` (e.g. "1-5,9"),
+    only those pages are rasterized; files keep their original page numbers.
+    """
+    import fitz  # PyMuPDF; imported here so image-only requests never load it
+
     if dpi is None:
-        dpi = get("pdf_utils.dpi", 200)
-    if not isinstance(dpi, int) or dpi < 72 or dpi > 600:
+        dpi = settings().pdf.dpi
+    elif not isinstance(dpi, int) or dpi < 72 or dpi > 600:
         dpi = 200
 
     os.makedirs(output_folder, exist_ok=True)
-    doc = fitz.open(pdf_path)
-    image_paths = []
+    with metrics.timer("rasterize"):
+        doc = fitz.open(pdf_path)
+        try:
+            image_paths = []
 
-    for page_index in range(doc.page_count):
-        page = doc.load_page(page_index)
-        pix = page.get_pixmap(dpi=dpi)
+            for page_number in select_pages(pages, doc.page_count):
+                check_cancelled()
+                page = doc.load_page(page_number - 1)
+                pix = page.get_pixmap(dpi=dpi)
 
-        # Construct output file path
-        filename = f"page_{page_index + 1:03d}.png"
-        img_path = os.path.join(output_folder, filename)
-        
-        # Save the image
-        pix.save(img_path)
-        image_paths.append(img_path)
+                # Construct output file path
+                filename = f"page_{page_number:03d}.png"
+                img_path = os.path.join(output_folder, filename)
 
-    # Close the document
-    doc.close()
+                # Save the image
+                pix.save(img_path)
+                image_paths.append(img_path)
+        finally:
+            # Close the document and drop MuPDF's cache of decoded page images
+            # (up to 256 MB, kept across documents otherwise)
+            doc.close()
+            fitz.TOOLS.store_shrink(100)
 
     # Return the list of image paths
-    return image_paths
\ No newline at end of file
+    return image_paths
@@ -0,0 +1,276 @@
+"""
+Page pipeline shared by the API and batch mode: turn uploads into page images,
+OCR their lines in batches (across pages and documents), then enrich each page
+with math recognition.
+
+How hard each stage works is set per request by PipelineOptions, resolved from
+the config, an optional named preset (pipeline.presets, e.g. "fast" or
+"quality") and explicit overrides, without touching the global config.
+
+Huge documents go through convert_to_document() instead: pages are
+rasterized and OCR'd a window at a time and spooled straight into the
+document store, so memory use does not grow with the page count.
+"""
+import hashlib
+import logging
+import os
+import shutil
+from dataclasses import dataclass
+from typing import Callable, Iterator, List, Mapping, Optional, Tuple
+
+from backend.cancellation import Cancelled, check_cancelled
+from backend.config_loader import get, settings
+from backend.document_store import DocumentWriter
+from backend.file_utils import prepare_input_images
+from backend.math_recognition import MATH_BACKENDS, recognize_math_in_text
+from backend.ocr_engine import engine_names, ocr_text_from_pages
+from backend.pdf_utils import normalize_page_spec, pdf_page_count, select_pages
+
+_log = logging.getLogger(__name__)
+
+# (input index, enriched page texts or None, error message or None)
+DocumentResult = Tuple[int, Optional[List[str]], Optional[str]]
+
+
+# ─── Per-request options ──────────────────────────────────────────────────────
+
+@dataclass(frozen=True)
+class PipelineOptions:
+    """Tuning knobs for one request; build with resolve_options()."""
+
+    dpi: int
+    num_beams: int
+    max_length: int
+    math_backend: str
+    compile_pdf: bool
+    use_latexmk: bool
+    # Canonical page selection ("1-5,9"); None = all pages
+    pages: Optional[str] = None
+    # OCR engine name (see ocr_engine.engines) or "cascade"
+    ocr_engine: str = "default"
+
+    def cache_key(self, content_hash: str) -> str:
+        """Result-cache key for an upload processed with these options."""
+        parts = f"{content_hash}:{self.dpi}:{self.num_beams}:{self.max_length}:{self.math_backend}"
+        if self.pages:
+            parts += f":{self.pages}"
+        if self.ocr_engine != "default":
+            parts += f":engine={self.ocr_engine}"
+        return hashlib.sha256(parts.encode("utf-8")).hexdigest()
+
+
+def preset_names() -> List[str]:
+    presets = get("pipeline.presets") or {}
+    return sorted(presets) if isinstance(presets, Mapping) else []
+
+
+def resolve_options(
+    preset: Optional[str] = None,
+    dpi: Optional[int] = None,
+    num_beams: Optional[int] = None,
+    max_length: Optional[int] = None,
+    math_backend: Optional[str] = None,
+    compile_pdf: Optional[bool] = None,
+    pages: Optional[str] = None,
+    ocr_engine: Optional[str] = None,
+) -> PipelineOptions:
+    """
+    Options for one request: config values, then the named preset's values,
+    then any explicit (non-None) argument. Numbers are clamped to the same
+    ranges as the config. Raises ValueError for an unknown preset, math
+    backend or OCR engine, or a malformed page selection.
+    """
+    cfg = settings()
+    values = {
+        "dpi": cfg.pdf.dpi,
+        "num_beams": cfg.ocr.num_beams,
+        "max_length": cfg.ocr.max_length,
+        "math_backend": "auto",
+        "compile_pdf": True,
+        "use_latexmk": cfg.latex.use_latexmk,
+        "ocr_engine": cfg.ocr.engine,
+    }
+    if preset:
+        presets = get("pipeline.presets") or {}
+        if not isinstance(presets, Mapping) or not isinstance(presets.get(preset), Mapping):
+            raise ValueError(f"Unknown preset '{preset}'. Available: {', '.join(preset_names()) or 'none'}")
+        values.update((k, v) for k, v in presets[preset].items() if k in values and v is not None)
+    explicit = {
+        "dpi": dpi,
+        "num_beams": num_beams,
+        "max_length": max_length,
+        "math_backend": math_backend,
+        "compile_pdf": compile_pdf,
+        "ocr_engine": ocr_engine,
+    }
+    values.update((k, v) for k, v in explicit.items() if v is not None)
+
+    if values["math_backend"] not in MATH_BACKENDS:
+        raise ValueError(f"Unknown math backend '{values['math_backend']}'. Use one of: {', '.join(MATH_BACKENDS)}")
+    if values["ocr_engine"] not in engine_names():
+        raise ValueError(f"Unknown OCR engine '{values['ocr_engine']}'. Use one of: {', '.join(engine_names())}")
+    return PipelineOptions(
+        dpi=max(72, min(int(values["dpi"]), 600)),
+        num_beams=max(1, min(int(values["num_beams"]), 16)),
+        max_length=max(1, min(int(values["max_length"]), 1024)),
+        math_backend=values["math_backend"],
+        compile_pdf=bool(values["compile_pdf"]),
+        use_latexmk=bool(values["use_latexmk"]),
+        pages=normalize_page_spec(pages),
+        ocr_engine=values["ocr_engine"],
+    )
+
+
+# ─── Pipeline ─────────────────────────────────────────────────────────────────
+
+def enrich_pages(page_image_paths: List[str], options: Optional[PipelineOptions] = None) -> List[str]:
+    """
+    OCR a list of page images (lines batched across pages) and add recognized
+    math to each page. Returns one enriched string per page, in order.
+    """
+    if options is None:
+        options = resolve_options()
+    raw_texts = ocr_text_from_pages(
+        page_image_paths, max_length=options.max_length, num_beams=options.num_beams, engine=options.ocr_engine
+    )
+    enriched = []
+    for raw_text, img_path in zip(raw_texts, page_image_paths):
+        check_cancelled()
+        enriched.append(recognize_math_in_text(raw_text, img_path, backend=options.math_backend))
+    return enriched
+
+
+def _flush(
+    pending: List[Tuple[int, List[str], str]],
+    options: PipelineOptions,
+    enrich: Callable[[List[str], PipelineOptions], List[str]],
+) -> Iterator[DocumentResult]:
+    """Run one cross-document chunk through the pipeline and split results per document."""
+    all_paths = [path for _, page_paths, _ in pending for path in page_paths]
+    try:
+        texts = enrich(all_paths, options)
+    except Cancelled:
+        for _, _, doc_dir in pending:
+            shutil.rmtree(doc_dir, ignore_errors=True)
+        raise
+    except Exception as e:
+        _log.exception("OCR or math recognition failed for a batch of %d pages", len(all_paths))
+        for index, _, doc_dir in pending:
+            shutil.rmtree(doc_dir, ignore_errors=True)
+            yield index, None, f"Processing failed: {e}"
+        return
+    offset = 0
+    for index, page_paths, doc_dir in pending:
+        yield index, texts[offset: offset + len(page_paths)], None
+        offset += len(page_paths)
+        shutil.rmtree(doc_dir, ignore_errors=True)
+
+
+def convert_documents(
+    upload_paths: List[str],
+    work_dir: str,
+    pages_per_chunk: Optional[int] = None,
+    options: Optional[PipelineOptions] = None,
+    enrich: Optional[Callable[[List[str], PipelineOptions], List[str]]] = None,
+) -> Iterator[DocumentResult]:
+    """
+    Convert many uploads, yielding (index, page texts, error) per document as
+    soon as the chunk containing it is done. Documents that cannot be
+    rasterized are reported immediately, so results may arrive out of order.
+
+    Documents are rasterized until at least `pages_per_chunk` pages (config
+    batch.pages_per_chunk) are pending; those pages then go through OCR
+    together so line batches are filled across document boundaries. Page
+    images of a chunk are deleted once its results have been yielded.
+    enrich(page_paths, options) replaces enrich_pages, e.g. to route the
+    work through the API's fair scheduler.
+    """
+    if pages_per_chunk is None:
+        pages_per_chunk = get("batch.pages_per_chunk", 32)
+    pages_per_chunk = max(1, int(pages_per_chunk))
+    if options is None:
+        options = resolve_options()
+    if enrich is None:
+        enrich = enrich_pages
+
+    pending: List[Tuple[int, List[str], str]] = []
+    pending_pages = 0
+    for index, upload_path in enumerate(upload_paths):
+        doc_dir = os.path.join(work_dir, f"doc_{index:05d}")
+        try:
+            page_paths = prepare_input_images(upload_path, doc_dir, dpi=options.dpi, pages=options.pages)
+        except Cancelled:
+            shutil.rmtree(doc_dir, ignore_errors=True)
+            raise
+        except Exception as e:
+            shutil.rmtree(doc_dir, ignore_errors=True)
+            yield index, None, str(e)
+            continue
+        if not page_paths:
+            shutil.rmtree(doc_dir, ignore_errors=True)
+            yield index, None, "No pages or images produced from upload."
+            continue
+        pending.append((index, page_paths, doc_dir))
+        pending_pages += len(page_paths)
+        if pending_pages >= pages_per_chunk:
+            yield from _flush(pending, options, enrich)
+            pending, pending_pages = [], 0
+    if pending:
+        yield from _flush(pending, options, enrich)
+
+
+# ─── Bounded-memory conversion ────────────────────────────────────────────────
+
+def _selected_pages(upload_path: str, options: PipelineOptions) -> Optional[List[int]]:
+    """Page numbers of a PDF upload to convert; None for a single image."""
+    if os.path.splitext(upload_path)[1].lower() != ".pdf":
+        return None
+    return select_pages(options.pages, pdf_page_count(upload_path))
+
+
+def count_pages(upload_path: str, options: Optional[PipelineOptions] = None) -> int:
+    """
+    Number of pages an upload will produce under options (page selection
+    applied), without rasterizing. Raises ValueError if none are selected.
+    """
+    if options is None:
+        options = resolve_options()
+    selected = _selected_pages(upload_path, options)
+    return 1 if selected is None else len(selected)
+
+
+def convert_to_document(
+    upload_path: str,
+    work_dir: str,
+    options: Optional[PipelineOptions] = None,
+    enrich: Optional[Callable[[List[str], PipelineOptions], List[str]]] = None,
+    window_pages: Optional[int] = None,
+) -> Tuple[str, int]:
+    """
+    Convert one upload of any length straight into the document store and
+    return (document id, page count). Pages are rasterized, enriched and
+    written `window_pages` at a time (config pipeline.window_pages); each
+    window's images and texts are dropped before the next one starts.
+    Raises ValueError if the upload has no selected pages; on any error or
+    cancellation the partial document is discarded.
+    """
+    if window_pages is None:
+        window_pages = get("pipeline.window_pages", 8)
+    step = max(1, int(window_pages))
+    if options is None:
+        options = resolve_options()
+    if enrich is None:
+        enrich = enrich_pages
+
+    selected = _selected_pages(upload_path, options)
+    windows = [None] if selected is None else [selected[i: i + step] for i in range(0, len(selected), step)]
+    with DocumentWriter() as writer:
+        for number, window in enumerate(windows):
+            window_dir = os.path.join(work_dir, f"window_{number:05d}")
+            try:
+                spec = options.pages if window is None else ",".join(map(str, window))
+                page_paths = prepare_input_images(upload_path, window_dir, dpi=options.dpi, pages=spec)
+                writer.add_pages(enrich(page_paths, options))
+            finally:
+                shutil.rmtree(window_dir, ignore_errors=True)
+        return writer.finish(), writer.pages
@@ -0,0 +1,155 @@
+"""
+Opt-in profiling of single requests (debug only, guarded by config).
+
+profile_request() runs a block under cProfile and, when enabled, the
+torch profiler; torch_region() labels model calls such as TrOCR generate
+inside that trace. Artifacts are written to one directory per profile id:
+
+    profile.prof        cProfile stats (load with pstats / snakeviz)
+    profile.txt         top functions by cumulative time (+ torch op table)
+    torch_trace.json    Chrome trace of torch ops (chrome://tracing, Perfetto)
+"""
+import cProfile
+import io
+import logging
+import os
+import pstats
+import re
+import shutil
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Any, Iterator, List, Optional
+
+from backend.config_loader import get
+
+_log = logging.getLogger(__name__)
+
+_PROFILE_ID = re.compile(r"^[0-9a-f]{32}$")
+_ARTIFACT_NAME = re.compile(r"^[a-z_]+\.(prof|txt|json)$")
+
+# cProfile cannot run two profilers at once in one interpreter; profile one request at a time
+_busy = threading.Lock()
+
+# Torch profiler of the request being profiled (None when not profiling)
+_torch_session: ContextVar[Optional[Any]] = ContextVar("texform_torch_profile", default=None)
+
+
+class ProfilerBusy(RuntimeError):
+    """Another request is already being profiled in this process."""
+
+
+def profiling_enabled() -> bool:
+    return bool(get("debug.profiling_enabled", False))
+
+
+def _profile_root() -> str:
+    root = get("debug.profile_dir") or os.path.join(tempfile.gettempdir(), "texform_profiles")
+    os.makedirs(root, exist_ok=True)
+    return root
+
+
+def _prune(root: str) -> None:
+    """Keep at most debug.max_profiles profile directories (oldest removed first)."""
+    max_profiles = get("debug.max_profiles", 50)
+    if not isinstance(max_profiles, int) or max_profiles <= 0:
+        return
+    entries = [os.path.join(root, n) for n in os.listdir(root) if _PROFILE_ID.match(n)]
+    if len(entries) <= max_profiles:
+        return
+    entries.sort(key=os.path.getmtime)
+    for path in entries[: len(entries) - max_profiles]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def _start_torch_profiler() -> Optional[Any]:
+    if not get("debug.torch_profiler", True):
+        return None
+    try:
+        import torch
+    except ImportError:
+        return None
+    activities = [torch.profiler.ProfilerActivity.CPU]
+    if torch.cuda.is_available():
+        activities.append(torch.profiler.ProfilerActivity.CUDA)
+    prof = torch.profiler.profile(activities=activities)
+    prof.__enter__()
+    return prof
+
+
+def _write_torch_artifacts(prof: Any, out_dir: str, summary: io.StringIO) -> None:
+    try:
+        prof.export_chrome_trace(os.path.join(out_dir, "torch_trace.json"))
+        table = prof.key_averages().table(sort_by="self_cpu_time_total", row_limit=40)
+        summary.write("\n\n=== torch.profiler (self CPU time) ===\n")
+        summary.write(table)
+    except Exception as e:  # no torch ops recorded (e.g. cached result) or export failure
+        _log.info("No torch profile written: %s", e)
+
+
+@contextmanager
+def profile_request() -> Iterator[str]:
+    """
+    Profile the enclosed block and yield the profile id. Artifacts are
+    written when the block exits (also on error). Raises ProfilerBusy if
+    another request is being profiled.
+    """
+    if not _busy.acquire(blocking=False):
+        raise ProfilerBusy("Another request is already being profiled")
+    profile_id = uuid.uuid4().hex
+    out_dir = os.path.join(_profile_root(), profile_id)
+    os.makedirs(out_dir)
+    torch_prof = None
+    token = None
+    profiler = cProfile.Profile()
+    try:
+        torch_prof = _start_torch_profiler()
+        token = _torch_session.set(torch_prof)
+        profiler.enable()
+        try:
+            yield profile_id
+        finally:
+            profiler.disable()
+            if torch_prof is not None:
+                torch_prof.__exit__(None, None, None)
+            profiler.dump_stats(os.path.join(out_dir, "profile.prof"))
+            summary = io.StringIO()
+            pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(60)
+            if torch_prof is not None:
+                _write_torch_artifacts(torch_prof, out_dir, summary)
+            with open(os.path.join(out_dir, "profile.txt"), "w", encoding="utf-8") as f:
+                f.write(summary.getvalue())
+            _prune(_profile_root())
+    finally:
+        if token is not None:
+            _torch_session.reset(token)
+        _busy.release()
+
+
+def torch_region(name: str):
+    """Label a block (e.g. "generate") in the torch trace; no-op when not profiling."""
+    if _torch_session.get() is None:
+        return nullcontext()
+    import torch
+
+    return torch.profiler.record_function(name)
+
+
+def list_artifacts(profile_id: str) -> Optional[List[str]]:
+    """Artifact file names of a stored profile, or None if it does not exist."""
+    if not _PROFILE_ID.match(profile_id or ""):
+        return None
+    path = os.path.join(_profile_root(), profile_id)
+    if not os.path.isdir(path):
+        return None
+    return sorted(n for n in os.listdir(path) if _ARTIFACT_NAME.match(n))
+
+
+def artifact_path(profile_id: str, name: str) -> Optional[str]:
+    """Path of one artifact, or None if the profile or artifact does not exist."""
+    names = list_artifacts(profile_id)
+    if names is None or name not in names:
+        return None
+    return os.path.join(_profile_root(), profile_id, name)
@@ -0,0 +1,223 @@
+"""
+Fair scheduler in front of the page pipeline.
+
+A long document is split into page-level tasks (scheduler.pages_per_task
+pages each) instead of running as one block, so the pipeline threads can
+interleave work from different requests:
+
+- Priority classes: "interactive" tasks always run before "batch" tasks.
+- Fairness: within a class, clients take turns (round-robin), so a client
+  with a 200-page PDF queued gets one task, then the next client gets one.
+- Per-client limit: at most scheduler.max_active_per_client tasks of one
+  client run at the same time (only matters with several pipeline threads).
+
+Worker threads are started on first use, i.e. inside each server worker
+process after the pre-fork, never in the parent. Tasks run in a copy of the
+submitter's context, so per-request timings and labels still apply.
+"""
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Callable, Deque, Dict, List, Optional
+
+from backend import metrics
+from backend.cancellation import check_cancelled
+from backend.config_loader import get
+from backend.pipeline import PipelineOptions, enrich_pages
+
+_log = logging.getLogger(__name__)
+
+# Highest priority first
+PRIORITIES = ("interactive", "batch")
+
+QUEUED_TASKS = metrics.Gauge("texform_scheduler_queued_tasks", "Page tasks waiting for a pipeline thread.")
+
+
+class _Task:
+    __slots__ = ("fn", "future", "context", "enqueued")
+
+    def __init__(self, fn: Callable[[], object]):
+        self.fn = fn
+        self.future: Future = Future()
+        self.context = contextvars.copy_context()
+        self.enqueued = time.perf_counter()
+
+
+class Scheduler:
+    """Runs submitted callables on `workers` threads in priority / round-robin order."""
+
+    def __init__(self, workers: int = 1, max_active_per_client: int = 1):
+        self.workers = max(1, int(workers))
+        self.max_active_per_client = max(1, int(max_active_per_client))
+        self._cond = threading.Condition()
+        # priority -> client -> queued tasks; client order is the round-robin order
+        self._queues: Dict[str, "OrderedDict[str, Deque[_Task]]"] = {p: OrderedDict() for p in PRIORITIES}
+        self._active: Dict[str, int] = {}
+        self._threads: List[threading.Thread] = []
+        self._stopping = False
+
+    def submit(self, fn: Callable[[], object], client: str, priority: str = "interactive") -> Future:
+        """Queue fn() for `client`; returns a Future with its result."""
+        if priority not in self._queues:
+            raise ValueError(f"Unknown priority '{priority}'. Use one of: {', '.join(PRIORITIES)}")
+        task = _Task(fn)
+        with self._cond:
+            if self._stopping:
+                raise RuntimeError("Scheduler is shut down")
+            self._ensure_started()
+            self._queues[priority].setdefault(client, deque()).append(task)
+            QUEUED_TASKS.inc(priority=priority)
+            self._cond.notify()
+        return task.future
+
+    def pending(self, priority: Optional[str] = None) -> int:
+        """Number of queued (not yet running) tasks, optionally for one priority."""
+        with self._cond:
+            queues = [self._queues[priority]] if priority else self._queues.values()
+            return sum(len(q) for clients in queues for q in clients.values())
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Cancel queued tasks and stop the worker threads."""
+        with self._cond:
+            self._stopping = True
+            for priority, clients in self._queues.items():
+                for queue in clients.values():
+                    for task in queue:
+                        task.future.cancel()
+                        QUEUED_TASKS.dec(priority=priority)
+                clients.clear()
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _ensure_started(self) -> None:
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"texform-pipeline-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _next_task(self):
+        """Pop the next runnable (client, task); caller holds the lock."""
+        for priority in PRIORITIES:
+            clients = self._queues[priority]
+            for client in list(clients):
+                if self._active.get(client, 0) >= self.max_active_per_client:
+                    continue
+                queue = clients[client]
+                task = queue.popleft()
+                if queue:
+                    clients.move_to_end(client)  # next turn goes to the other clients
+                else:
+                    del clients[client]
+                QUEUED_TASKS.dec(priority=priority)
+                return client, task
+        return None
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                picked = self._next_task()
+                while picked is None:
+                    if self._stopping:
+                        return
+                    self._cond.wait()
+                    picked = self._next_task()
+                client, task = picked
+                self._active[client] = self._active.get(client, 0) + 1
+            try:
+                if task.future.set_running_or_notify_cancel():
+                    waited = time.perf_counter() - task.enqueued
+                    try:
+                        task.future.set_result(task.context.run(_run_task, task.fn, waited))
+                    except BaseException as e:
+                        task.future.set_exception(e)
+            finally:
+                with self._cond:
+                    self._active[client] -= 1
+                    if not self._active[client]:
+                        del self._active[client]
+                    self._cond.notify_all()
+
+
+def _run_task(fn: Callable[[], object], waited: float) -> object:
+    """Body of a task, run inside the submitter's context."""
+    metrics.record_stage("queue_wait", waited)
+    check_cancelled()  # the request may have gone away while this task was queued
+    return fn()
+
+
+# ─── Shared scheduler for the page pipeline ───────────────────────────────────
+
+_scheduler: Optional[Scheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> Scheduler:
+    """The process-wide pipeline scheduler (scheduler.workers threads)."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler(
+                workers=get("scheduler.workers", 1),
+                max_active_per_client=get("scheduler.max_active_per_client", 1),
+            )
+        return _scheduler
+
+
+def submit_pages(
+    page_image_paths: List[str],
+    options: PipelineOptions,
+    client: str,
+    priority: str = "interactive",
+    pages_per_task: Optional[int] = None,
+) -> List[Future]:
+    """
+    Split pages into tasks of `pages_per_task` (config scheduler.pages_per_task)
+    and queue them; each future resolves to the enriched texts of its pages.
+    """
+    if pages_per_task is None:
+        pages_per_task = get("scheduler.pages_per_task", 4)
+    step = max(1, int(pages_per_task))
+    scheduler = get_scheduler()
+    return [
+        scheduler.submit(lambda chunk=page_image_paths[i: i + step]: enrich_pages(chunk, options), client, priority)
+        for i in range(0, len(page_image_paths), step)
+    ]
+
+
+def enrich_pages_fair(
+    page_image_paths: List[str],
+    options: PipelineOptions,
+    client: str,
+    priority: str = "batch",
+) -> List[str]:
+    """Blocking form of enrich_pages() that goes through the scheduler."""
+    futures = submit_pages(page_image_paths, options, client, priority)
+    try:
+        return [text for future in futures for text in future.result()]
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+async def enrich_pages_async(
+    page_image_paths: List[str],
+    options: PipelineOptions,
+    client: str,
+    priority: str = "interactive",
+) -> List[str]:
+    """Await the enriched texts of all pages, scheduled fairly against other requests."""
+    futures = submit_pages(page_image_paths, options, client, priority)
+    try:
+        chunks = await asyncio.gather(*(asyncio.wrap_future(f) for f in futures))
+    finally:
+        for future in futures:
+            future.cancel()  # no-op for finished tasks; drops queued ones if we were cancelled or failed
+    return [text for chunk in chunks for text in chunk]
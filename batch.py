@@ -0,0 +1,58 @@
+"""
+Batch converter: many handwritten PDFs/images → LaTeX files, offline.
+
+    python batch.py notes/ extra.pdf -o out/
+    python batch.py notes/ -o out/ --pdf          # also compile PDFs
+    python batch.py notes/ -o out/ --no-resume    # ignore out/manifest.json
+
+Pages from all inputs are OCR'd in shared batches. Each document is written
+to the output directory as soon as it is done and recorded in
+out/manifest.json; re-running the same command resumes after an interruption.
+"""
+import argparse
+import logging
+import sys
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Convert many handwritten PDFs/images to LaTeX.")
+    parser.add_argument("inputs", nargs="+", help="files and/or directories (non-recursive)")
+    parser.add_argument("-o", "--output", required=True, help="output directory (holds manifest.json)")
+    parser.add_argument("--pdf", action="store_true", help="also compile each document to PDF")
+    parser.add_argument("--no-resume", action="store_true", help="reconvert everything, ignoring the manifest")
+    parser.add_argument("--chunk-pages", type=int, default=None,
+                        help="pages OCR'd together across documents (default: batch.pages_per_chunk)")
+    parser.add_argument("--preset", default=None,
+                        help="pipeline preset from config pipeline.presets (e.g. fast, quality)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    from backend.batch_runner import run_batch
+    from backend.pipeline import preset_names
+
+    if args.preset and args.preset not in preset_names():
+        parser.error(f"unknown preset {args.preset!r} (available: {', '.join(preset_names()) or 'none'})")
+
+    def report(path, entry):
+        if entry["status"] == "done":
+            print(f"done    {path} -> {entry['output']} ({entry['pages']} pages)", flush=True)
+        else:
+            print(f"failed  {path}: {entry['error']}", flush=True)
+
+    manifest = run_batch(
+        args.inputs,
+        args.output,
+        compile_pdf=args.pdf,
+        resume=not args.no_resume,
+        pages_per_chunk=args.chunk_pages,
+        on_result=report,
+        preset=args.preset,
+    )
+    failed = [p for p, e in manifest["files"].items() if e.get("status") != "done"]
+    print(f"{len(manifest['files']) - len(failed)} converted, {len(failed)} failed; manifest in {args.output}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""
+Cold-import benchmark: how long a fresh interpreter takes to import the API
+app and CLI entry points, and whether any heavy dependency sneaks in.
+
+torch, transformers, pix2text, PyMuPDF and requests are imported when their
+stage first runs; importing api.main must not load them. Each module is
+imported in a new `python -X importtime` subprocess and the median over
+several runs is reported, with the slowest modules by self time.
+
+Usage (from project root):
+    python -m benchmarks.bench_imports [--repeat 5] [--budget-ms 1500] [module ...]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Optional, Tuple
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MODULES = ["api.main", "batch", "run"]
+
+# Cold import of api.main without torch is ~0.5 s; importing torch alone is several seconds
+DEFAULT_BUDGET_MS = 1500.0
+
+# Must stay out of the import path; they are loaded by the stage that needs them
+HEAVY_MODULES = ("torch", "transformers", "pix2text", "fitz", "pymupdf", "requests", "tensorflow")
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int, int]]:
+    """
+    Parse `-X importtime` output into (module, depth, self_us, cumulative_us)
+    rows, in the order the interpreter printed them.
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # header line
+        name_field = parts[2].rstrip()
+        name = name_field.strip()
+        depth = (len(name_field) - len(name_field.lstrip(" ")) - 1) // 2
+        rows.append((name, depth, int(parts[0]), int(parts[1])))
+    return rows
+
+
+def measure_once(module: str) -> dict:
+    """Import `module` in a fresh interpreter; return its cost and the heavy modules it loaded."""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    rows = parse_importtime(proc.stderr)
+    # The target and its parent packages are imported at top level; everything
+    # they pull in is nested under them and included in their cumulative time.
+    parts = module.split(".")
+    own = {".".join(parts[: i + 1]) for i in range(len(parts))}
+    # Children are printed before their parent, so a top-level row closes its group.
+    target_rows, group = [], []
+    for row in rows:
+        group.append(row)
+        if row[1] == 0:
+            if row[0] in own:
+                target_rows.extend(group)
+            group = []
+    total_us = sum(cum for name, depth, _, cum in target_rows if depth == 0)
+    loaded = {name for name, _, _, _ in target_rows}
+    heavy = sorted(m for m in HEAVY_MODULES if m in loaded)
+    slowest = sorted(((self_us, name) for name, _, self_us, _ in target_rows), reverse=True)[:10]
+    return {
+        "total_ms": total_us / 1000.0,
+        "heavy_modules": heavy,
+        "slowest_self_ms": {name: round(us / 1000.0, 2) for us, name in slowest},
+    }
+
+
+def measure(module: str, repeat: int = 5) -> dict:
+    """Median cold-import time of `module` over `repeat` fresh interpreters."""
+    runs = [measure_once(module) for _ in range(max(1, repeat))]
+    totals = [r["total_ms"] for r in runs]
+    return {
+        "median_ms": round(statistics.median(totals), 2),
+        "min_ms": round(min(totals), 2),
+        "max_ms": round(max(totals), 2),
+        "heavy_modules": runs[-1]["heavy_modules"],
+        "slowest_self_ms": runs[-1]["slowest_self_ms"],
+    }
+
+
+def check_budget(results: Dict[str, dict], budget_ms: float) -> List[str]:
+    """Human-readable violations: heavy modules imported or median over budget."""
+    problems = []
+    for module, r in results.items():
+        if r["heavy_modules"]:
+            problems.append(f"{module} imports heavy modules: {', '.join(r['heavy_modules'])}")
+        if r["median_ms"] > budget_ms:
+            problems.append(f"{module} cold import {r['median_ms']:.0f} ms > budget {budget_ms:.0f} ms")
+    return problems
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Cold-import time of TeXForm entry points.")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES, help="modules to import (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per module")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help="fail if a median cold import exceeds this")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    results = {module: measure(module, args.repeat) for module in args.modules}
+    print(json.dumps(results, indent=2))
+    problems = check_budget(results, args.budget_ms)
+    for problem in problems:
+        print(problem, file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""
+Micro-benchmark for backend.latex_generator on large synthetic documents.
+
+Times the current escape_text (split on backslashes, then a chained
+str.replace per special character) and render_body (first-character and
+substring-based paragraph classification) against the previous versions
+(one replace chain including the backslash, and a regex search per
+paragraph).
+
+Usage (from project root):
+    python -m benchmarks.bench_latex_generator [--paragraphs 20000] [--repeat 5]
+"""
+import argparse
+import random
+import re
+import timeit
+
+from backend.latex_generator import escape_text, render_body
+
+
+# ─── Previous implementation (reference) ──────────────────────────────────────
+
+def _legacy_escape_text(paragraph: str) -> str:
+    return (
+        paragraph
+        .replace("\\", r"\textbackslash{}")
+        .replace("&", r"\&")
+        .replace("%", r"\%")
+        .replace("$", r"\$")
+        .replace("#", r"\#")
+        .replace("_", r"\_")
+        .replace("{", r"\{")
+        .replace("}", r"\}")
+        .replace("^", r"\^{}")
+        .replace("~", r"\~{}")
+    )
+
+
+def _legacy_is_display_math(p: str) -> bool:
+    return (
+        p.startswith("\\[") and p.endswith("\\]")
+    ) or (
+        p.startswith("\\begin{equation") and p.rstrip().endswith("\\end{equation}")
+    )
+
+
+def _legacy_looks_like_math(p: str) -> bool:
+    return bool(re.search(r"[=\\\^_{}]", p))
+
+
+def _legacy_render_body(content: str) -> str:
+    body_parts = []
+    for p in filter(None, (p.strip() for p in content.split("\n\n"))):
+        if _legacy_is_display_math(p):
+            body_parts.append(p)
+        elif p.startswith("$") and p.endswith("$"):
+            body_parts.append(p)
+        elif _legacy_looks_like_math(p):
+            math_code = p.strip("$")
+            body_parts.append(f"\\[\n{math_code}\n\\]")
+        else:
+            body_parts.append(_legacy_escape_text(p))
+    return "\n\n".join(body_parts)
+
+
+# ─── Synthetic input ──────────────────────────────────────────────────────────
+
+_WORDS = (
+    "the theorem follows from lemma two since every bounded sequence has a "
+    "convergent subsequence 50% of cases & #3 cost ~$4 notes"
+).split()
+
+
+def synthetic_document(paragraphs: int, seed: int = 0) -> str:
+    """Mostly prose with some math lines and display blocks, like OCR output."""
+    rng = random.Random(seed)
+    parts = []
+    for _ in range(paragraphs):
+        roll = rng.random()
+        if roll < 0.7:
+            parts.append(" ".join(rng.choice(_WORDS) for _ in range(rng.randint(20, 80))))
+        elif roll < 0.9:
+            parts.append(f"x_{rng.randint(0, 9)} = a^2 + b^2")
+        else:
+            parts.append("\\[\n\\int_0^1 f(x)\\,dx\n\\]")
+    return "\n\n".join(parts)
+
+
+def _best(stmt, repeat: int) -> float:
+    return min(timeit.repeat(stmt, number=1, repeat=repeat))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--paragraphs", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    content = synthetic_document(args.paragraphs)
+    prose = " ".join(_WORDS) * 2000
+    print(f"document: {args.paragraphs} paragraphs, {len(content) / 1e6:.1f} MB")
+
+    rows = [
+        ("escape_text", lambda: _legacy_escape_text(prose), lambda: escape_text(prose)),
+        ("render_body", lambda: _legacy_render_body(content), lambda: render_body(content)),
+    ]
+    for name, legacy, current in rows:
+        t_old = _best(legacy, args.repeat)
+        t_new = _best(current, args.repeat)
+        print(f"{name:<12} legacy {t_old * 1e3:8.2f} ms   current {t_new * 1e3:8.2f} ms   x{t_old / t_new:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+"""
+End-to-end pipeline benchmark on a synthetic handwriting corpus.
+
+Times every stage (pdf_to_images, _segment_lines, ocr_text_from_page,
+recognize_math_in_text, generate_full_document, compile_latex_to_pdf) and the
+full /api/process request across page counts, line counts and DPIs, and
+reports latency percentiles, throughput and RSS as JSON.
+
+By default OCR and math recognition use stubs (no model download, no network)
+so the numbers reflect everything around the model; pass --ocr model to run
+the configured TrOCR checkpoint (or --model-name, e.g.
+microsoft/trocr-small-handwritten).
+
+Usage (from project root):
+    python -m benchmarks.bench_pipeline --output bench.json
+    python -m benchmarks.bench_pipeline --pages 1,8 --lines 10,40 --dpi 100,200
+    python -m benchmarks.bench_pipeline --compare bench.json   # exit 1 on regression
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from benchmarks.synthetic import make_pdf
+
+# ─── Offline stubs ────────────────────────────────────────────────────────────
+
+class _StubPixels:
+    """Stands in for the processor's pixel tensor; only the batch size matters."""
+
+    def __init__(self, batch: int):
+        self.shape = (batch, 3, 384, 384)
+
+    def to(self, device):
+        return self
+
+
+class _StubProcessor:
+    """Does the same per-line image work as TrOCRProcessor (RGB + resize) without a model."""
+
+    def __call__(self, images, return_tensors):
+        batch = images if isinstance(images, list) else [images]
+        for img in batch:
+            img.convert("RGB").resize((384, 384), Image.BILINEAR)
+        return SimpleNamespace(pixel_values=_StubPixels(len(batch)))
+
+    def batch_decode(self, generated_ids, skip_special_tokens):
+        return ["stub line with x = 1" for _ in generated_ids]
+
+
+class _StubModel:
+    # Special token ids of the TrOCR checkpoints (decoder start = end-of-sequence)
+    config = type("config", (), {"decoder_start_token_id": 2, "eos_token_id": 2, "pad_token_id": 1})
+
+    def generate(self, pixel_values, **kwargs):
+        return [[0, 1, 2] for _ in range(pixel_values.shape[0])]
+
+
+def install_stubs() -> None:
+    """Replace the OCR model and the math backends with offline stubs."""
+    import backend.math_recognition as math_recognition
+    import backend.ocr_engine as ocr_engine
+
+    for name in ("default", "small"):
+        engine = ocr_engine.TrOCREngine(name, "stub")
+        engine.processor, engine.model, engine.device = _StubProcessor(), _StubModel(), "cpu"
+        ocr_engine.register_engine(engine)
+    math_recognition._call_mathpix = lambda image_b64: None
+    math_recognition._call_pix2text = lambda image_path: None
+
+
+_config_overrides: Dict[str, Any] = {}
+
+
+def _set_config(key_path: str, value: Any) -> None:
+    """Override one config value for this benchmark process."""
+    from backend import config_loader
+
+    _config_overrides[key_path] = value
+    config_loader.reload_config(_config_overrides)
+
+
+# ─── Measurement helpers ──────────────────────────────────────────────────────
+
+def _timed(fn: Callable, *args, **kwargs) -> Tuple[Any, float]:
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    """Linear-interpolated percentile of an already sorted list (q in 0..100)."""
+    if not sorted_values:
+        return 0.0
+    pos = (len(sorted_values) - 1) * q / 100.0
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+def _current_rss_mb() -> Optional[float]:
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+
+class StageStats:
+    """Collects durations and processed item counts for one stage."""
+
+    def __init__(self, unit: str):
+        self.unit = unit
+        self.durations: List[float] = []
+        self.items = 0
+        self.rss_after_mb: Optional[float] = None
+
+    def add(self, seconds: float, items: int = 1) -> None:
+        self.durations.append(seconds)
+        self.items += items
+        self.rss_after_mb = _current_rss_mb()
+
+    def summary(self) -> Dict[str, Any]:
+        values = sorted(self.durations)
+        total = sum(values)
+        return {
+            "calls": len(values),
+            "items": self.items,
+            "unit": self.unit,
+            "mean_ms": 1e3 * total / len(values) if values else 0.0,
+            "p50_ms": 1e3 * _percentile(values, 50),
+            "p90_ms": 1e3 * _percentile(values, 90),
+            "p99_ms": 1e3 * _percentile(values, 99),
+            "max_ms": 1e3 * values[-1] if values else 0.0,
+            "throughput_per_s": self.items / total if total > 0 else None,
+            "rss_after_mb": self.rss_after_mb,
+        }
+
+
+# ─── Benchmark ────────────────────────────────────────────────────────────────
+
+def _latex_available() -> bool:
+    return bool(shutil.which("latexmk") or shutil.which("pdflatex"))
+
+
+def bench_config(
+    pages: int,
+    lines: int,
+    dpi: int,
+    iterations: int,
+    work_dir: str,
+    compile_pdf: bool,
+    api: bool,
+) -> Dict[str, Any]:
+    """Run every stage `iterations` times for one (pages, lines, dpi) combination."""
+    from backend.latex_generator import compile_latex_to_pdf, generate_full_document
+    from backend.math_recognition import recognize_math_in_text
+    from backend.ocr_engine import _segment_lines, ocr_text_from_page
+    from backend.pdf_utils import pdf_to_images
+
+    stats = {
+        "pdf_to_images": StageStats("pages"),
+        "segment_lines": StageStats("lines"),
+        "ocr_text_from_page": StageStats("pages"),
+        "recognize_math_in_text": StageStats("pages"),
+        "generate_full_document": StageStats("documents"),
+        "compile_latex_to_pdf": StageStats("documents"),
+        "api_process": StageStats("pages"),
+    }
+    client = None
+    if api:
+        from fastapi.testclient import TestClient
+
+        from api.main import app
+
+        client = TestClient(app)
+
+    for it in range(iterations):
+        run_dir = tempfile.mkdtemp(dir=work_dir)
+        # a fresh seed per iteration so the API's upload cache never hits
+        pdf_path = make_pdf(os.path.join(run_dir, "notes.pdf"), pages, lines, dpi, seed=it + 1)
+
+        image_paths, t = _timed(pdf_to_images, pdf_path, os.path.join(run_dir, "pages"), dpi)
+        stats["pdf_to_images"].add(t, len(image_paths))
+
+        page_texts = []
+        for path in image_paths:
+            with Image.open(path) as img:
+                page = img.convert("RGB")
+            crops, t = _timed(_segment_lines, page)
+            stats["segment_lines"].add(t, len(crops))
+
+            text, t = _timed(ocr_text_from_page, path)
+            stats["ocr_text_from_page"].add(t)
+            enriched, t = _timed(recognize_math_in_text, text, path)
+            stats["recognize_math_in_text"].add(t)
+            page_texts.append(enriched)
+
+        latex, t = _timed(generate_full_document, "\n\n".join(page_texts))
+        stats["generate_full_document"].add(t)
+
+        if compile_pdf:
+            _, t = _timed(compile_latex_to_pdf, latex)
+            stats["compile_latex_to_pdf"].add(t)
+
+        if client is not None:
+            with open(pdf_path, "rb") as f:
+                body = f.read()
+            resp, t = _timed(
+                client.post,
+                "/api/process",
+                files={"file": ("notes.pdf", body, "application/pdf")},
+                data={"compile_pdf": "true" if compile_pdf else "false"},
+            )
+            if resp.status_code != 200:
+                raise RuntimeError(f"/api/process failed: {resp.status_code} {resp.text[:200]}")
+            stats["api_process"].add(t, pages)
+
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+    return {name: s.summary() for name, s in stats.items() if s.durations}
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    if args.ocr == "stub":
+        install_stubs()
+    if args.model_name:
+        _set_config("ocr_engine.model_name", args.model_name)
+
+    compile_pdf = not args.skip_compile and _latex_available()
+    work_dir = tempfile.mkdtemp(prefix="texform_bench_")
+    _set_config("document_store.dir", os.path.join(work_dir, "store"))
+    try:
+        configs = {}
+        for pages in args.pages:
+            for lines in args.lines:
+                for dpi in args.dpi:
+                    label = f"pages={pages},lines={lines},dpi={dpi}"
+                    print(f"running {label}", file=sys.stderr)
+                    configs[label] = bench_config(
+                        pages, lines, dpi, args.iterations, work_dir, compile_pdf, not args.skip_api
+                    )
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "ocr": args.ocr,
+            "model_name": args.model_name,
+            "iterations": args.iterations,
+            "latex_compiled": compile_pdf,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "peak_rss_mb": _peak_rss_mb(),
+        "configs": configs,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Return one message per stage whose p50 latency regressed by more than tolerance."""
+    regressions = []
+    for label, stages in current["configs"].items():
+        base_stages = baseline.get("configs", {}).get(label, {})
+        for stage, summary in stages.items():
+            base = base_stages.get(stage)
+            if not base or not base.get("p50_ms"):
+                continue
+            ratio = summary["p50_ms"] / base["p50_ms"]
+            line = f"{label:<32} {stage:<24} p50 {base['p50_ms']:9.2f} -> {summary['p50_ms']:9.2f} ms  x{ratio:.2f}"
+            print(line, file=sys.stderr)
+            if ratio > 1.0 + tolerance:
+                regressions.append(line)
+    return regressions
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="TeXForm pipeline benchmark (synthetic corpus).")
+    parser.add_argument("--pages", type=_int_list, default=[1, 4], help="comma-separated page counts")
+    parser.add_argument("--lines", type=_int_list, default=[10, 30], help="comma-separated lines per page")
+    parser.add_argument("--dpi", type=_int_list, default=[150], help="comma-separated DPIs")
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--ocr", choices=("stub", "model"), default="stub", help="stub = offline, no model")
+    parser.add_argument("--model-name", default=None, help="override ocr_engine.model_name (with --ocr model)")
+    parser.add_argument("--skip-compile", action="store_true", help="do not time LaTeX compilation")
+    parser.add_argument("--skip-api", action="store_true", help="do not time the /api/process request")
+    parser.add_argument("--output", default=None, help="write JSON results here (default: stdout)")
+    parser.add_argument("--compare", default=None, help="baseline JSON to compare p50 latencies against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p50 slowdown (0.2 = 20%%)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    results = run(args)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} stage(s) regressed beyond {args.tolerance:.0%}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""
+Synthetic "handwriting" corpus for benchmarks: pages of ink strokes laid out
+in text lines, rendered as images or multi-page PDFs. Deterministic per seed,
+no fonts or downloads needed.
+"""
+import os
+import random
+from typing import List
+
+from PIL import Image, ImageDraw
+
+# Letter-size page in inches
+PAGE_WIDTH_IN = 8.5
+PAGE_HEIGHT_IN = 11.0
+
+
+def make_page_image(lines: int, dpi: int = 150, seed: int = 0) -> Image.Image:
+    """
+    Draw a white page with `lines` rows of random pen strokes. Rows are spaced
+    so line segmentation finds one crop per row.
+    """
+    rng = random.Random(seed)
+    width = int(PAGE_WIDTH_IN * dpi)
+    height = int(PAGE_HEIGHT_IN * dpi)
+    img = Image.new("RGB", (width, height), (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+
+    margin = dpi // 2
+    line_pitch = max(30, (height - 2 * margin) // max(lines, 1))
+    x_height = max(16, int(line_pitch * 0.5))
+    stroke = max(2, dpi // 75)
+
+    for row in range(lines):
+        top = margin + row * line_pitch
+        if top + x_height > height - margin:
+            break
+        x = margin
+        right = rng.randint(width // 2, width - margin)
+        while x < right:
+            # one "word": a zig-zag polyline
+            word_len = rng.randint(dpi // 4, dpi)
+            points = []
+            for i in range(rng.randint(4, 12)):
+                px = x + i * word_len // 10
+                py = top + rng.randint(0, x_height)
+                points.append((px, py))
+            draw.line(points, fill=(20, 20, 20), width=stroke)
+            x += word_len + rng.randint(dpi // 10, dpi // 4)
+    return img
+
+
+def make_image(path: str, lines: int, dpi: int = 150, seed: int = 0) -> str:
+    """Save one synthetic page as an image (format from the extension)."""
+    make_page_image(lines, dpi, seed).save(path)
+    return path
+
+
+def make_pdf(path: str, pages: int, lines: int, dpi: int = 150, seed: int = 0) -> str:
+    """Save a multi-page synthetic PDF (each page a scanned-looking image)."""
+    images: List[Image.Image] = [make_page_image(lines, dpi, seed * 1000 + i) for i in range(pages)]
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    images[0].save(path, save_all=True, append_images=images[1:], resolution=float(dpi))
+    return path
@@ -1,6 +1,16 @@
 """
 Launcher for the TeXForm API. Blocks TensorFlow before any other imports
 so transformers uses only PyTorch and never triggers the ml_dtypes error.
+
+    python run.py                 # development: one process, auto-reload
+    python run.py --prod          # production: pre-forked worker processes
+    python run.py --prod --workers 16
+
+In production mode the parent process imports the app and loads the OCR model
+once, then forks the workers. Model weights live in tensor storage that the
+workers only read, so they stay shared copy-on-write between all workers
+instead of being loaded once per process. This only applies to CPU weights:
+with a GPU, each worker loads its own copy onto the device on first use.
 """
 import os
 import sys
@@ -19,13 +29,197 @@ if "tensorflow" not in sys.modules:
     _fake_tf.__spec__ = importlib.machinery.ModuleSpec("tensorflow", None)
     sys.modules["tensorflow"] = _fake_tf
 
+import argparse
+import gc
+import logging
+import signal
+import socket
+import time
+
 import uvicorn
 
+_log = logging.getLogger("texform.server")
+
+# A worker that dies sooner than this after starting is restarted with a delay
+MIN_WORKER_UPTIME = 30.0
+MAX_RESTART_DELAY = 60.0
+# Longest the supervisor sleeps while a restart is pending, so it still reaps
+# exited workers and reacts to shutdown promptly
+SUPERVISOR_POLL_SECONDS = 0.5
+
+
+def _available_cpus() -> int:
+    """CPU cores this process may run on (respects affinity masks / taskset)."""
+    if hasattr(os, "sched_getaffinity"):
+        return max(1, len(os.sched_getaffinity(0)))
+    return max(1, os.cpu_count() or 1)
+
+
+def _resolve_workers(requested: int) -> int:
+    """--workers, then WEB_CONCURRENCY, then config server.workers; 0 means one per core."""
+    from backend.config_loader import get
+
+    workers = requested or int(os.environ.get("WEB_CONCURRENCY", 0) or 0) or int(get("server.workers", 0) or 0)
+    return workers if workers > 0 else _available_cpus()
+
+
+def _resolve_threads(workers: int) -> int:
+    """Torch intra-op threads per worker: config server.threads_per_worker, else cores / workers."""
+    from backend.config_loader import get
+
+    threads = int(get("server.threads_per_worker", 0) or 0)
+    return threads if threads > 0 else max(1, _available_cpus() // workers)
+
+
+def _bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(config: uvicorn.Config, sock: socket.socket, threads: int) -> None:
+    """Body of a forked worker: cap torch threads, then serve on the shared socket."""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(threads)
+    else:
+        # torch is imported lazily on the first OCR request; it reads this at import
+        os.environ["OMP_NUM_THREADS"] = str(threads)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _restart_delay(uptime: float, previous: float) -> float:
+    """
+    Seconds to wait before restarting a worker that ran for `uptime` seconds.
+    Workers that die soon after starting (e.g. a broken model or config) are
+    restarted with doubling delays up to MAX_RESTART_DELAY instead of in a
+    tight fork loop; a worker that ran for a while is restarted at once.
+    """
+    if uptime >= MIN_WORKER_UPTIME:
+        return 0.0
+    return min(MAX_RESTART_DELAY, max(1.0, previous * 2))
+
+
+def serve_production(host: str, port: int, workers: int) -> None:
+    """
+    Pre-fork server: load the app and (on CPU) the OCR model in this process,
+    fork `workers` children that share the listening socket, and restart any
+    that die.
+    """
+    from backend.config_loader import get
+
+    workers = _resolve_workers(workers)
+    if not hasattr(os, "fork"):
+        _log.warning("os.fork is unavailable; falling back to uvicorn workers (model not shared).")
+        uvicorn.run("api.main:app", host=host, port=port, workers=workers)
+        return
+
+    # Query CUDA through NVML so the check itself does not initialise CUDA in
+    # the parent (a process that has done so cannot fork usable children)
+    os.environ.setdefault("PYTORCH_NVML_BASED_CUDA_CHECK", "1")
+    from api.main import app
+
+    if get("server.preload_model", True):
+        from backend.ocr_engine import preload_device, preload_model
+
+        if preload_device() == "cpu":
+            _log.info("Loading OCR model before forking %d workers", workers)
+            preload_model()
+        else:
+            _log.info("OCR runs on the GPU; each worker loads its own copy of the model on first use")
+
+    threads = _resolve_threads(workers)
+    config = uvicorn.Config(app, host=host, port=port)
+    sock = _bind_socket(host, port)
+    # Move everything allocated so far out of the GC's reach so collections in the
+    # workers do not touch (and thereby un-share) the parent's pages.
+    gc.freeze()
+
+    children = {}
+    started = {}  # slot -> time its current worker was forked
+    delays = {}  # slot -> last restart delay
+    restarts = {}  # slot -> time at which its worker is due to be restarted
+    shutting_down = False
+
+    def spawn(slot: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _run_worker(config, sock, threads)
+            finally:
+                os._exit(0)
+        children[pid] = slot
+        started[slot] = time.monotonic()
+
+    def stop(signum, frame):
+        nonlocal shutting_down
+        shutting_down = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    _log.info("Starting %d workers (%d torch threads each) on %s:%d", workers, threads, host, port)
+    for slot in range(workers):
+        spawn(slot)
+
+    while children or (restarts and not shutting_down):
+        if shutting_down:
+            restarts.clear()
+        now = time.monotonic()
+        for slot in [slot for slot, due in restarts.items() if due <= now]:
+            del restarts[slot]
+            spawn(slot)
+        try:
+            if not restarts:
+                pid, status = os.wait()
+            else:
+                # A restart is pending: poll instead of blocking, so it happens on time
+                pid, status = os.waitpid(-1, os.WNOHANG) if children else (0, 0)
+                if pid == 0:
+                    time.sleep(min(SUPERVISOR_POLL_SECONDS, max(0.0, min(restarts.values()) - time.monotonic())))
+                    continue
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        slot = children.pop(pid, None)
+        if slot is not None and not shutting_down:
+            delay = delays[slot] = _restart_delay(time.monotonic() - started[slot], delays.get(slot, 0.0))
+            _log.warning(
+                "Worker %d (pid %d) exited with status %d; restarting in %.0f s", slot, pid, status, delay
+            )
+            restarts[slot] = time.monotonic() + delay
+    sock.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the TeXForm API server.")
+    parser.add_argument("--prod", action="store_true", help="production mode: pre-forked workers, no reload")
+    parser.add_argument("--workers", type=int, default=0, help="worker processes in --prod mode (0 = auto)")
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8000)))
+    args = parser.parse_args()
+
+    if args.prod:
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+        serve_production(args.host, args.port, args.workers)
+    else:
+        uvicorn.run(
+            "api.main:app",
+            host=args.host,
+            port=args.port,
+            reload=True,
+        )
+
+
 if __name__ == "__main__":
-    port = int(os.environ.get("PORT", 8000))
-    uvicorn.run(
-        "api.main:app",
-        host="0.0.0.0",
-        port=port,
-        reload=True,
-    )
+    main()
@@ -0,0 +1,394 @@
+"""
+Tests for api.main: /api/process and document download endpoints (pipeline stubbed).
+"""
+import pstats
+import socket
+import threading
+import time
+
+import anyio
+import pytest
+import uvicorn
+from fastapi.testclient import TestClient
+
+import api.main as main
+import backend.document_store as document_store
+import backend.pipeline as pipeline
+from backend import cancellation
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    root = tmp_path / "store"
+    root.mkdir()
+    monkeypatch.setattr(document_store, "_store_root", lambda: str(root))
+    monkeypatch.setattr(pipeline, "ocr_text_from_pages", lambda paths, **kwargs: ["hello world"] * len(paths))
+    monkeypatch.setattr(pipeline, "recognize_math_in_text", lambda text, path, backend="auto": text)
+    return TestClient(main.app)
+
+
+def _png_bytes():
+    return b"\x89PNG\r\n\x1a\n" + b"\x00" * 20
+
+
+def test_process_without_pdf_skips_compilation(client, monkeypatch):
+    def fail_compile(latex, pdf_path, build_dir=None, use_latexmk=None):
+        raise AssertionError("should not compile")
+
+    monkeypatch.setattr(document_store, "compile_latex_to_pdf_file", fail_compile)
+    resp = client.post(
+        "/api/process",
+        files={"file": ("notes.png", _png_bytes(), "image/png")},
+        data={"compile_pdf": "false"},
+    )
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["pdf_base64"] is None
+    assert "hello world" in data["latex"]
+    assert len(data["document_id"]) == 32
+
+
+def test_download_pdf_compiles_on_demand(client, monkeypatch):
+    def fake_compile(latex, pdf_path, build_dir=None, use_latexmk=None):
+        with open(pdf_path, "wb") as f:
+            f.write(b"%PDF-1.4\n%%EOF")
+        return pdf_path
+
+    monkeypatch.setattr(document_store, "compile_latex_to_pdf_file", fake_compile)
+    resp = client.post(
+        "/api/process",
+        files={"file": ("notes.png", _png_bytes(), "image/png")},
+        data={"compile_pdf": "false"},
+    )
+    doc_id = resp.json()["document_id"]
+
+    pdf = client.get(f"/api/documents/{doc_id}.pdf")
+    assert pdf.status_code == 200
+    assert pdf.headers["content-type"] == "application/pdf"
+    assert pdf.content.startswith(b"%PDF")
+
+
+def test_download_pdf_unknown_document(client):
+    assert client.get(f"/api/documents/{'0' * 32}.pdf").status_code == 404
+
+
+def test_edit_page_updates_document(client):
+    resp = client.post(
+        "/api/process",
+        files={"file": ("notes.png", _png_bytes(), "image/png")},
+        data={"compile_pdf": "false"},
+    )
+    doc_id = resp.json()["document_id"]
+
+    edit = client.put(f"/api/documents/{doc_id}/pages/1", json={"text": "corrected text"})
+    assert edit.status_code == 200
+    assert "corrected text" in edit.json()["latex"]
+
+    doc = client.get(f"/api/documents/{doc_id}").json()
+    assert doc["pages"] == 1
+    assert "corrected text" in doc["latex"] and "hello world" not in doc["latex"]
+    assert client.get(f"/api/documents/{doc_id}/pages/1").json()["text"] == "corrected text"
+    assert client.put(f"/api/documents/{doc_id}/pages/2", json={"text": "x"}).status_code == 404
+
+
+def test_repeat_upload_uses_cached_ocr(client, monkeypatch):
+    calls = []
+    monkeypatch.setattr(pipeline, "ocr_text_from_pages", lambda paths, **kwargs: calls.append(paths) or ["hello world"] * len(paths))
+    for _ in range(2):
+        resp = client.post(
+            "/api/process",
+            files={"file": ("notes.png", _png_bytes(), "image/png")},
+            data={"compile_pdf": "false"},
+        )
+        assert resp.status_code == 200
+    assert len(calls) == 1
+    assert resp.json()["cached"] is True
+    assert "hello world" in resp.json()["latex"]
+
+
+def test_fast_preset_overrides_pipeline_for_one_request(client, monkeypatch):
+    ocr_kwargs = []
+    monkeypatch.setattr(
+        pipeline, "ocr_text_from_pages", lambda paths, **kwargs: ocr_kwargs.append(kwargs) or ["draft"] * len(paths)
+    )
+    monkeypatch.setattr(pipeline, "recognize_math_in_text", lambda text, path, backend="auto": f"{text} [{backend}]")
+
+    def fail_compile(latex, pdf_path, build_dir=None, use_latexmk=None):
+        raise AssertionError("fast preset should not compile")
+
+    monkeypatch.setattr(document_store, "compile_latex_to_pdf_file", fail_compile)
+    resp = client.post(
+        "/api/process",
+        files={"file": ("notes.png", _png_bytes(), "image/png")},
+        data={"preset": "fast", "num_beams": "2"},
+    )
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["pdf_base64"] is None
+    assert data["options"]["num_beams"] == 2 and data["options"]["math_backend"] == "none"
+    assert ocr_kwargs[0]["num_beams"] == 2
+    assert "draft [none]" in data["latex"]
+
+    # Same upload with default options is not served from the fast result
+    resp = client.post(
+        "/api/process",
+        files={"file": ("notes.png", _png_bytes(), "image/png")},
+        data={"compile_pdf": "false"},
+    )
+    assert resp.json()["cached"] is False
+
+
+def test_unknown_preset_rejected(client):
+    resp = client.post(
+        "/api/process",
+        files={"file": ("notes.png", _png_bytes(), "image/png")},
+        data={"preset": "nope"},
+    )
+    assert resp.status_code == 400
+    assert "fast" in resp.json()["detail"]
+
+
+def _serve(app):
+    """Run app under uvicorn on a free local port in a thread; returns (server, thread, port)."""
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(app, log_level="warning"))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    for _ in range(500):
+        if server.started:
+            break
+        time.sleep(0.01)
+    return server, thread, sock.getsockname()[1]
+
+
+def test_client_disconnect_cancels_remaining_ocr(client, monkeypatch):
+    started = threading.Event()
+    cancelled = threading.Event()
+
+    def slow_ocr(paths, **kwargs):
+        started.set()
+        try:
+            for _ in range(1000):
+                cancellation.check_cancelled()
+                cancelled.wait(0.01)
+        except cancellation.Cancelled:
+            cancelled.set()
+            raise
+        return ["never"] * len(paths)
+
+    monkeypatch.setattr(pipeline, "ocr_text_from_pages", slow_ocr)
+    monkeypatch.setattr(main, "DISCONNECT_POLL_SECONDS", 0.05)
+    server, thread, port = _serve(main.app)
+    try:
+        body = (
+            b"--xx\r\n"
+            b'Content-Disposition: form-data; name="file"; filename="notes.png"\r\n'
+            b"Content-Type: image/png\r\n\r\n" + _png_bytes() + b"\r\n"
+            b"--xx\r\n"
+            b'Content-Disposition: form-data; name="compile_pdf"\r\n\r\nfalse\r\n'
+            b"--xx--\r\n"
+        )
+        head = (
+            "POST /api/process HTTP/1.1\r\nHost: localhost\r\n"
+            "Content-Type: multipart/form-data; boundary=xx\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n"
+        ).encode()
+        conn = socket.create_connection(("127.0.0.1", port))
+        conn.sendall(head + body)
+        assert started.wait(5)
+        conn.close()  # the client goes away while OCR is running
+        assert cancelled.wait(5)
+    finally:
+        server.should_exit = True
+        thread.join(5)
+
+
+def test_page_selection_validated(client):
+    resp = client.post(
+        "/api/process",
+        files={"file": ("notes.png", _png_bytes(), "image/png")},
+        data={"pages": "2-1"},
+    )
+    assert resp.status_code == 400
+    resp = client.post(
+        "/api/process",
+        files={"file": ("notes.png", _png_bytes(), "image/png")},
+        data={"pages": "2", "compile_pdf": "false"},
+    )
+    assert resp.status_code == 400
+    assert "matches no pages" in resp.json()["detail"]
+
+
+def test_bounded_mode_returns_document_by_url(client, monkeypatch):
+    def fail_compile(latex, pdf_path, build_dir=None, use_latexmk=None):
+        raise AssertionError("should not compile")
+
+    monkeypatch.setattr(document_store, "compile_latex_to_pdf_file", fail_compile)
+    resp = client.post(
+        "/api/process",
+        files={"file": ("notes.png", _png_bytes(), "image/png")},
+        data={"compile_pdf": "false", "bounded": "true"},
+    )
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["bounded"] is True and data["pages"] == 1
+    assert data["latex"] is None and data["pdf_base64"] is None
+    assert data["pdf_url"] == f"/api/documents/{data['document_id']}.pdf"
+
+    tex = client.get(data["latex_url"])
+    assert tex.status_code == 200
+    assert "hello world" in tex.text and tex.text.endswith("\\end{document}")
+    assert client.get(f"/api/documents/{'0' * 32}.tex").status_code == 404
+
+
+def test_upload_rejected_once_size_limit_exceeded(client, monkeypatch):
+    monkeypatch.setattr(main, "MAX_FILE_SIZE_BYTES", 64)
+    monkeypatch.setattr(main, "UPLOAD_CHUNK_SIZE", 16)
+    resp = client.post("/api/process", files={"file": ("notes.png", b"x" * 100, "image/png")})
+    assert resp.status_code == 400
+    assert "too large" in resp.json()["detail"]
+
+
+def _read_status(conn) -> int:
+    conn.settimeout(5)
+    return int(conn.recv(65536).split(b" ", 2)[1])
+
+
+def test_oversized_upload_rejected_before_body_is_read(client, monkeypatch):
+    streamed = []
+    monkeypatch.setattr(main, "_stream_upload", lambda *args: streamed.append(args))
+    monkeypatch.setattr(main, "MAX_FILE_SIZE_BYTES", 1024)
+    monkeypatch.setattr(main, "MAX_FORM_OVERHEAD_BYTES", 0)
+    head = "POST /api/process HTTP/1.1\r\nHost: localhost\r\nContent-Type: multipart/form-data; boundary=xx\r\n"
+    server, thread, port = _serve(main.app)
+    try:
+        # Declared length over the limit: answered without sending any body
+        with socket.create_connection(("127.0.0.1", port)) as conn:
+            conn.sendall(f"{head}Content-Length: {100 * 1024 * 1024}\r\n\r\n".encode())
+            assert _read_status(conn) == 413
+        # Chunked body: cut off once past the limit, before the body is complete
+        with socket.create_connection(("127.0.0.1", port)) as conn:
+            chunk = b"x" * 800
+            conn.sendall(f"{head}Transfer-Encoding: chunked\r\n\r\n".encode())
+            conn.sendall(b"%x\r\n%s\r\n" % (len(chunk), chunk) * 2)
+            assert _read_status(conn) == 413
+    finally:
+        server.should_exit = True
+        thread.join(5)
+    assert streamed == []
+
+
+def test_empty_upload_rejected(client):
+    resp = client.post("/api/process", files={"file": ("notes.png", b"", "image/png")})
+    assert resp.status_code == 400
+    assert resp.json()["detail"] == "File is empty"
+
+
+def test_metrics_endpoint_and_timings(client):
+    resp = client.post(
+        "/api/process",
+        files={"file": ("notes.png", _png_bytes(), "image/png")},
+        data={"compile_pdf": "false", "include_timings": "true"},
+    )
+    timings = resp.json()["timings"]
+    assert {"upload", "latex_generate", "total"} <= set(timings)
+
+    text = client.get("/api/metrics").text
+    assert "# TYPE texform_stage_seconds histogram" in text
+    assert 'texform_requests_total{endpoint="/api/process",status="200"}' in text
+
+
+def test_failing_requests_are_counted(client, monkeypatch):
+    def broken(document_id):
+        raise RuntimeError("disk gone")
+
+    monkeypatch.setattr(document_store, "load_latex", broken)
+    resp = TestClient(main.app, raise_server_exceptions=False).get(f"/api/documents/{'0' * 32}")
+    assert resp.status_code == 500
+    text = client.get("/api/metrics").text
+    assert 'texform_requests_total{endpoint="/api/documents/{document_id}",status="500"}' in text
+
+
+def test_profile_flag_requires_config(client):
+    resp = client.post(
+        "/api/process",
+        files={"file": ("notes.png", _png_bytes(), "image/png")},
+        data={"compile_pdf": "false", "profile": "true"},
+    )
+    assert resp.status_code == 403
+
+
+def test_profile_flag_stores_downloadable_profile(client, monkeypatch, tmp_path):
+    import backend.profiling as profiling
+
+    values = {"debug.profiling_enabled": True, "debug.torch_profiler": False, "debug.profile_dir": str(tmp_path / "p")}
+    monkeypatch.setattr(profiling, "get", lambda key, default=None: values.get(key, default))
+    resp = client.post(
+        "/api/process",
+        files={"file": ("notes.png", _png_bytes(), "image/png")},
+        data={"compile_pdf": "false", "profile": "true"},
+    )
+    profile_id = resp.json()["profile_id"]
+    assert "profile.prof" in client.get(f"/api/profiles/{profile_id}").json()["artifacts"]
+    summary = client.get(f"/api/profiles/{profile_id}/profile.txt")
+    assert summary.status_code == 200
+    assert "cumulative" in summary.text
+    # Stages that normally run off the event loop still run on the profiled thread
+    stats = pstats.Stats(profiling.artifact_path(profile_id, "profile.prof"))
+    profiled = {name for _, _, name in stats.stats}
+    assert {"prepare_input_images", "enrich_pages", "create_document"} <= profiled
+
+
+def test_profiled_bounded_request_runs_on_profiled_thread(client, monkeypatch, tmp_path):
+    import backend.profiling as profiling
+
+    values = {"debug.profiling_enabled": True, "debug.torch_profiler": False, "debug.profile_dir": str(tmp_path / "p")}
+    monkeypatch.setattr(profiling, "get", lambda key, default=None: values.get(key, default))
+    resp = client.post(
+        "/api/process",
+        files={"file": ("notes.png", _png_bytes(), "image/png")},
+        data={"compile_pdf": "false", "profile": "true", "bounded": "true"},
+    )
+    assert resp.json()["bounded"] is True
+    stats = pstats.Stats(profiling.artifact_path(resp.json()["profile_id"], "profile.prof"))
+    profiled = {name for _, _, name in stats.stats}
+    assert {"convert_to_document", "enrich_pages", "finish"} <= profiled
+
+
+def test_batch_endpoint_shares_ocr_batches(client, monkeypatch):
+    calls = []
+    monkeypatch.setattr(pipeline, "ocr_text_from_pages", lambda paths, **kwargs: calls.append(len(paths)) or ["text"] * len(paths))
+    resp = client.post(
+        "/api/batch",
+        files=[
+            ("files", ("a.png", _png_bytes(), "image/png")),
+            ("files", ("b.txt", b"nope", "text/plain")),
+            ("files", ("c.png", _png_bytes() + b"\x01", "image/png")),
+        ],
+    )
+    assert resp.status_code == 200
+    docs = resp.json()["documents"]
+    assert [d["filename"] for d in docs] == ["a.png", "b.txt", "c.png"]
+    assert "Unsupported" in docs[1]["error"]
+    # both images went through one OCR call
+    assert calls == [2]
+    for doc in (docs[0], docs[2]):
+        assert doc["pages"] == 1 and doc["cached"] is False
+        assert "text" in client.get(f"/api/documents/{doc['document_id']}").json()["latex"]
+
+
+def test_batch_waits_outside_shared_threadpool(client, monkeypatch):
+    from backend import scheduler
+
+    borrowed = []
+
+    def enrich_fair(paths, options, client_id, priority="batch"):
+        limiter = anyio.to_thread.current_default_thread_limiter
+        borrowed.append(anyio.from_thread.run_sync(lambda: limiter().borrowed_tokens))
+        return ["text"] * len(paths)
+
+    monkeypatch.setattr(scheduler, "enrich_pages_fair", enrich_fair)
+    resp = client.post("/api/batch", files=[("files", ("a.png", _png_bytes(), "image/png"))])
+    assert resp.status_code == 200 and resp.json()["documents"][0]["pages"] == 1
+    assert borrowed == [0]
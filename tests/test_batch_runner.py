@@ -0,0 +1,87 @@
+"""
+Tests for backend.batch_runner: cross-document batching, outputs and resume.
+"""
+import json
+
+import pytest
+from PIL import Image
+
+import backend.batch_runner as batch_runner
+import backend.document_store as document_store
+import backend.pipeline as pipeline
+
+
+@pytest.fixture
+def ocr_calls(tmp_path, monkeypatch):
+    store = tmp_path / "store"
+    store.mkdir()
+    monkeypatch.setattr(document_store, "_store_root", lambda: str(store))
+    calls = []
+
+    def fake_ocr(paths, **kwargs):
+        calls.append(len(paths))
+        return [f"text {i}" for i in range(len(paths))]
+
+    monkeypatch.setattr(pipeline, "ocr_text_from_pages", fake_ocr)
+    monkeypatch.setattr(pipeline, "recognize_math_in_text", lambda text, path, backend="auto": text)
+    return calls
+
+
+def _make_inputs(folder, count):
+    folder.mkdir()
+    for i in range(count):
+        Image.new("RGB", (20, 20), (i, i, i)).save(str(folder / f"note_{i}.png"))
+    (folder / "readme.txt").write_text("ignored")
+    return folder
+
+
+def test_run_batch_writes_outputs_and_manifest(tmp_path, ocr_calls):
+    inputs = _make_inputs(tmp_path / "in", 3)
+    out = tmp_path / "out"
+
+    manifest = batch_runner.run_batch([str(inputs)], str(out), pages_per_chunk=2)
+
+    # 3 single-page docs with chunks of >= 2 pages: one OCR call for 2 docs, one for the last
+    assert ocr_calls == [2, 1]
+    assert sorted(p.name for p in out.iterdir()) == ["manifest.json", "note_0.tex", "note_1.tex", "note_2.tex"]
+    assert "text 0" in (out / "note_0.tex").read_text()
+    on_disk = json.loads((out / "manifest.json").read_text())
+    assert on_disk == manifest
+    assert all(e["status"] == "done" and e["pages"] == 1 for e in manifest["files"].values())
+
+
+def test_run_batch_resumes_from_manifest(tmp_path, ocr_calls, monkeypatch):
+    inputs = _make_inputs(tmp_path / "in", 2)
+    out = tmp_path / "out"
+    monkeypatch.setattr(document_store, "cached_pages", lambda key: None)
+
+    batch_runner.run_batch([str(inputs)], str(out))
+    assert ocr_calls == [2]
+
+    # Simulate an interrupted run: one output never got written
+    (out / "note_1.tex").unlink()
+    batch_runner.run_batch([str(inputs)], str(out))
+    assert ocr_calls == [2, 1]
+
+    # Everything done: nothing is reprocessed
+    batch_runner.run_batch([str(inputs)], str(out))
+    assert ocr_calls == [2, 1]
+
+
+def test_run_batch_records_failures(tmp_path, ocr_calls):
+    bad = tmp_path / "broken.pdf"
+    bad.write_bytes(b"not a pdf")
+    manifest = batch_runner.run_batch([str(bad)], str(tmp_path / "out"))
+    entry = manifest["files"][str(bad)]
+    assert entry["status"] == "failed"
+    assert entry["error"]
+
+
+def test_output_names_disambiguated(tmp_path, ocr_calls):
+    for sub in ("a", "b"):
+        (tmp_path / sub).mkdir()
+        Image.new("RGB", (20, 20), (1, 2, 3) if sub == "a" else (4, 5, 6)).save(str(tmp_path / sub / "notes.png"))
+    manifest = batch_runner.run_batch([str(tmp_path / "a"), str(tmp_path / "b")], str(tmp_path / "out"))
+    outputs = sorted(e["output"] for e in manifest["files"].values())
+    assert outputs[0] == "notes.tex" or outputs[1] == "notes.tex"
+    assert len(set(outputs)) == 2
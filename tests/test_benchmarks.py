@@ -0,0 +1,49 @@
+"""
+Smoke test for the offline pipeline benchmark (stub OCR, tiny corpus).
+"""
+import json
+
+import pytest
+
+import backend.math_recognition as math_recognition
+import backend.ocr_engine as ocr_engine
+from backend import config_loader
+from benchmarks import bench_pipeline
+from benchmarks.synthetic import make_page_image
+
+
+@pytest.fixture
+def isolated_globals(monkeypatch):
+    # install_stubs() and _set_config() change process-wide state; restore it afterwards
+    monkeypatch.setattr(ocr_engine, "_engines", dict(ocr_engine._engines))
+    for module, name in (
+        (math_recognition, "_call_mathpix"),
+        (math_recognition, "_call_pix2text"),
+    ):
+        monkeypatch.setattr(module, name, getattr(module, name))
+    monkeypatch.setattr(bench_pipeline, "_config_overrides", {})
+    yield
+    config_loader.reload_config()
+
+
+def test_synthetic_page_segments_into_lines():
+    page = make_page_image(lines=6, dpi=100, seed=3)
+    assert len(ocr_engine._segment_lines(page)) == 6
+
+
+def test_bench_pipeline_stub_run(tmp_path, isolated_globals):
+    out = tmp_path / "bench.json"
+    argv = ["--pages", "2", "--lines", "5", "--dpi", "72", "--iterations", "1", "--skip-compile", "--output", str(out)]
+    assert bench_pipeline.main(argv) == 0
+
+    results = json.loads(out.read_text())
+    stages = results["configs"]["pages=2,lines=5,dpi=72"]
+    for stage in ("pdf_to_images", "segment_lines", "ocr_text_from_page", "recognize_math_in_text",
+                  "generate_full_document", "api_process"):
+        assert stages[stage]["calls"] >= 1
+        assert stages[stage]["p50_ms"] >= 0
+    assert stages["pdf_to_images"]["items"] == 2
+    assert stages["segment_lines"]["items"] == 10
+
+    # Comparing a run against itself never reports a regression
+    assert bench_pipeline.compare(results, results, tolerance=0.0) == []
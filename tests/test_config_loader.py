@@ -0,0 +1,60 @@
+"""
+Tests for backend.config_loader: typed settings snapshot, dotted get() and reload swap.
+"""
+import dataclasses
+
+import pytest
+
+from backend import config_loader
+
+
+@pytest.fixture(autouse=True)
+def restore_config():
+    yield
+    config_loader.reload_config()
+
+
+def test_get_reads_dotted_paths_from_snapshot():
+    assert config_loader.get("pdf_utils.dpi") == config_loader.settings().pdf.dpi
+    assert config_loader.get("latex_generator.page_geometry") == {"margin": "1in"}
+    assert config_loader.get("no.such.key", "fallback") == "fallback"
+
+
+def test_settings_are_frozen_and_validated():
+    snapshot = config_loader.reload_config({"ocr_engine.num_beams": 99, "pdf_utils.dpi": 5000})
+    assert snapshot.ocr.num_beams == 16
+    assert snapshot.pdf.dpi == 200
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        snapshot.ocr.num_beams = 1
+    with pytest.raises(TypeError):
+        snapshot.values["pdf_utils.dpi"] = 300
+
+
+def test_reload_swaps_snapshot_and_fingerprint():
+    before = config_loader.settings()
+    after = config_loader.reload_config({"ocr_engine.num_beams": 1})
+    assert config_loader.settings() is after
+    assert after.fingerprint != before.fingerprint
+    # Holders of the old snapshot keep a consistent view
+    assert before.ocr.num_beams == 4
+    assert config_loader.get("ocr_engine.num_beams") == 1
+    assert config_loader.reload_config().fingerprint == before.fingerprint
+
+
+def test_nested_values_are_read_only():
+    config_loader.reload_config({"pipeline.presets.fast.dpi": 150, "batch.extra": [1, {"a": 2}]})
+    presets = config_loader.get("pipeline.presets")
+    with pytest.raises(TypeError):
+        presets["fast"]["dpi"] = 72
+    with pytest.raises(TypeError):
+        config_loader.get("latex_generator.page_geometry")["margin"] = "0in"
+    extra = config_loader.get("batch.extra")
+    assert extra == (1, {"a": 2})
+    with pytest.raises(TypeError):
+        extra[1]["a"] = 3
+    # get_config() is a plain, independent copy
+    copy = config_loader.get_config()
+    copy["pipeline"]["presets"]["fast"]["dpi"] = 72
+    copy["batch"]["extra"].append(3)
+    assert config_loader.get("pipeline.presets.fast.dpi") == 150
+    assert config_loader.get("batch.extra") == (1, {"a": 2})
@@ -0,0 +1,164 @@
+"""
+Tests for backend.document_store: per-page documents, page edits and on-demand PDFs.
+"""
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+import backend.document_store as document_store
+from backend.latex_generator import generate_full_document
+
+
+@pytest.fixture(autouse=True)
+def store_root(tmp_path, monkeypatch):
+    root = tmp_path / "store"
+    root.mkdir()
+    monkeypatch.setattr(document_store, "_store_root", lambda: str(root))
+    return root
+
+
+def test_create_and_load_document():
+    pages = ["Hello & world", "x = 1\n\nplain text"]
+    doc_id = document_store.create_document(pages)
+    assert len(doc_id) == 32
+    assert document_store.page_count(doc_id) == 2
+    assert document_store.load_page(doc_id, 2) == "x = 1\n\nplain text"
+    # Assembling cached page fragments matches rendering the joined text at once
+    assert document_store.load_latex(doc_id) == generate_full_document("\n\n".join(pages))
+
+
+def test_document_writer_publishes_only_when_finished(store_root):
+    with document_store.DocumentWriter() as writer:
+        writer.add_pages(["first page"])
+        writer.add_pages(["second page"])
+        assert document_store.load_latex(writer.doc_id) is None
+        doc_id = writer.finish()
+    assert document_store.page_count(doc_id) == 2
+    assert document_store.load_latex(doc_id) == generate_full_document("first page\n\nsecond page")
+
+    with pytest.raises(RuntimeError):
+        with document_store.DocumentWriter() as writer:
+            writer.add_pages(["lost page"])
+            raise RuntimeError("OCR failed")
+    assert sorted(os.listdir(store_root)) == [doc_id]
+
+
+def test_unknown_or_invalid_id_returns_none():
+    assert document_store.load_latex("0" * 32) is None
+    assert document_store.load_latex("../etc/passwd") is None
+    assert document_store.get_pdf_path("not-an-id") is None
+    assert document_store.replace_page("0" * 32, 1, "x") is None
+
+
+def test_replace_page_rerenders_only_that_page(store_root):
+    doc_id = document_store.create_document(["first page", "second page"])
+    build = store_root / doc_id / "build"
+    untouched_mtime = os.path.getmtime(build / "page_001.tex")
+    os.utime(build / "page_001.tex", (0, 0))
+
+    latex = document_store.replace_page(doc_id, 2, "corrected & fixed")
+
+    assert "corrected \\& fixed" in latex
+    assert "second page" not in latex
+    assert "first page" in latex
+    assert os.path.getmtime(build / "page_001.tex") == 0 != untouched_mtime
+    assert document_store.load_latex(doc_id) == latex
+
+
+def test_replace_page_out_of_range():
+    doc_id = document_store.create_document(["only page"])
+    with pytest.raises(IndexError):
+        document_store.replace_page(doc_id, 2, "x")
+
+
+def test_pdf_compiled_once_and_invalidated_by_edit(monkeypatch):
+    calls = []
+
+    def fake_compile(latex, pdf_path, build_dir=None, use_latexmk=None):
+        calls.append((latex, build_dir))
+        with open(pdf_path, "wb") as f:
+            f.write(b"%PDF-1.4\n%%EOF")
+        return pdf_path
+
+    monkeypatch.setattr(document_store, "compile_latex_to_pdf_file", fake_compile)
+    doc_id = document_store.create_document(["a", "b"])
+
+    path = document_store.get_pdf_path(doc_id)
+    assert open(path, "rb").read().startswith(b"%PDF")
+    assert document_store.get_pdf_path(doc_id) == path
+    assert len(calls) == 1
+    main_tex, build_dir = calls[0]
+    assert "\\input{page_001}" in main_tex and "\\input{page_002}" in main_tex
+    assert build_dir.endswith("build")
+
+    document_store.replace_page(doc_id, 1, "changed")
+    document_store.get_pdf_path(doc_id)
+    assert len(calls) == 2
+
+
+# Holds an flock on the given file until stdin is closed
+_HOLD_LOCK = """
+import fcntl, sys
+with open(sys.argv[1], "a") as f:
+    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    print("locked", flush=True)
+    sys.stdin.read()
+"""
+
+
+@pytest.mark.skipif(document_store.fcntl is None, reason="needs fcntl (POSIX)")
+def test_compile_waits_for_other_process(monkeypatch, store_root):
+    def fake_compile(latex, pdf_path, build_dir=None, use_latexmk=None):
+        with open(pdf_path, "wb") as f:
+            f.write(b"%PDF-1.4\n%%EOF")
+        return pdf_path
+
+    monkeypatch.setattr(document_store, "compile_latex_to_pdf_file", fake_compile)
+    doc_id = document_store.create_document(["a"])
+    lock_path = store_root / doc_id / "build" / ".lock"
+    holder = subprocess.Popen(
+        [sys.executable, "-c", _HOLD_LOCK, str(lock_path)], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+    )
+    try:
+        assert holder.stdout.readline().strip() == "locked"
+        done = threading.Event()
+        worker = threading.Thread(target=lambda: document_store.get_pdf_path(doc_id) and done.set())
+        worker.start()
+        assert not done.wait(0.3)  # another worker process holds the document
+    finally:
+        holder.stdin.close()
+        holder.wait(5)
+    worker.join(5)
+    assert done.is_set()
+
+
+def test_prune_keeps_newest(monkeypatch, store_root):
+    monkeypatch.setattr(document_store, "get", lambda key, default=None: 2 if key == "document_store.max_documents" else default)
+    ids = []
+    for i in range(3):
+        ids.append(document_store.create_document([str(i)]))
+        os.utime(store_root / ids[-1], (i, i))
+    document_store._prune()
+    remaining = sorted(os.listdir(store_root))
+    assert ids[0] not in remaining
+    assert len(remaining) == 2
+
+
+def test_result_cache_roundtrip():
+    key = "ab" * 32
+    assert document_store.cached_pages(key) is None
+    document_store.cache_pages(key, ["page one", "page two"])
+    assert document_store.cached_pages(key) == ["page one", "page two"]
+    # Keys must look like hex digests (no path components)
+    document_store.cache_pages("../x", ["nope"])
+    assert document_store.cached_pages("../x") is None
+
+
+def test_result_cache_keyed_by_config(monkeypatch):
+    key = "cd" * 32
+    document_store.cache_pages(key, ["old settings"])
+    monkeypatch.setattr(document_store, "config_fingerprint", lambda: "0" * 16)
+    assert document_store.cached_pages(key) is None
@@ -0,0 +1,74 @@
+"""
+Tests for backend.image_preprocessing: photo decoding, orientation, downscaling and cleanup.
+"""
+import numpy as np
+import pytest
+from PIL import Image
+
+from backend import config_loader
+from backend.file_utils import prepare_input_images
+from backend.image_preprocessing import _clean_background, _otsu_threshold, preprocess_photo
+
+
+@pytest.fixture(autouse=True)
+def default_config():
+    config_loader.reload_config()
+    yield
+    config_loader.reload_config()
+
+
+def _photo(path, size=(4000, 3000), orientation=None):
+    """Gray paper with one dark stroke near the top-left, saved as JPEG."""
+    pixels = np.full((size[1], size[0]), 200, dtype=np.uint8)
+    pixels[100:300, 100:1500] = 20
+    image = Image.fromarray(pixels)
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    image.save(path, format="JPEG", exif=exif)
+    return str(path)
+
+
+def test_photo_is_oriented_downscaled_and_cleaned(tmp_path):
+    # Orientation 6: the camera was rotated, the stored pixels are landscape
+    src = _photo(tmp_path / "photo.jpg", orientation=6)
+    out = preprocess_photo(src, str(tmp_path / "page_001.png"))
+
+    image = Image.open(out)
+    assert image.mode == "L"
+    assert image.size == (1500, 2000)  # portrait, longest side = image_preprocessing.max_side
+    pixels = np.asarray(image)
+    assert (pixels[-200:, :200] == 255).all()  # paper whitened
+    assert pixels[:600, -600:].min() < 60  # stroke kept (rotated to the top-right)
+
+
+def test_small_png_is_not_upscaled(tmp_path):
+    src = tmp_path / "scan.png"
+    Image.new("RGB", (800, 600), "white").save(src)
+    out = preprocess_photo(str(src), str(tmp_path / "page_001.png"))
+    assert Image.open(out).size == (800, 600)
+
+
+def test_clean_background_drops_specks_keeps_strokes():
+    gray = np.full((50, 50), 210, dtype=np.uint8)
+    gray[10:20, 5:45] = 30  # stroke
+    gray[40, 40] = 30  # isolated speck
+    cleaned = _clean_background(gray)
+    assert 30 <= _otsu_threshold(gray) < 210
+    assert (cleaned[10:20, 5:45] == 30).all()
+    assert cleaned[40, 40] == 255
+    assert cleaned[0, 0] == 255
+
+
+def test_prepare_input_images_preprocesses_photos(tmp_path):
+    src = _photo(tmp_path / "photo.jpg")
+    paths = prepare_input_images(src, str(tmp_path / "out"))
+    assert paths == [str(tmp_path / "out" / "page_001.png")]
+    assert max(Image.open(paths[0]).size) == 2000
+
+
+def test_disabled_preprocessing_copies_upload(tmp_path):
+    config_loader.reload_config({"image_preprocessing.enabled": False})
+    src = _photo(tmp_path / "photo.jpg", size=(400, 300))
+    paths = prepare_input_images(src, str(tmp_path / "out"))
+    assert paths == [str(tmp_path / "out" / "page_001.jpg")]
@@ -0,0 +1,32 @@
+"""
+Cold-import budget: the API and CLI entry points must start without torch,
+transformers, pix2text, PyMuPDF or requests (see benchmarks/bench_imports.py).
+"""
+import pytest
+
+from benchmarks import bench_imports
+
+
+def test_parse_importtime_depth_and_times():
+    stderr = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       100 |        100 |     backend.metrics\n"
+        "import time:        50 |        150 |   backend\n"
+        "import time:        20 |        170 | api.main\n"
+    )
+    assert bench_imports.parse_importtime(stderr) == [
+        ("backend.metrics", 2, 100, 100),
+        ("backend", 1, 50, 150),
+        ("api.main", 0, 20, 170),
+    ]
+
+
+@pytest.mark.parametrize("module", ["api.main", "batch", "run"])
+def test_entry_point_imports_no_heavy_modules(module):
+    result = bench_imports.measure(module, repeat=1)
+    assert result["heavy_modules"] == []
+
+
+def test_api_cold_import_within_budget():
+    result = bench_imports.measure("api.main", repeat=3)
+    assert result["median_ms"] <= bench_imports.DEFAULT_BUDGET_MS, result["slowest_self_ms"]
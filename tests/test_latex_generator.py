@@ -2,7 +2,7 @@ import pytest
 import os
 import subprocess
 
-from backend.latex_generator import generate_full_document, compile_latex_to_pdf
+from backend.latex_generator import compile_latex_to_pdf, compile_latex_to_pdf_file, escape_text, generate_full_document, render_body
 
 
 def test_generate_full_document_basic():
@@ -29,7 +29,7 @@ def test_generate_full_document_basic():
 
 def test_compile_latex_to_pdf(monkeypatch):
     # Stub subprocess.run to simulate successful compilation
-    def fake_run(cmd, cwd, stdout, stderr):
+    def fake_run(cmd, cwd, stdout, stderr, env=None):
         # Create a dummy PDF file in the working dir
         pdf_path = os.path.join(cwd, "document.pdf")
         with open(pdf_path, "wb") as f:
@@ -43,3 +43,102 @@ def test_compile_latex_to_pdf(monkeypatch):
 
     # The returned bytes should start like a PDF file
     assert pdf_data.startswith(b"%PDF")
+
+
+def test_compile_in_build_dir_skips_second_pass_when_aux_stable(monkeypatch, tmp_path):
+    runs = []
+
+    def fake_run(cmd, cwd, stdout, stderr, env=None):
+        runs.append(cmd[0])
+        with open(os.path.join(cwd, "document.pdf"), "wb") as f:
+            f.write(b"%PDF-1.4\n%%EOF")
+        with open(os.path.join(cwd, "document.aux"), "w") as f:
+            f.write("\\relax\n")
+        return subprocess.CompletedProcess(cmd, 0, stdout=b"", stderr=b"")
+
+    monkeypatch.setattr("backend.latex_generator.subprocess.run", fake_run)
+    monkeypatch.setattr("backend.latex_generator.shutil.which", lambda name: None)
+
+    build_dir = str(tmp_path / "build")
+    minimal = r"\documentclass{article}\begin{document}Test\end{document}"
+    compile_latex_to_pdf(minimal, build_dir=build_dir)
+    assert runs == ["pdflatex", "pdflatex"]
+
+    # Second build reuses the .aux from the first; it does not change, so one pass suffices
+    runs.clear()
+    compile_latex_to_pdf(minimal, build_dir=build_dir)
+    assert runs == ["pdflatex"]
+
+
+def test_compile_to_file_keeps_build_pdf(monkeypatch, tmp_path):
+    def fake_run(cmd, cwd, stdout, stderr, env=None):
+        with open(os.path.join(cwd, "document.pdf"), "wb") as f:
+            f.write(b"%PDF-1.4\n%%EOF")
+        return subprocess.CompletedProcess(cmd, 0, stdout=b"", stderr=b"")
+
+    monkeypatch.setattr("backend.latex_generator.subprocess.run", fake_run)
+    minimal = r"\documentclass{article}\begin{document}Test\end{document}"
+    build_dir = tmp_path / "build"
+    target = str(tmp_path / "out.pdf")
+
+    assert compile_latex_to_pdf_file(minimal, target, build_dir=str(build_dir)) == target
+    assert open(target, "rb").read().startswith(b"%PDF")
+    # The persistent build keeps its own PDF (latexmk's target), not shared with the published one
+    assert (build_dir / "document.pdf").exists()
+    assert os.stat(target).st_ino != os.stat(build_dir / "document.pdf").st_ino
+    assert sorted(os.listdir(tmp_path)) == ["build", "out.pdf"]
+
+    # Without build_dir the temporary build directory is removed again
+    other = str(tmp_path / "other.pdf")
+    compile_latex_to_pdf_file(minimal, other)
+    assert sorted(os.listdir(tmp_path)) == ["build", "other.pdf", "out.pdf"]
+
+
+def test_compile_restricts_shell_and_file_access(monkeypatch, tmp_path):
+    calls = []
+
+    def fake_run(cmd, cwd, stdout, stderr, env=None):
+        calls.append((cmd, env))
+        with open(os.path.join(cwd, "document.pdf"), "wb") as f:
+            f.write(b"%PDF-1.4\n%%EOF")
+        return subprocess.CompletedProcess(cmd, 0, stdout=b"", stderr=b"")
+
+    monkeypatch.setattr("backend.latex_generator.subprocess.run", fake_run)
+    monkeypatch.setattr("backend.latex_generator.shutil.which", lambda name: "/usr/bin/" + name)
+    minimal = r"\documentclass{article}\begin{document}Test\end{document}"
+    for use_latexmk in (True, False):
+        calls.clear()
+        compile_latex_to_pdf(minimal, build_dir=str(tmp_path / "build"), use_latexmk=use_latexmk)
+        cmd, env = calls[0]
+        assert cmd[0] == ("latexmk" if use_latexmk else "pdflatex")
+        assert "-no-shell-escape" in cmd
+        assert env["openin_any"] == "p" and env["openout_any"] == "p" and env["shell_escape"] == "f"
+
+
+def test_failed_compile_removes_aux_files(monkeypatch, tmp_path):
+    build_dir = tmp_path / "build"
+
+    def fake_run(cmd, cwd, stdout, stderr, env=None):
+        with open(os.path.join(cwd, "document.aux"), "w") as f:
+            f.write("\\relax \\newlabel{broken\n")
+        return subprocess.CompletedProcess(cmd, 1, stdout=b"! Emergency stop.", stderr=b"")
+
+    monkeypatch.setattr("backend.latex_generator.subprocess.run", fake_run)
+    monkeypatch.setattr("backend.latex_generator.shutil.which", lambda name: None)
+    with pytest.raises(RuntimeError, match="Emergency stop"):
+        compile_latex_to_pdf(r"\documentclass{article}\begin{document}\bad\end{document}", build_dir=str(build_dir))
+    assert sorted(os.listdir(build_dir)) == ["document.tex"]
+
+
+def test_escape_text_backslash_not_double_escaped():
+    assert escape_text("a\\b") == r"a\textbackslash{}b"
+    assert escape_text("{x}\\") == r"\{x\}\textbackslash{}"
+
+
+def test_escape_text_specials():
+    assert escape_text("50% & #1 costs $5_a ~b^c") == r"50\% \& \#1 costs \$5\_a \~{}b\^{}c"
+
+
+def test_render_body_classification():
+    body = render_body("plain & text\n\n$x$\n\n\\[y\\]\n\na = b\n\n  \n\n")
+    assert body.split("\n\n") == [r"plain \& text", "$x$", r"\[y\]", "\\[\na = b\n\\]"]
@@ -31,3 +31,24 @@ def test_recognize_math_with_image(monkeypatch, tmp_path):
     assert raw in enriched
     # Should append a display-math block
     assert "\\[" in enriched and "E=mc^2" in enriched and enriched.rstrip().endswith("\\]")
+
+
+def test_recognize_math_backend_none_skips_recognizers(monkeypatch, tmp_path):
+    img_path = tmp_path / "math.png"
+    Image.new("RGB", (5, 5), (0, 0, 0)).save(str(img_path))
+
+    def fail(*args):
+        raise AssertionError("no recognizer should run")
+
+    monkeypatch.setattr(mr, "_call_mathpix", fail)
+    monkeypatch.setattr(mr, "_call_pix2text", fail)
+    assert recognize_math_in_text(" text ", str(img_path), backend="none") == "text"
+
+
+def test_recognize_math_pix2text_backend_skips_mathpix(monkeypatch, tmp_path):
+    img_path = tmp_path / "math.png"
+    Image.new("RGB", (5, 5), (0, 0, 0)).save(str(img_path))
+    monkeypatch.setattr(mr, "_call_mathpix", lambda img_b64: "E=mc^2")
+    monkeypatch.setattr(mr, "_call_pix2text", lambda path: "$x^2$")
+    enriched = recognize_math_in_text("text", str(img_path), backend="pix2text")
+    assert "$x^2$" in enriched and "E=mc^2" not in enriched
@@ -0,0 +1,58 @@
+"""
+Tests for backend.metrics: counters, histograms, timers and Prometheus rendering.
+"""
+import pytest
+
+from backend import metrics
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def test_counter_and_gauge_render():
+    metrics.PAGES.inc()
+    metrics.PAGES.inc(2)
+    metrics.CACHE_REQUESTS.inc(cache="pdf", result="hit")
+    with metrics.IN_PROGRESS.track(endpoint="/api/process"):
+        assert metrics.IN_PROGRESS.value(endpoint="/api/process") == 1
+    text = metrics.render()
+    assert "# TYPE texform_pages_total counter" in text
+    assert "texform_pages_total 3" in text
+    assert 'texform_cache_requests_total{cache="pdf",result="hit"} 1' in text
+    assert 'texform_requests_in_progress{endpoint="/api/process"} 0' in text
+
+
+def test_timer_feeds_histogram_and_request_timings():
+    with metrics.collect_timings() as timings:
+        with metrics.timer("ocr_generate"):
+            pass
+        with metrics.timer("ocr_generate"):
+            pass
+    with metrics.timer("outside"):
+        pass
+    assert set(timings) == {"ocr_generate"}
+    assert metrics.STAGE_SECONDS.count(stage="ocr_generate") == 2
+    text = metrics.render()
+    assert 'texform_stage_seconds_bucket{stage="ocr_generate",le="+Inf"} 2' in text
+    assert 'texform_stage_seconds_count{stage="outside"} 1' in text
+
+
+def test_histogram_buckets_are_cumulative():
+    h = metrics.Histogram("texform_test_seconds", "test", buckets=(0.1, 1.0))
+    h.observe(0.05)
+    h.observe(0.5)
+    h.observe(5)
+    text = h.render()
+    assert 'texform_test_seconds_bucket{le="0.1"} 1' in text
+    assert 'texform_test_seconds_bucket{le="1"} 2' in text
+    assert 'texform_test_seconds_bucket{le="+Inf"} 3' in text
+    assert "texform_test_seconds_sum 5.55" in text
+
+
+def test_label_values_are_escaped():
+    metrics.REQUESTS.inc(endpoint='a"b\\c', status="200")
+    assert 'endpoint="a\\"b\\\\c"' in metrics.render()
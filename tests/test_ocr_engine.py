@@ -6,6 +6,18 @@ import os
 import backend.ocr_engine as ocr_engine
 
 
+# Token ids of the stub models: decoder start 2, end-of-sequence 3, padding 1
+_STUB_CONFIG = type("cfg", (), {"decoder_start_token_id": 2, "eos_token_id": 3, "pad_token_id": 1})
+
+
+def _install_engine(monkeypatch, processor, model, name="default"):
+    """Register an already-"loaded" engine with stub processor and model."""
+    engine = ocr_engine.TrOCREngine(name, "stub")
+    engine.processor, engine.model, engine.device = processor, model, torch.device("cpu")
+    monkeypatch.setitem(ocr_engine._engines, name, engine)
+    return engine
+
+
 def test_ocr_text_from_page(monkeypatch, tmp_path):
     """OCR returns joined lines for a page with visible text lines."""
     # Create an image with two dark horizontal bands (simulating text lines)
@@ -20,18 +32,17 @@ def test_ocr_text_from_page(monkeypatch, tmp_path):
 
     class DummyProcessor:
         def __call__(self, images, return_tensors):
-            return type("obj", (), {"pixel_values": dummy_tensor})
+            return type("obj", (), {"pixel_values": dummy_tensor.repeat(len(images), 1, 1, 1)})
 
         def batch_decode(self, generated_ids, skip_special_tokens):
-            return ["decoded text"]
+            return ["decoded text"] * len(generated_ids)
 
     class DummyModel:
+        config = _STUB_CONFIG
         def generate(self, pixel_values, max_length, num_beams, early_stopping):
-            return [[1, 2, 3]]
+            return [[1, 2, 3]] * pixel_values.shape[0]
 
-    monkeypatch.setattr(ocr_engine, "_processor", DummyProcessor())
-    monkeypatch.setattr(ocr_engine, "_model", DummyModel())
-    monkeypatch.setattr(ocr_engine, "_device", torch.device("cpu"))
+    _install_engine(monkeypatch, DummyProcessor(), DummyModel())
 
     result = ocr_engine.ocr_text_from_page(str(img_path))
 
@@ -48,18 +59,260 @@ def test_ocr_blank_page(monkeypatch, tmp_path):
 
     class DummyProcessor:
         def __call__(self, images, return_tensors):
-            return type("obj", (), {"pixel_values": dummy_tensor})
+            return type("obj", (), {"pixel_values": dummy_tensor.repeat(len(images), 1, 1, 1)})
 
         def batch_decode(self, generated_ids, skip_special_tokens):
-            return [""]
+            return [""] * len(generated_ids)
 
     class DummyModel:
+        config = _STUB_CONFIG
         def generate(self, pixel_values, max_length, num_beams, early_stopping):
-            return [[1]]
+            return [[1]] * pixel_values.shape[0]
 
-    monkeypatch.setattr(ocr_engine, "_processor", DummyProcessor())
-    monkeypatch.setattr(ocr_engine, "_model", DummyModel())
-    monkeypatch.setattr(ocr_engine, "_device", torch.device("cpu"))
+    _install_engine(monkeypatch, DummyProcessor(), DummyModel())
 
     result = ocr_engine.ocr_text_from_page(str(img_path))
     assert result == ""
+
+
+def test_ocr_text_from_pages_batches_lines_across_pages(monkeypatch, tmp_path):
+    """Lines from several pages share generate() batches; text is split back per page."""
+    paths = []
+    for n_lines in (3, 1, 2):
+        img = Image.new("RGB", (200, 40 * n_lines), (255, 255, 255))
+        draw = ImageDraw.Draw(img)
+        for i in range(n_lines):
+            draw.rectangle([10, 40 * i + 10, 190, 40 * i + 30], fill=(0, 0, 0))
+        path = tmp_path / f"page_{len(paths)}.png"
+        img.save(str(path))
+        paths.append(str(path))
+
+    batch_sizes = []
+
+    class DummyProcessor:
+        def __call__(self, images, return_tensors):
+            return type("obj", (), {"pixel_values": torch.zeros((len(images), 3, 10, 10))})
+
+        def batch_decode(self, generated_ids, skip_special_tokens):
+            return [f"line {int(row[0])}" for row in generated_ids]
+
+    class DummyModel:
+        config = _STUB_CONFIG
+        calls = 0
+
+        def generate(self, pixel_values, max_length, num_beams, early_stopping):
+            n = pixel_values.shape[0]
+            batch_sizes.append(n)
+            start = DummyModel.calls
+            DummyModel.calls += n
+            return [[start + i] for i in range(n)]
+
+    _install_engine(monkeypatch, DummyProcessor(), DummyModel())
+
+    result = ocr_engine.ocr_text_from_pages(paths, batch_size=4)
+
+    assert batch_sizes == [4, 2]
+    assert result == ["line 0\nline 1\nline 2", "line 3", "line 4\nline 5"]
+
+
+class _LineDecoder:
+    """
+    Fake VisionEncoderDecoderModel for the cached greedy decoder. The encoder
+    maps line image i to hidden state i; line i then emits tokens 10, 11, ...
+    and end-of-sequence (3) after i + 1 tokens. Each call records the batch
+    size it was given, and the KV cache is a legacy tuple of one tensor per
+    layer whose width grows by one per step.
+    """
+
+    config = _STUB_CONFIG
+
+    def __init__(self):
+        self.encoder_calls = 0
+        self.batch_sizes = []
+        outer = self
+
+        class Encoder:
+            def __call__(self, pixel_values):
+                outer.encoder_calls += 1
+                return type("out", (), {"last_hidden_state": pixel_values[:, :1, 0, 0]})
+
+        self.encoder = Encoder()
+
+    def __call__(self, encoder_outputs, decoder_input_ids, past_key_values, use_cache):
+        hidden = encoder_outputs[0]
+        rows = hidden.shape[0]
+        assert decoder_input_ids.shape == (rows, 1)
+        self.batch_sizes.append(rows)
+        step = 1 if past_key_values is None else past_key_values[0][0].shape[1] + 1
+        past = ((torch.zeros((rows, step)),),)
+        line = hidden[:, 0].long()
+        tokens = torch.where(step > line + 1, torch.full_like(line, 3), 9 + step)
+        logits = torch.nn.functional.one_hot(tokens, 32).float().unsqueeze(1)
+        return type("out", (), {"logits": logits, "past_key_values": past})
+
+
+@pytest.mark.parametrize("early_exit", [True, False])
+def test_greedy_decode_runs_encoder_once_and_drops_finished_lines(monkeypatch, early_exit):
+    model = _LineDecoder()
+    pixel_values = torch.arange(3, dtype=torch.float).reshape(3, 1, 1, 1).expand(3, 3, 4, 4)
+
+    ids, confidence = ocr_engine._greedy_decode(model, pixel_values, max_length=10, early_exit=early_exit)
+
+    assert model.encoder_calls == 1
+    assert ids.tolist() == [
+        [2, 10, 3, 1, 1],
+        [2, 10, 11, 3, 1],
+        [2, 10, 11, 12, 3],
+    ]
+    assert model.batch_sizes == ([3, 3, 2, 1] if early_exit else [3, 3, 3, 3])
+    assert confidence.shape == (3,) and bool(((confidence > 0) & (confidence < 1)).all())
+
+
+def test_greedy_batches_use_cached_decoder(monkeypatch, tmp_path):
+    """num_beams=1 goes through the cached decoder, not generate()."""
+    img = Image.new("RGB", (200, 40), (255, 255, 255))
+    ImageDraw.Draw(img).rectangle([10, 10, 190, 30], fill=(0, 0, 0))
+    img.save(str(tmp_path / "page.png"))
+
+    class DummyProcessor:
+        def __call__(self, images, return_tensors):
+            return type("obj", (), {"pixel_values": torch.zeros((len(images), 3, 4, 4))})
+
+        def batch_decode(self, generated_ids, skip_special_tokens):
+            return [" ".join(str(int(t)) for t in row if int(t) >= 10) for row in generated_ids]
+
+    class Model(_LineDecoder):
+        def generate(self, *args, **kwargs):
+            raise AssertionError("generate() should not be used for greedy decoding")
+
+    _install_engine(monkeypatch, DummyProcessor(), Model())
+    assert ocr_engine.ocr_text_from_page(str(tmp_path / "page.png"), num_beams=1) == "10"
+
+
+def test_token_count_excludes_start_and_padding():
+    ids = torch.tensor([[2, 10, 3, 1, 1], [2, 10, 11, 3, 1], [2, 10, 11, 12, 13]])
+    # 2 + 3 tokens up to end-of-sequence; the last line ran to max_length
+    assert ocr_engine._count_tokens(ids, eos_id=3) == 9
+    assert ocr_engine._count_tokens([[2, 10, 3], [2, 3]], eos_id=3) == 3
+
+
+class _FakeEngine(ocr_engine.TrOCREngine):
+    """Engine returning canned texts/confidences per line; records what it was given."""
+
+    def __init__(self, name, confidences=None):
+        super().__init__(name, "fake")
+        self.confidences = confidences
+        self.calls = []
+
+    def recognize(self, line_images, max_length, num_beams, with_confidence=False):
+        self.calls.append(len(line_images))
+        offset = sum(self.calls[:-1])
+        texts = [f"{self.name} {offset + i}" for i in range(len(line_images))]
+        scores = self.confidences[offset: offset + len(line_images)] if with_confidence else None
+        return texts, scores
+
+
+def _lines_page(tmp_path, n_lines):
+    img = Image.new("RGB", (200, 40 * n_lines), (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    for i in range(n_lines):
+        draw.rectangle([10, 40 * i + 10, 190, 40 * i + 30], fill=(0, 0, 0))
+    path = tmp_path / "page.png"
+    img.save(str(path))
+    return str(path)
+
+
+def test_cascade_reruns_only_low_confidence_lines(monkeypatch, tmp_path):
+    small = _FakeEngine("small", confidences=[0.9, 0.2, 0.95, 0.1])
+    base = _FakeEngine("default")
+    monkeypatch.setitem(ocr_engine._engines, "small", small)
+    monkeypatch.setitem(ocr_engine._engines, "default", base)
+
+    text = ocr_engine.ocr_text_from_page(_lines_page(tmp_path, 4), engine="cascade")
+
+    assert text.split("\n") == ["small 0", "default 0", "small 2", "default 1"]
+    assert small.calls == [4] and base.calls == [2]
+
+
+def test_engine_registry_is_lazy_and_validated(monkeypatch):
+    monkeypatch.setattr(ocr_engine, "_engines", {})
+    assert {"default", "small", "cascade"} <= set(ocr_engine.engine_names())
+
+    small = ocr_engine.get_engine("small")
+    assert small.model_name == "microsoft/trocr-small-handwritten"
+    assert not small.loaded and ocr_engine.engine_memory() == {}
+    assert ocr_engine.get_engine("small") is small
+    with pytest.raises(ValueError, match="Unknown OCR engine"):
+        ocr_engine.get_engine("huge")
+    with pytest.raises(ValueError, match="Unknown OCR engine"):
+        ocr_engine.ocr_text_from_pages([], engine="huge")
+
+
+def test_engine_memory_accounting(monkeypatch):
+    model = torch.nn.Linear(10, 4)  # 44 float32 parameters
+    engine = _install_engine(monkeypatch, object(), model, name="tiny")
+    engine.memory_bytes = ocr_engine._model_bytes(model)
+    assert ocr_engine.engine_memory()["tiny"] == 44 * 4
+    engine.unload()
+    assert not engine.loaded and "tiny" not in ocr_engine.engine_memory()
+
+
+def _tiny_trocr():
+    """A randomly initialised 2-layer ViT/TrOCR VisionEncoderDecoderModel (ids as in _STUB_CONFIG)."""
+    transformers = pytest.importorskip("transformers")
+    torch.manual_seed(3)
+    # Large init ranges so that lines differ and end at different steps
+    encoder = transformers.ViTConfig(
+        image_size=32, patch_size=16, hidden_size=32, num_hidden_layers=1,
+        num_attention_heads=2, intermediate_size=64, initializer_range=0.5,
+    )
+    decoder = transformers.TrOCRConfig(
+        vocab_size=6, d_model=32, decoder_layers=2, decoder_attention_heads=2,
+        decoder_ffn_dim=64, max_position_embeddings=64, init_std=0.5,
+    )
+    config = transformers.VisionEncoderDecoderConfig.from_encoder_decoder_configs(encoder, decoder)
+    config.decoder_start_token_id, config.pad_token_id, config.eos_token_id = 2, 1, 3
+    return transformers.VisionEncoderDecoderModel(config=config).eval()
+
+
+class _LegacyCacheModel:
+    """Wraps a model so the decoder KV cache is handed around as legacy per-layer tuples."""
+
+    def __init__(self, model):
+        from transformers.cache_utils import EncoderDecoderCache
+
+        self.model, self.config, self.encoder = model, model.config, model.encoder
+        self._from_legacy = getattr(EncoderDecoderCache, "from_legacy_cache", EncoderDecoderCache)
+
+    def __call__(self, past_key_values=None, **kwargs):
+        if past_key_values is not None:
+            past_key_values = self._from_legacy(past_key_values)
+        out = self.model(past_key_values=past_key_values, **kwargs)
+        cache = out.past_key_values
+        out.past_key_values = tuple(
+            (own.keys, own.values, cross.keys, cross.values)
+            for own, cross in zip(cache.self_attention_cache.layers, cache.cross_attention_cache.layers)
+        )
+        return out
+
+
+@pytest.mark.parametrize("legacy_cache", [False, True])
+def test_greedy_decode_matches_generate_on_real_model(monkeypatch, legacy_cache):
+    model = _tiny_trocr()
+    pixel_values = torch.randn(16, 3, 32, 32)
+    with torch.inference_mode():
+        expected = model.generate(pixel_values, max_length=16, num_beams=1, do_sample=False)
+    lengths = {int((row == 3).nonzero()[0]) if (row == 3).any() else 16 for row in expected}
+    assert len(lengths) > 2  # lines end at different steps, so finished rows get pruned
+
+    pruned = []
+    select_rows = ocr_engine._select_rows
+    monkeypatch.setattr(
+        ocr_engine, "_select_rows", lambda past, keep: pruned.append(type(past)) or select_rows(past, keep)
+    )
+    decoder = _LegacyCacheModel(model) if legacy_cache else model
+    ids, confidence = ocr_engine._greedy_decode(decoder, pixel_values, max_length=16, early_exit=True)
+
+    assert torch.equal(ids, expected)
+    assert pruned and all((cls is tuple) == legacy_cache for cls in pruned)
+    assert bool(((confidence > 0) & (confidence <= 1)).all())
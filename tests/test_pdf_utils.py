@@ -0,0 +1,46 @@
+"""
+Tests for backend.pdf_utils: page selection and selective rasterization.
+"""
+import os
+
+import pytest
+
+from backend import cancellation
+from backend.pdf_utils import normalize_page_spec, pdf_to_images, select_pages
+from benchmarks.synthetic import make_pdf
+
+
+def test_select_pages_ranges_and_open_end():
+    assert select_pages(None, 3) == [1, 2, 3]
+    assert select_pages("1-2, 5, 4-", 6) == [1, 2, 4, 5, 6]
+    # Pages past the end are ignored, but an empty selection is an error
+    assert select_pages("2-99", 3) == [2, 3]
+    with pytest.raises(ValueError):
+        select_pages("7", 3)
+
+
+@pytest.mark.parametrize("spec", ["0", "3-1", "a", "1,,2", "-4"])
+def test_malformed_page_specs_rejected(spec):
+    with pytest.raises(ValueError):
+        normalize_page_spec(spec)
+
+
+def test_normalize_page_spec():
+    assert normalize_page_spec(" 1-5, 9,12- ") == "1-5,9,12-"
+    assert normalize_page_spec("") is None
+
+
+def test_pdf_to_images_rasterizes_only_selected_pages(tmp_path):
+    pdf = make_pdf(str(tmp_path / "doc.pdf"), pages=4, lines=2, dpi=72)
+    out = tmp_path / "out"
+    paths = pdf_to_images(pdf, str(out), dpi=72, pages="2,4")
+    assert [os.path.basename(p) for p in paths] == ["page_002.png", "page_004.png"]
+    assert sorted(os.listdir(out)) == ["page_002.png", "page_004.png"]
+
+
+def test_pdf_to_images_stops_when_cancelled(tmp_path):
+    pdf = make_pdf(str(tmp_path / "doc.pdf"), pages=2, lines=2, dpi=72)
+    token = cancellation.CancelToken()
+    token.cancel("client disconnected")
+    with cancellation.bind(token), pytest.raises(cancellation.Cancelled):
+        pdf_to_images(pdf, str(tmp_path / "out"), dpi=72)
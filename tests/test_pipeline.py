@@ -0,0 +1,109 @@
+"""
+Tests for backend.pipeline: bounded-memory conversion of long uploads (OCR stubbed).
+"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import backend.document_store as document_store
+from backend.pipeline import convert_to_document, count_pages, resolve_options
+from benchmarks.synthetic import make_pdf
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Converts a PDF in bounded mode with a stub enrich that returns a large text
+# per page, then reports the peak RSS of the process in KiB. VmHWM, unlike
+# ru_maxrss, is not inherited from the (large) pytest parent across exec.
+_RSS_SCRIPT = """
+import json, sys
+from backend import config_loader
+pdf, store, work = sys.argv[1:4]
+config_loader.reload_config({"document_store.dir": store, "document_store.max_documents": 0})
+from backend.pipeline import convert_to_document, resolve_options
+def enrich(paths, options):
+    return [("line of recognised text " * 40 + "\\n\\n") * 100 for _ in paths]
+options = resolve_options(dpi=72, compile_pdf=False)
+doc_id, pages = convert_to_document(pdf, work, options, enrich, window_pages=4)
+peak = next(line.split()[1] for line in open("/proc/self/status") if line.startswith("VmHWM:"))
+print(json.dumps({"pages": pages, "maxrss": int(peak)}))
+"""
+
+
+@pytest.fixture
+def store_root(tmp_path, monkeypatch):
+    root = tmp_path / "store"
+    root.mkdir()
+    monkeypatch.setattr(document_store, "_store_root", lambda: str(root))
+    return root
+
+
+def test_convert_to_document_works_in_windows(tmp_path, store_root):
+    pdf = make_pdf(str(tmp_path / "doc.pdf"), pages=5, lines=1, dpi=72)
+    work = tmp_path / "work"
+    windows = []
+
+    def enrich(paths, options):
+        windows.append([os.path.basename(p) for p in paths])
+        # earlier windows' images are already gone
+        assert len(os.listdir(work)) == 1
+        return [f"text of {os.path.basename(p)}" for p in paths]
+
+    options = resolve_options(dpi=72, pages="2-")
+    assert count_pages(pdf, options) == 4
+    doc_id, pages = convert_to_document(pdf, str(work), options, enrich, window_pages=3)
+
+    assert pages == 4
+    assert windows == [["page_002.png", "page_003.png", "page_004.png"], ["page_005.png"]]
+    assert document_store.load_page(doc_id, 1) == "text of page_002.png"
+    assert "page_005" in document_store.load_latex(doc_id)
+    assert os.listdir(work) == []
+
+
+def test_convert_to_document_discards_partial_document(tmp_path, store_root):
+    pdf = make_pdf(str(tmp_path / "doc.pdf"), pages=3, lines=1, dpi=72)
+    calls = []
+
+    def enrich(paths, options):
+        calls.append(paths)
+        if len(calls) == 2:
+            raise RuntimeError("model crashed")
+        return ["text"] * len(paths)
+
+    with pytest.raises(RuntimeError):
+        convert_to_document(pdf, str(tmp_path / "work"), resolve_options(dpi=72), enrich, window_pages=2)
+    assert os.listdir(store_root) == []
+
+
+def _peak_rss_kib(tmp_path, page_count: int) -> int:
+    pdf = make_pdf(str(tmp_path / f"doc_{page_count}.pdf"), pages=page_count, lines=1, dpi=72)
+    result = subprocess.run(
+        [sys.executable, "-c", _RSS_SCRIPT, pdf, str(tmp_path / "store"), str(tmp_path / f"work_{page_count}")],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    assert report["pages"] == page_count
+    return report["maxrss"]
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/status"), reason="needs /proc (Linux)")
+def test_bounded_conversion_peak_rss_stays_flat(tmp_path):
+    # ~100 KB of text per page: holding all pages of the long run (several
+    # copies while rendering and joining) would add well over 30 MB
+    small = _peak_rss_kib(tmp_path, 8)
+    large = _peak_rss_kib(tmp_path, 120)
+    assert large - small < 8 * 1024, f"peak RSS grew from {small} KiB to {large} KiB"
+
+
+def test_ocr_engine_option_validated_and_keyed():
+    default = resolve_options()
+    cascade = resolve_options(ocr_engine="cascade")
+    assert default.ocr_engine == "default" and cascade.ocr_engine == "cascade"
+    assert default.cache_key("abc") != cascade.cache_key("abc")
+    with pytest.raises(ValueError, match="Unknown OCR engine"):
+        resolve_options(ocr_engine="huge")
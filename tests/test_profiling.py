@@ -0,0 +1,61 @@
+"""
+Tests for backend.profiling: opt-in request profiles and their artifacts.
+"""
+from contextlib import nullcontext
+
+import pytest
+
+import backend.profiling as profiling
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    values = {
+        "debug.profiling_enabled": True,
+        "debug.torch_profiler": False,
+        "debug.profile_dir": str(tmp_path / "profiles"),
+        "debug.max_profiles": 50,
+    }
+    monkeypatch.setattr(profiling, "get", lambda key, default=None: values.get(key, default))
+    return values
+
+
+def _busy_work():
+    return sum(i * i for i in range(10000))
+
+
+def test_profile_request_writes_artifacts(config):
+    with profiling.profile_request() as profile_id:
+        _busy_work()
+    names = profiling.list_artifacts(profile_id)
+    assert names == ["profile.prof", "profile.txt"]
+    text = open(profiling.artifact_path(profile_id, "profile.txt")).read()
+    assert "_busy_work" in text
+
+
+def test_torch_trace_recorded_when_enabled(config):
+    torch = pytest.importorskip("torch")
+    config["debug.torch_profiler"] = True
+    with profiling.profile_request() as profile_id:
+        with profiling.torch_region("generate"):
+            torch.ones(8, 8) @ torch.ones(8, 8)
+    assert "torch_trace.json" in profiling.list_artifacts(profile_id)
+    assert "generate" in open(profiling.artifact_path(profile_id, "profile.txt")).read()
+
+
+def test_only_one_profile_at_a_time(config):
+    with profiling.profile_request():
+        with pytest.raises(profiling.ProfilerBusy):
+            with profiling.profile_request():
+                pass
+
+
+def test_torch_region_is_noop_outside_profile():
+    assert isinstance(profiling.torch_region("generate"), nullcontext)
+
+
+def test_artifact_lookup_rejects_bad_names(config):
+    with profiling.profile_request() as profile_id:
+        pass
+    assert profiling.artifact_path(profile_id, "../secrets.yaml") is None
+    assert profiling.list_artifacts("../..") is None
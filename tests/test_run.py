@@ -0,0 +1,82 @@
+"""
+Tests for run.py: production worker/thread sizing.
+"""
+import pytest
+
+import run
+
+
+def test_workers_default_to_available_cores(monkeypatch):
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+    monkeypatch.setattr(run, "_available_cpus", lambda: 16)
+    assert run._resolve_workers(0) == 16
+    assert run._resolve_workers(4) == 4
+
+
+def test_workers_from_env(monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "3")
+    assert run._resolve_workers(0) == 3
+
+
+def test_threads_split_cores_between_workers(monkeypatch):
+    monkeypatch.setattr(run, "_available_cpus", lambda: 16)
+    assert run._resolve_threads(4) == 4
+    assert run._resolve_threads(32) == 1
+
+
+def test_restart_delay_backs_off_for_crashing_workers():
+    assert run._restart_delay(uptime=3600, previous=8.0) == 0.0
+    delays = [0.0]
+    for _ in range(8):
+        delays.append(run._restart_delay(uptime=0.5, previous=delays[-1]))
+    assert delays[1:5] == [1.0, 2.0, 4.0, 8.0]
+    assert delays[-1] == run.MAX_RESTART_DELAY
+
+
+def test_gpu_model_is_not_preloaded_before_fork(monkeypatch):
+    import backend.ocr_engine as ocr_engine
+
+    monkeypatch.setenv("PYTORCH_NVML_BASED_CUDA_CHECK", "1")
+    monkeypatch.setattr(ocr_engine, "preload_device", lambda: "cuda")
+    monkeypatch.setattr(ocr_engine, "preload_model", lambda: pytest.fail("loaded CUDA weights before fork"))
+    monkeypatch.setattr(run.os, "fork", lambda: (_ for _ in ()).throw(RuntimeError("stop before forking")))
+    monkeypatch.setattr(run, "_bind_socket", lambda host, port: None)
+    monkeypatch.setattr(run.gc, "freeze", lambda: None)
+    monkeypatch.setattr(run.signal, "signal", lambda *args: None)
+    with pytest.raises(RuntimeError, match="stop before forking"):
+        run.serve_production("127.0.0.1", 0, 1)
+
+
+def test_supervisor_keeps_reaping_and_stops_during_restart_delay(monkeypatch):
+    handlers, forked, sleeps = {}, [], []
+    exits = iter([(100, 256)])  # worker of slot 0 crashes right after starting
+
+    def fork():
+        forked.append(100 + len(forked))
+        return forked[-1]
+
+    def wait():
+        return next(exits, (101, 0))
+
+    def waitpid(pid, options):
+        assert options == run.os.WNOHANG  # never block while a restart is pending
+        return 0, 0
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        handlers[run.signal.SIGTERM](run.signal.SIGTERM, None)  # shutdown arrives meanwhile
+
+    monkeypatch.setattr(run.os, "fork", fork)
+    monkeypatch.setattr(run.os, "wait", wait)
+    monkeypatch.setattr(run.os, "waitpid", waitpid)
+    monkeypatch.setattr(run.os, "kill", lambda pid, sig: None)
+    monkeypatch.setattr(run.time, "sleep", sleep)
+    monkeypatch.setattr(run, "_bind_socket", lambda host, port: type("sock", (), {"close": lambda self: None})())
+    monkeypatch.setattr(run.gc, "freeze", lambda: None)
+    monkeypatch.setattr(run.signal, "signal", lambda sig, handler: handlers.__setitem__(sig, handler))
+    monkeypatch.setattr("backend.config_loader.get", lambda key, default=None: False if key == "server.preload_model" else default)
+
+    run.serve_production("127.0.0.1", 0, 2)
+
+    assert forked == [100, 101]  # the crashed worker is not restarted after shutdown
+    assert sleeps and max(sleeps) <= run.SUPERVISOR_POLL_SECONDS
@@ -0,0 +1,101 @@
+"""
+Tests for backend.scheduler: priority classes, round-robin fairness and per-client limits.
+"""
+import threading
+import time
+from contextvars import ContextVar
+
+import pytest
+
+from backend import metrics
+from backend.scheduler import Scheduler
+
+
+@pytest.fixture
+def sched():
+    s = Scheduler(workers=1)
+    yield s
+    s.shutdown()
+
+
+def _block(s, client="x"):
+    """Occupy the (single) worker until the returned event is set."""
+    started, release = threading.Event(), threading.Event()
+
+    def blocker():
+        started.set()
+        release.wait(5)
+
+    s.submit(blocker, client, "batch")
+    assert started.wait(5)
+    return release
+
+
+def test_interactive_first_then_round_robin_between_clients(sched):
+    release = _block(sched)
+    order = []
+    futures = [sched.submit(lambda name=name: order.append(name), client, priority)
+               for name, client, priority in [
+                   ("a1", "a", "batch"), ("a2", "a", "batch"), ("a3", "a", "batch"),
+                   ("b1", "b", "batch"),
+                   ("c1", "c", "interactive"),
+               ]]
+    assert sched.pending() == 5
+    release.set()
+    for f in futures:
+        f.result(timeout=5)
+    assert order == ["c1", "a1", "b1", "a2", "a3"]
+
+
+def test_cancelled_task_is_skipped(sched):
+    release = _block(sched)
+    ran = []
+    skipped = sched.submit(lambda: ran.append("skipped"), "a")
+    kept = sched.submit(lambda: ran.append("kept"), "a")
+    assert skipped.cancel()
+    release.set()
+    kept.result(timeout=5)
+    assert ran == ["kept"]
+
+
+def test_per_client_limit_lets_other_clients_through():
+    s = Scheduler(workers=2, max_active_per_client=1)
+    try:
+        active = {"a": 0}
+        peak = {"a": 0}
+        lock = threading.Lock()
+        b_done = threading.Event()
+
+        def a_task():
+            with lock:
+                active["a"] += 1
+                peak["a"] = max(peak["a"], active["a"])
+            b_done.wait(5)
+            time.sleep(0.01)
+            with lock:
+                active["a"] -= 1
+
+        futures = [s.submit(a_task, "a") for _ in range(2)]
+        # The second thread must pick up b instead of a's second task
+        s.submit(b_done.set, "b").result(timeout=5)
+        for f in futures:
+            f.result(timeout=5)
+        assert peak["a"] == 1
+    finally:
+        s.shutdown()
+
+
+def test_tasks_run_in_submitter_context_and_propagate_errors(sched):
+    var = ContextVar("test_scheduler_var", default=None)
+    var.set("request-1")
+    with metrics.collect_timings() as timings:
+        assert sched.submit(var.get, "a").result(timeout=5) == "request-1"
+    assert "queue_wait" in timings
+
+    def boom():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError, match="boom"):
+        sched.submit(boom, "a").result(timeout=5)
+    with pytest.raises(ValueError):
+        sched.submit(lambda: None, "a", "urgent")